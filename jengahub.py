@@ -0,0 +1,295 @@
+"""Command-line tool for batch and maintenance jobs, without Streamlit.
+
+Cron jobs and ops scripts run the same data-access code as the app through
+this tool. Only argparse and the standard library load at startup; each
+command imports the modules it uses when it runs, so `--help` and the
+light commands start in a fraction of a second and nothing loads
+Streamlit or plotly. The database comes from --db (default JENGAHUB_DB)
+and the shards from --shard-dir (default JENGAHUB_SHARD_DIR).
+
+    python3 jengahub.py import students pupils.csv --school 1
+    python3 jengahub.py export workbook --school 1 --out school1.xlsx
+    python3 jengahub.py export changes --since 1200 --out changes.jsonl
+    python3 jengahub.py report --school 1 --type "Attendance Summary Report" --out attendance.xlsx
+    python3 jengahub.py report --precompute
+    python3 jengahub.py vacuum
+    python3 jengahub.py backup create
+    python3 jengahub.py benchmark --backend duckdb --repeat 5
+    python3 jengahub.py generate loadtest.db --schools 4 --students 600
+"""
+import argparse
+import sys
+import time
+
+
+def _open(args):
+    # The catalog connection and the router over it, with the schema in place
+    from jengahub_db import DB_PATH, connect, init_database
+    from jengahub_shards import SHARD_DIR, open_router
+
+    args.db = args.db or DB_PATH
+    catalog = connect(args.db)
+    init_database(catalog)
+    return catalog, open_router(catalog, args.shard_dir if args.shard_dir is not None else SHARD_DIR)
+
+
+def _school_ids(catalog, school_id=None):
+    if school_id is not None:
+        if catalog.execute("SELECT 1 FROM schools WHERE school_id=?", (school_id,)).fetchone() is None:
+            raise SystemExit(f"No school with id {school_id}")
+        return [school_id]
+    return [school_id for (school_id,) in catalog.execute("SELECT school_id FROM schools ORDER BY school_id")]
+
+
+def _date_range(args, default_start):
+    from datetime import date
+
+    start = date.fromisoformat(args.start) if args.start else default_start
+    end = date.fromisoformat(args.end) if args.end else date.today()
+    return start, end
+
+
+def _passthrough(args):
+    # Options the wrapped tool takes too
+    options = ['--db', args.db] if args.db else []
+    return options + (['--shard-dir', args.shard_dir] if args.shard_dir else [])
+
+
+def _sheet_name(title, taken):
+    # Excel caps sheet names at 31 characters; numbered when the cut collides
+    name = title[:31]
+    number = 2
+    while name in taken:
+        suffix = f" ({number})"
+        name = title[:31 - len(suffix)] + suffix
+        number += 1
+    return name
+
+
+# ===================== COMMANDS =====================
+def cmd_import(args):
+    from jengahub_transfer import import_csv
+
+    catalog, db = _open(args)
+    _school_ids(catalog, args.school)
+    conn = db.connection(args.school)
+    started = time.monotonic()
+    try:
+        imported, skipped = import_csv(conn, args.table, args.school, args.file, args.batch)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if args.table == 'attendance':
+        from jengahub_bitmaps import BITMAPS_ENABLED, sync_bitmaps
+        if BITMAPS_ENABLED:
+            with conn:
+                sync_bitmaps(conn, args.school)
+    print(f"{imported} {args.table} rows imported in {time.monotonic() - started:.1f}s"
+          + (f"; {skipped} skipped (student not in school {args.school})" if skipped else ""))
+
+
+def cmd_export(args):
+    catalog, db = _open(args)
+    if args.what == 'workbook':
+        from jengahub_transfer import export_workbook
+
+        _school_ids(catalog, args.school)
+        counts = export_workbook(db.connection(args.school), args.school, args.out)
+        print(f"{args.out}: " + ", ".join(f"{count} {sheet.lower()}" for sheet, count in counts.items()))
+        return
+
+    from jengahub_cdc import export_changes, to_jsonl
+
+    # Each shard keeps its own change log; --school reads the school's database
+    conn = db.connection(args.school) if args.school is not None else catalog
+    try:
+        changes, watermark = export_changes(conn, args.since, args.school)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    output = sys.stdout if args.out == '-' else open(args.out, 'w')
+    try:
+        output.write(to_jsonl(changes))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"{len(changes)} changes, watermark {watermark}", file=sys.stderr)
+
+
+def cmd_report(args):
+    if args.precompute:
+        from jengahub_db import DB_PATH
+        from jengahub_reports import REPORT_DIR, precompute_reports
+
+        started = time.monotonic()
+        count = precompute_reports(args.db or DB_PATH, args.shard_dir, args.report_dir or REPORT_DIR, args.workers)
+        print(f"{count} report artifacts written in {time.monotonic() - started:.1f}s")
+        return
+    if args.school is None:
+        raise SystemExit("report needs --school (or --precompute)")
+
+    from jengahub_analytics import analytics_backend
+    from jengahub_reports import REPORT_DIR, REPORT_TYPES, cached_report, load_artifact, period_bounds
+
+    catalog, db = _open(args)
+    _school_ids(catalog, args.school)
+    if args.start or args.end:
+        start, end = _date_range(args, period_bounds('term_to_date')[0])
+    else:
+        start, end = period_bounds(args.period)
+    if args.type and args.type not in REPORT_TYPES:
+        raise SystemExit(f"Unknown report type {args.type!r}; choose from: {', '.join(REPORT_TYPES)}")
+    report_types = [args.type] if args.type else REPORT_TYPES
+    conn = db.connection(args.school)
+    analytics = analytics_backend(db)
+
+    tables = {}
+    for report_type in report_types:
+        # Precomputed (report, meta) when there is one for the range
+        artifact = load_artifact(conn, args.school, report_type, start, end, args.report_dir or REPORT_DIR)
+        report = artifact[0] if artifact else cached_report(conn, analytics, args.school, report_type, start, end)
+        for name, frame in report.items():
+            tables[f"{report_type.replace(' Report', '')} - {name}"] = frame
+
+    if args.out:
+        import pandas as pd
+
+        with pd.ExcelWriter(args.out, engine='openpyxl') as writer:
+            for title, frame in tables.items():
+                frame.to_excel(writer, sheet_name=_sheet_name(title, writer.sheets), index=False)
+        print(f"{len(tables)} tables for {start} to {end} written to {args.out}")
+        return
+    for title, frame in tables.items():
+        print(f"== {title} ({start} to {end}) ==")
+        print(frame.to_string(index=False) if not frame.empty else "(no data)")
+        print()
+
+
+def cmd_vacuum(args):
+    from jengahub_maintenance import main as maintenance_main
+
+    maintenance_main(['convert' if args.convert else 'stats' if args.stats else 'run'] + _passthrough(args))
+
+
+def cmd_backup(args):
+    from jengahub_backup import main as backup_main
+
+    # The backup commands take their own options after the subcommand
+    argv = args.extra
+    if argv and not argv[0].startswith('-'):
+        argv = argv[:1] + _passthrough(args) + argv[1:]
+    backup_main(argv)
+
+
+def cmd_benchmark(args):
+    import statistics
+    from datetime import date
+
+    from jengahub_analytics import ANALYTICS_BACKEND, QUERIES, analytics_backend
+
+    catalog, db = _open(args)
+    school_ids = _school_ids(catalog, args.school)
+    start, end = _date_range(args, date(date.today().year, 1, 1))
+    # Uncached, so every run measures the backend itself
+    backend = analytics_backend(db, args.backend or ANALYTICS_BACKEND, cache=False)
+    print(f"{backend.name} backend, {len(school_ids)} school(s), {start} to {end}, {args.repeat} runs each")
+
+    def timed(run):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    total = 0.0
+    for name in QUERIES:
+        if name == 'school_comparison':
+            timings = timed(lambda: backend.school_comparison(start, end))
+        else:
+            timings = timed(lambda: [backend.query(name, school_id, start, end) for school_id in school_ids])
+        total += statistics.median(timings)
+        print(f"{name:<28} median {statistics.median(timings):8.1f} ms   min {min(timings):8.1f} ms")
+    print(f"{'total':<28} median {total:8.1f} ms")
+
+
+def cmd_generate(args):
+    from jengahub_loadtest import main as loadtest_main
+
+    loadtest_main(['generate'] + args.extra)
+
+
+# ===================== ARGUMENTS =====================
+def build_parser():
+    parser = argparse.ArgumentParser(prog='jengahub', description="Jenga Hub PMS batch and maintenance commands")
+    parser.add_argument('--db', default=None, help="database file (default JENGAHUB_DB or school_management.db)")
+    parser.add_argument('--shard-dir', default=None, help="shard directory (default JENGAHUB_SHARD_DIR)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    # Also accepted after the command name
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--db', default=argparse.SUPPRESS)
+    common.add_argument('--shard-dir', default=argparse.SUPPRESS)
+
+    importer = commands.add_parser('import', help="add rows from a CSV file to one of a school's tables", parents=[common])
+    importer.add_argument('table', choices=['students', 'teachers', 'teacher_assignments', 'attendance',
+                                            'assessments'])
+    importer.add_argument('file')
+    importer.add_argument('--school', type=int, required=True)
+    importer.add_argument('--batch', type=int, default=5000, help="rows per transaction")
+    importer.set_defaults(run=cmd_import)
+
+    export = commands.add_parser('export', help="a school's workbook, or the change feed as JSON lines", parents=[common])
+    export.add_argument('what', choices=['workbook', 'changes'])
+    export.add_argument('--school', type=int, default=None)
+    export.add_argument('--since', type=int, default=0, help="changes: the watermark of the previous export")
+    export.add_argument('--out', default=None, help="workbook: .xlsx path; changes: file or - (default)")
+    export.set_defaults(run=cmd_export)
+
+    report = commands.add_parser('report', help="build a school's reports, or precompute every standard one", parents=[common])
+    report.add_argument('--school', type=int, default=None)
+    report.add_argument('--type', default=None, help="one report type (default all)")
+    report.add_argument('--period', choices=['term_to_date', 'last_month'], default='term_to_date')
+    report.add_argument('--start', default=None, help="YYYY-MM-DD, instead of --period")
+    report.add_argument('--end', default=None, help="YYYY-MM-DD, instead of --period")
+    report.add_argument('--out', default=None, help=".xlsx path (default print the tables)")
+    report.add_argument('--precompute', action='store_true', help="precompute the standard reports for every school")
+    report.add_argument('--report-dir', default=None)
+    report.add_argument('--workers', type=int, default=4)
+    report.set_defaults(run=cmd_report)
+
+    vacuum = commands.add_parser('vacuum', help="purge orphans and reclaim free pages in every database file", parents=[common])
+    vacuum.add_argument('--convert', action='store_true', help="switch the files to incremental auto-vacuum")
+    vacuum.add_argument('--stats', action='store_true', help="show storage use instead")
+    vacuum.set_defaults(run=cmd_vacuum)
+
+    backup = commands.add_parser('backup', help="create, list, verify or restore backups (see jengahub_backup)",
+                                 add_help=False)
+    backup.set_defaults(run=cmd_backup)
+
+    benchmark = commands.add_parser('benchmark', help="time every analytics query, uncached", parents=[common])
+    benchmark.add_argument('--school', type=int, default=None, help="default every school")
+    benchmark.add_argument('--backend', default=None, help="sqlite, bitmap, duckdb or duckdb:<dir>")
+    benchmark.add_argument('--start', default=None, help="YYYY-MM-DD (default January 1st)")
+    benchmark.add_argument('--end', default=None, help="YYYY-MM-DD (default today)")
+    benchmark.add_argument('--repeat', type=int, default=3)
+    benchmark.set_defaults(run=cmd_benchmark)
+
+    generate = commands.add_parser('generate', help="create a test database (see jengahub_loadtest)", add_help=False)
+    generate.set_defaults(run=cmd_generate)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    # backup and generate hand the rest of the line to the tool they wrap
+    args, extra = parser.parse_known_args(argv)
+    args.extra = extra
+    if extra and args.command not in ('backup', 'generate'):
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    if args.command == 'export':
+        if args.what == 'workbook' and (args.school is None or not args.out):
+            parser.error("export workbook needs --school and --out")
+        args.out = args.out or '-'
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""Analytics backends for the Analytics and Reports pages.
+
+Report aggregations are written once as SQL and run by a pluggable
+backend. SqliteBackend runs them on the transactional database (the
+default). DuckDBBackend runs them in embedded DuckDB, a columnar engine
+that is much faster for year-long scans and cross-school comparisons. It
+either attaches the SQLite files directly (sqlite extension), or reads
+Parquet snapshots written by write_parquet_snapshot. SQLite stays the
+store of record either way.
+
+    JENGAHUB_ANALYTICS=duckdb                  attach the live SQLite files
+    JENGAHUB_ANALYTICS=duckdb:/path/snapshots  read Parquet snapshots
+    JENGAHUB_ANALYTICS=bitmap                  attendance rates from jengahub_bitmaps
+
+Whichever backend runs them, results are kept in the shared result cache
+(jengahub_cache) until the tables a query reads change.
+
+    python3 jengahub_analytics.py snapshot /path/snapshots
+"""
+import argparse
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+
+from jengahub_cache import cached
+from jengahub_cdc import current_watermark, data_version
+from jengahub_db import CORE_TABLES, DB_PATH, connect, database_path
+from jengahub_shards import SHARD_DIR, open_router
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+ANALYTICS_BACKEND = os.environ.get('JENGAHUB_ANALYTICS', 'sqlite')
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+PRESENT = "CASE WHEN status = 'Present' THEN 1.0 ELSE 0.0 END"
+
+# Every query takes (school_id, start, end) unless noted; the SQL is
+# portable between SQLite and DuckDB. Marks are averaged as percentages of
+# each assessment's total (see jengahub_scores).
+QUERIES = {
+    'attendance_overview': f'''
+        SELECT COUNT(*) AS records,
+               100.0 * AVG({PRESENT}) AS attendance_rate,
+               AVG(behaviour_score) AS avg_behaviour,
+               MAX(behaviour_score) AS max_behaviour,
+               MIN(behaviour_score) AS min_behaviour
+        FROM attendance WHERE school_id = ? AND date BETWEEN ? AND ?
+    ''',
+    'assessment_overview': '''
+        SELECT COUNT(*) AS records, AVG(percentage) AS avg_percentage, MAX(percentage) AS max_percentage,
+               MIN(percentage) AS min_percentage, COUNT(DISTINCT student_id) AS students
+        FROM assessments WHERE school_id = ? AND date BETWEEN ? AND ?
+    ''',
+    'attendance_by_status': '''
+        SELECT status, COUNT(*) AS count
+        FROM attendance WHERE school_id = ? AND date BETWEEN ? AND ?
+        GROUP BY status ORDER BY count DESC
+    ''',
+    'attendance_by_day': f'''
+        SELECT date, 100.0 * AVG({PRESENT}) AS attendance_rate
+        FROM attendance WHERE school_id = ? AND date BETWEEN ? AND ?
+        GROUP BY date ORDER BY date
+    ''',
+    'attendance_by_month': f'''
+        SELECT substr(date, 1, 7) AS month, 100.0 * AVG({PRESENT}) AS attendance_rate
+        FROM attendance WHERE school_id = ? AND date BETWEEN ? AND ?
+        GROUP BY substr(date, 1, 7) ORDER BY month
+    ''',
+    'attendance_by_grade': f'''
+        SELECT s.grade, 100.0 * AVG(CASE WHEN a.status = 'Present' THEN 1.0 ELSE 0.0 END) AS attendance_rate,
+               COUNT(DISTINCT a.student_id) AS students
+        FROM attendance a JOIN students s ON s.student_id = a.student_id
+        WHERE a.school_id = ? AND a.date BETWEEN ? AND ? AND s.grade IS NOT NULL
+        GROUP BY s.grade ORDER BY s.grade
+    ''',
+    'marks_by_grade': '''
+        SELECT s.grade, AVG(a.percentage) AS avg_percentage, MAX(a.percentage) AS max_percentage,
+               MIN(a.percentage) AS min_percentage, COUNT(*) AS assessments, COUNT(DISTINCT a.student_id) AS students
+        FROM assessments a JOIN students s ON s.student_id = a.student_id
+        WHERE a.school_id = ? AND a.date BETWEEN ? AND ? AND s.grade IS NOT NULL
+        GROUP BY s.grade ORDER BY s.grade
+    ''',
+    'marks_by_subject': '''
+        SELECT subject, AVG(percentage) AS avg_percentage, COUNT(*) AS assessments
+        FROM assessments WHERE school_id = ? AND date BETWEEN ? AND ?
+        GROUP BY subject ORDER BY subject
+    ''',
+    'behaviour_by_student': '''
+        SELECT a.student_id, s.name, s.grade, AVG(a.behaviour_score) AS behaviour_score
+        FROM attendance a LEFT JOIN students s ON s.student_id = a.student_id
+        WHERE a.school_id = ? AND a.date BETWEEN ? AND ?
+        GROUP BY a.student_id, s.name, s.grade
+    ''',
+    # Students ranked by average behaviour, best and worst first; ties share a rank
+    'behaviour_ranking': '''
+        SELECT * FROM (
+            SELECT a.student_id, s.name, s.grade, AVG(a.behaviour_score) AS behaviour_score,
+                   RANK() OVER (ORDER BY AVG(a.behaviour_score) DESC) AS top_rank,
+                   RANK() OVER (ORDER BY AVG(a.behaviour_score)) AS bottom_rank
+            FROM attendance a LEFT JOIN students s ON s.student_id = a.student_id
+            WHERE a.school_id = ? AND a.date BETWEEN ? AND ? AND a.behaviour_score IS NOT NULL
+            GROUP BY a.student_id, s.name, s.grade
+        ) ranked WHERE top_rank <= 10 OR bottom_rank <= 10
+    ''',
+    'behaviour_distribution': '''
+        SELECT behaviour_score, COUNT(*) AS count
+        FROM attendance WHERE school_id = ? AND date BETWEEN ? AND ?
+        GROUP BY behaviour_score ORDER BY behaviour_score
+    ''',
+    # (start, end, start, end)
+    'school_comparison': f'''
+        WITH att AS (
+            SELECT school_id, 100.0 * AVG({PRESENT}) AS attendance_rate, AVG(behaviour_score) AS avg_behaviour
+            FROM attendance WHERE date BETWEEN ? AND ? GROUP BY school_id
+        ), ass AS (
+            SELECT school_id, AVG(percentage) AS avg_percentage, COUNT(*) AS assessments
+            FROM assessments WHERE date BETWEEN ? AND ? GROUP BY school_id
+        ), stu AS (
+            SELECT school_id, COUNT(*) AS students FROM students GROUP BY school_id
+        )
+        SELECT sc.school_id, sc.name AS school, COALESCE(stu.students, 0) AS students,
+               att.attendance_rate, att.avg_behaviour, ass.avg_percentage, COALESCE(ass.assessments, 0) AS assessments
+        FROM schools sc
+        LEFT JOIN stu ON stu.school_id = sc.school_id
+        LEFT JOIN att ON att.school_id = sc.school_id
+        LEFT JOIN ass ON ass.school_id = sc.school_id
+        ORDER BY sc.name
+    ''',
+}
+
+
+class SqliteBackend:
+    name = 'SQLite'
+
+    def __init__(self, db):
+        # db: a router from jengahub_shards
+        self.db = db
+
+    def query(self, name, school_id, start, end):
+        return pd.read_sql_query(QUERIES[name], self.db.connection(school_id),
+                                 params=(int(school_id), str(start), str(end)))
+
+    def school_comparison(self, start, end):
+        return self.db.fan_out(QUERIES['school_comparison'], (str(start), str(end), str(start), str(end)))
+
+
+class DuckDBBackend:
+    name = 'DuckDB'
+
+    def __init__(self, paths=(), parquet_dir=None, max_staleness=60):
+        if duckdb is None:
+            raise ImportError("duckdb is not installed")
+        self.paths = list(paths)
+        self.parquet_dir = parquet_dir
+        self.max_staleness = max_staleness
+        self.con = duckdb.connect()
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        # Change log versions of the copies held: per database index, and
+        # per (database index, table)
+        self._copied = {}
+        self.mode = None
+        self._setup()
+
+    def _setup(self):
+        if self.parquet_dir:
+            for table in CORE_TABLES:
+                path = os.path.join(self.parquet_dir, f"{table}.parquet").replace("'", "''")
+                self.con.execute(f"CREATE OR REPLACE VIEW {table} AS SELECT * FROM read_parquet('{path}')")
+            self.mode = 'parquet'
+            return
+        try:
+            self.con.execute("LOAD sqlite")
+        except Exception:
+            try:
+                self.con.execute("INSTALL sqlite")
+                self.con.execute("LOAD sqlite")
+            except Exception:
+                # No sqlite extension available (e.g. offline): fall back to
+                # periodically copying the tables in
+                self.mode = 'copy'
+                self._copy_tables()
+                return
+        for i, path in enumerate(self.paths):
+            self.con.execute(f"ATTACH '{path.replace(chr(39), chr(39) * 2)}' AS s{i} (TYPE sqlite, READ_ONLY)")
+        self._create_union_views(lambda i, table: f"s{i}.{table}")
+        self.mode = 'attach'
+
+    def _create_union_views(self, source):
+        # One view per table over every attached database (one per shard)
+        for table in CORE_TABLES:
+            union = ' UNION ALL '.join(f"SELECT * FROM {source(i, table)}" for i in range(len(self.paths)))
+            self.con.execute(f"CREATE OR REPLACE VIEW {table} AS {union}")
+
+    def _copy_tables(self):
+        # Only tables whose latest change log entry moved since the last copy
+        # are read again; an unchanged database is a single MAX(seq) lookup
+        for i, path in enumerate(self.paths):
+            conn = connect(path)
+            try:
+                watermark = current_watermark(conn)
+                if self._copied.get(i) == watermark:
+                    continue
+                versions = dict(conn.execute("SELECT table_name, MAX(seq) FROM change_log GROUP BY table_name"))
+                for table in CORE_TABLES:
+                    version = versions.get(table, 0)
+                    if self._copied.get((i, table)) == version:
+                        continue
+                    frame = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+                    self.con.register('incoming', frame)
+                    self.con.execute(f"CREATE OR REPLACE TABLE copy{i}_{table} AS SELECT * FROM incoming")
+                    self.con.unregister('incoming')
+                    self._copied[(i, table)] = version
+                self._copied[i] = watermark
+            finally:
+                conn.close()
+        self._create_union_views(lambda i, table: f"copy{i}_{table}")
+        self._loaded_at = time.time()
+
+    def _run(self, sql, params):
+        with self._lock:
+            if self.mode == 'copy' and time.time() - self._loaded_at > self.max_staleness:
+                self._copy_tables()
+            cursor = self.con.cursor()
+        try:
+            return cursor.execute(sql, list(params)).df()
+        finally:
+            cursor.close()
+
+    def query(self, name, school_id, start, end):
+        return self._run(QUERIES[name], (int(school_id), str(start), str(end)))
+
+    def school_comparison(self, start, end):
+        return self._run(QUERIES['school_comparison'], (str(start), str(end), str(start), str(end)))
+
+
+class CachedBackend:
+    # Serves another backend's results from the shared result cache, keyed
+    # by the query text and parameters, at the data version of the tables
+    # the query reads
+    def __init__(self, backend, db):
+        self.backend = backend
+        self.db = db
+        self.name = backend.name
+
+    def query(self, name, school_id, start, end):
+        conn = self.db.connection(school_id)
+        sql = QUERIES[name]
+        tables = [table for table in CORE_TABLES if re.search(rf'\b{table}\b', sql)]
+        return cached('analytics', (self.name, database_path(conn), sql, int(school_id), start, end),
+                      data_version(conn, school_id, tables),
+                      lambda: self.backend.query(name, school_id, start, end))
+
+    def school_comparison(self, start, end):
+        # Any change in any school's database moves the version on
+        connections = [conn for _, conn in self.db.connections()]
+        return cached('analytics', (self.name, *map(database_path, connections), QUERIES['school_comparison'],
+                                    start, end),
+                      sum(current_watermark(conn) for conn in connections),
+                      lambda: self.backend.school_comparison(start, end))
+
+
+def write_parquet_snapshot(paths, out_dir):
+    # Writes one Parquet file per core table, covering every given database
+    if duckdb is None:
+        raise ImportError("duckdb is not installed")
+    os.makedirs(out_dir, exist_ok=True)
+    backend = DuckDBBackend(paths, max_staleness=0)
+    for table in CORE_TABLES:
+        target = os.path.join(out_dir, f"{table}.parquet").replace("'", "''")
+        backend.con.execute(f"COPY (SELECT * FROM {table}) TO '{target}' (FORMAT parquet)")
+    backend.con.close()
+
+
+def analytics_backend(db, setting=ANALYTICS_BACKEND, cache=True):
+    # Falls back to SQLite when DuckDB is not installed. DuckDB backends are
+    # shared per process, one per set of database files.
+    if setting == 'bitmap':
+        from jengahub_bitmaps import BitmapBackend
+        backend = BitmapBackend(db)
+    elif setting.startswith('duckdb') and duckdb is not None:
+        _, _, parquet_dir = setting.partition(':')
+        key = (tuple(os.path.abspath(p) for p in db.paths()), parquet_dir or None)
+        with _backends_lock:
+            if key not in _backends:
+                _backends[key] = DuckDBBackend(key[0], parquet_dir=key[1])
+            backend = _backends[key]
+    else:
+        backend = SqliteBackend(db)
+    return CachedBackend(backend, db) if cache else backend
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analytics snapshots for Jenga Hub PMS")
+    commands = parser.add_subparsers(dest='command', required=True)
+    snapshot = commands.add_parser('snapshot', help="write Parquet snapshots of the core tables")
+    snapshot.add_argument('out_dir')
+    snapshot.add_argument('--db', default=DB_PATH)
+    snapshot.add_argument('--shard-dir', default=SHARD_DIR)
+    args = parser.parse_args(argv)
+
+    catalog = connect(args.db)
+    try:
+        paths = open_router(catalog, args.shard_dir).paths()
+    finally:
+        catalog.close()
+    write_parquet_snapshot(paths, args.out_dir)
+    print(f"Snapshot of {len(paths)} database(s) written to {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
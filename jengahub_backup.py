@@ -0,0 +1,400 @@
+"""Online backups: rotated, compressed, checksummed snapshots, with verify and restore.
+
+A backup copies every database file (the main file and any school shards)
+with SQLite's online backup API, a few pages per step. Between steps the
+source is unlocked, so teachers' saves go through while a backup runs.
+When writes keep restarting the copy, the last attempt copies in one step
+instead. Each copy is gzipped, and a backup set is only moved into place
+once all of its files are written, with a manifest holding each file's
+SHA-256 before and after compression and the change-log watermark it was
+taken at. The newest JENGAHUB_BACKUP_KEEP sets are kept.
+
+Restoring checks the checksums, takes a "pre-restore" backup of the
+current data, then copies the snapshot into the live files through the
+same backup API, so open connections stay valid. The change log is moved
+past its pre-restore position and the restore is logged as a reset, so
+caches keyed on the watermark rebuild. Files not in the set are left as
+they are.
+
+    python3 jengahub_backup.py create
+    python3 jengahub_backup.py list
+    python3 jengahub_backup.py verify 20261019-020000
+    python3 jengahub_backup.py restore 20261019-020000
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from jengahub_cdc import current_watermark, record_reset
+from jengahub_db import DB_PATH, connect, init_database
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.environ.get('JENGAHUB_BACKUP_DIR', 'backups')
+BACKUP_KEEP = int(os.environ.get('JENGAHUB_BACKUP_KEEP', 14))
+BACKUP_INTERVAL = int(os.environ.get('JENGAHUB_BACKUP_INTERVAL', 86400))
+
+# Pages copied per backup step (4 MB at the default page size), and the
+# pause between steps in which writers can take the lock
+BACKUP_STEP_PAGES = 1024
+BACKUP_STEP_SLEEP = 0.005
+# Copies restarted by writes before the last one is done in a single step
+BACKUP_MAX_RESTARTS = 5
+COMPRESS_LEVEL = 6
+MANIFEST = 'manifest.json'
+
+
+class BackupError(Exception):
+    pass
+
+
+class _Restarted(Exception):
+    pass
+
+
+def backup_sources(db_path=DB_PATH, shard_dir=None):
+    # The main database plus every shard (the shard router's paths leave
+    # out the catalog)
+    from jengahub_shards import SHARD_DIR, open_router
+
+    catalog = connect(db_path)
+    try:
+        paths = open_router(catalog, shard_dir if shard_dir is not None else SHARD_DIR).paths()
+    finally:
+        catalog.close()
+    return [db_path] + [path for path in paths if os.path.abspath(path) != os.path.abspath(db_path)]
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ===================== TAKING BACKUPS =====================
+def copy_database(source_path, target_path, step_pages=BACKUP_STEP_PAGES, sleep=BACKUP_STEP_SLEEP,
+                  max_restarts=BACKUP_MAX_RESTARTS):
+    # Online copy in steps of `step_pages`. A write from another connection
+    # restarts the copy; after `max_restarts` of those the copy is done in
+    # one step, which holds a read lock (writers wait) for its duration.
+    # Returns (watermark, restarts).
+    source = connect(source_path)
+    try:
+        # Taken before the copy, so the snapshot holds at least this much
+        watermark = current_watermark(source)
+        restarts = 0
+        while True:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            target = sqlite3.connect(target_path)
+            remaining = []
+
+            def progress(status, left, total):
+                if remaining and left > remaining[-1]:
+                    raise _Restarted()
+                remaining.append(left)
+
+            try:
+                if restarts < max_restarts:
+                    source.backup(target, pages=step_pages, progress=progress, sleep=sleep)
+                else:
+                    source.backup(target)
+                return watermark, restarts
+            except _Restarted:
+                restarts += 1
+            finally:
+                target.close()
+    finally:
+        source.close()
+
+
+def _compress(path, target_path):
+    with open(path, 'rb') as f, gzip.open(target_path, 'wb', compresslevel=COMPRESS_LEVEL) as out:
+        shutil.copyfileobj(f, out, 1 << 20)
+
+
+def _new_backup_id(backup_dir, label=None):
+    backup_id = datetime.now().strftime('%Y%m%d-%H%M%S') + (f'-{label}' if label else '')
+    candidate, n = backup_id, 1
+    while os.path.exists(os.path.join(backup_dir, candidate)):
+        n += 1
+        candidate = f"{backup_id}-{n}"
+    return candidate
+
+
+def create_backup(sources, backup_dir=BACKUP_DIR, label=None, keep=BACKUP_KEEP):
+    # Backs up every file in `sources` as one set and returns its manifest.
+    # keep=None skips rotation.
+    names = [os.path.basename(path) for path in sources]
+    if len(set(names)) != len(names):
+        raise BackupError("Database files to back up must have distinct names")
+    os.makedirs(backup_dir, exist_ok=True)
+    backup_id = _new_backup_id(backup_dir, label)
+    work_dir = os.path.join(backup_dir, f".{backup_id}.partial")
+    os.makedirs(work_dir)
+    started = time.monotonic()
+    files = []
+    try:
+        for source_path, name in zip(sources, names):
+            copy_path = os.path.join(work_dir, name)
+            watermark, restarts = copy_database(source_path, copy_path)
+            compressed = f"{name}.gz"
+            _compress(copy_path, os.path.join(work_dir, compressed))
+            files.append({
+                'source': os.path.abspath(source_path),
+                'file': compressed,
+                'bytes': os.path.getsize(copy_path),
+                'compressed_bytes': os.path.getsize(os.path.join(work_dir, compressed)),
+                'db_sha256': _sha256(copy_path),
+                'sha256': _sha256(os.path.join(work_dir, compressed)),
+                'watermark': watermark,
+                'restarts': restarts,
+            })
+            os.remove(copy_path)
+        manifest = {
+            'id': backup_id,
+            'label': label,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'seconds': round(time.monotonic() - started, 3),
+            'files': files,
+        }
+        with open(os.path.join(work_dir, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(work_dir, os.path.join(backup_dir, backup_id))
+    except BaseException:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    if keep is not None:
+        rotate_backups(backup_dir, keep)
+    return manifest
+
+
+def _backup_ids(backup_dir):
+    # Complete sets, oldest first; ids sort by time
+    if not os.path.isdir(backup_dir):
+        return []
+    return sorted(name for name in os.listdir(backup_dir)
+                  if os.path.isfile(os.path.join(backup_dir, name, MANIFEST)))
+
+
+def rotate_backups(backup_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+    removed = _backup_ids(backup_dir)[:-keep] if keep > 0 else []
+    for backup_id in removed:
+        shutil.rmtree(os.path.join(backup_dir, backup_id), ignore_errors=True)
+    return removed
+
+
+def read_manifest(backup_id, backup_dir=BACKUP_DIR):
+    try:
+        with open(os.path.join(backup_dir, backup_id, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise BackupError(f"No backup {backup_id} in {backup_dir}")
+
+
+def list_backups(backup_dir=BACKUP_DIR):
+    # Newest first
+    rows = []
+    for backup_id in reversed(_backup_ids(backup_dir)):
+        manifest = read_manifest(backup_id, backup_dir)
+        rows.append({
+            'id': backup_id,
+            'created_at': datetime.fromisoformat(manifest['created_at']),
+            'label': manifest['label'] or '',
+            'files': len(manifest['files']),
+            'mb': sum(entry['bytes'] for entry in manifest['files']) / 1e6,
+            'compressed_mb': sum(entry['compressed_bytes'] for entry in manifest['files']) / 1e6,
+        })
+    return pd.DataFrame(rows, columns=['id', 'created_at', 'label', 'files', 'mb', 'compressed_mb'])
+
+
+# ===================== VERIFY AND RESTORE =====================
+def _extract(backup_dir, backup_id, entry, target_path):
+    # Decompresses one file of a set, checking both checksums
+    archive = os.path.join(backup_dir, backup_id, entry['file'])
+    if _sha256(archive) != entry['sha256']:
+        raise BackupError(f"{entry['file']}: compressed checksum does not match")
+    with gzip.open(archive, 'rb') as f, open(target_path, 'wb') as out:
+        shutil.copyfileobj(f, out, 1 << 20)
+    if _sha256(target_path) != entry['db_sha256']:
+        raise BackupError(f"{entry['file']}: database checksum does not match")
+
+
+def verify_backup(backup_id, backup_dir=BACKUP_DIR):
+    # Checksums plus SQLite's integrity check for every file of a set
+    manifest = read_manifest(backup_id, backup_dir)
+    results = []
+    with tempfile.TemporaryDirectory(dir=backup_dir) as scratch:
+        for entry in manifest['files']:
+            path = os.path.join(scratch, 'verify.db')
+            try:
+                _extract(backup_dir, backup_id, entry, path)
+                conn = sqlite3.connect(path)
+                try:
+                    problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+                finally:
+                    conn.close()
+                ok = problems == ['ok']
+                detail = 'ok' if ok else '; '.join(problems[:5])
+            except (BackupError, OSError, sqlite3.Error) as e:
+                ok, detail = False, str(e)
+            results.append({'file': entry['file'], 'ok': ok, 'detail': detail})
+            if os.path.exists(path):
+                os.remove(path)
+    return results
+
+
+def restore_file(conn, restored_path):
+    # Replaces the contents of the live database behind `conn` with the
+    # file at `restored_path`. Change-log sequence numbers continue from
+    # where the live log was, and the restore is logged as a reset.
+    if conn.in_transaction:
+        conn.commit()
+    watermark = current_watermark(conn)
+    source = sqlite3.connect(restored_path)
+    try:
+        source.backup(conn)
+    finally:
+        source.close()
+    # The snapshot may predate schema changes
+    init_database(conn)
+    conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'change_log'", (watermark,))
+    if conn.execute("SELECT changes()").fetchone()[0] == 0:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('change_log', ?)", (watermark,))
+    record_reset(conn)
+
+
+def _run_direct(path, job):
+    conn = connect(path)
+    try:
+        return job(conn)
+    finally:
+        conn.close()
+
+
+def restore_backup(backup_id, backup_dir=BACKUP_DIR, run=_run_direct, safety_backup=True):
+    # Restores every file of a set to where it was backed up from. `run`
+    # is called as run(path, job) and must call job(conn) on a connection
+    # to that file; the app passes its writer so the restore queues behind
+    # pending saves. Returns the restored paths.
+    manifest = read_manifest(backup_id, backup_dir)
+    existing = [entry['source'] for entry in manifest['files'] if os.path.exists(entry['source'])]
+    restored = []
+    with tempfile.TemporaryDirectory(dir=backup_dir) as scratch:
+        # Check every file before touching any live database
+        for entry in manifest['files']:
+            _extract(backup_dir, backup_id, entry, os.path.join(scratch, entry['file'][:-3]))
+        if safety_backup and existing:
+            create_backup(existing, backup_dir, label='pre-restore', keep=None)
+        for entry in manifest['files']:
+            path = os.path.join(scratch, entry['file'][:-3])
+            if entry['source'] in existing:
+                run(entry['source'], lambda conn, path=path: restore_file(conn, path))
+            else:
+                os.makedirs(os.path.dirname(entry['source']), exist_ok=True)
+                shutil.move(path, entry['source'])
+            restored.append(entry['source'])
+    return restored
+
+
+# ===================== SCHEDULING =====================
+def last_backup_at(backup_dir=BACKUP_DIR):
+    ids = [backup_id for backup_id in _backup_ids(backup_dir) if not backup_id.endswith('pre-restore')]
+    if not ids:
+        return None
+    return datetime.fromisoformat(read_manifest(ids[-1], backup_dir)['created_at'])
+
+
+class BackupScheduler:
+    def __init__(self, sources, backup_dir=BACKUP_DIR, interval=BACKUP_INTERVAL, keep=BACKUP_KEEP,
+                 poll_interval=600):
+        # sources: list of database files, or a callable returning one
+        self.sources = sources
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep = keep
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+
+    def run_due(self):
+        previous = last_backup_at(self.backup_dir)
+        if previous is not None and datetime.now() - previous < timedelta(seconds=self.interval):
+            return None
+        sources = self.sources() if callable(self.sources) else self.sources
+        return create_backup(sources, self.backup_dir, keep=self.keep)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_due()
+            except Exception:
+                logger.exception("Backup failed")
+            self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+def start_backup_thread(sources, **kwargs):
+    scheduler = BackupScheduler(sources, **kwargs)
+    threading.Thread(target=scheduler.run, name='jengahub-backup', daemon=True).start()
+    return scheduler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backups of the Jenga Hub PMS databases")
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('create', help="back up every database file now")
+    create.add_argument('--label', default=None)
+    create.add_argument('--keep', type=int, default=BACKUP_KEEP)
+    listing = commands.add_parser('list', help="list backup sets, newest first")
+    verify = commands.add_parser('verify', help="check a set's checksums and integrity")
+    verify.add_argument('backup_id')
+    restore = commands.add_parser('restore', help="restore a set over the current databases")
+    restore.add_argument('backup_id')
+    restore.add_argument('--no-safety-backup', action='store_true',
+                         help="do not back up the current data first")
+    for command in (create, listing, verify, restore):
+        command.add_argument('--db', default=DB_PATH)
+        command.add_argument('--shard-dir', default=None)
+        command.add_argument('--backup-dir', default=BACKUP_DIR)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'create':
+            manifest = create_backup(backup_sources(args.db, args.shard_dir), args.backup_dir, args.label, args.keep)
+            for entry in manifest['files']:
+                print(f"{entry['source']}: {entry['bytes'] / 1e6:.1f} MB -> {entry['compressed_bytes'] / 1e6:.1f} MB"
+                      + (f" ({entry['restarts']} restarts)" if entry['restarts'] else ""))
+            print(f"Backup {manifest['id']} written in {manifest['seconds']:.1f}s")
+        elif args.command == 'list':
+            print(list_backups(args.backup_dir).round({'mb': 1, 'compressed_mb': 1}).to_string(index=False))
+        elif args.command == 'verify':
+            results = verify_backup(args.backup_id, args.backup_dir)
+            for result in results:
+                print(f"{result['file']}: {result['detail']}")
+            if not all(result['ok'] for result in results):
+                raise SystemExit(1)
+        else:
+            for path in restore_backup(args.backup_id, args.backup_dir,
+                                       safety_backup=not args.no_safety_backup):
+                print(f"Restored {path}")
+    except BackupError as e:
+        parser.error(str(e))
+
+
+if __name__ == '__main__':
+    main()
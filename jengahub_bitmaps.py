@@ -0,0 +1,551 @@
+"""Bitmap attendance store: one row of bitsets per school day.
+
+Most attendance rows only say "Present". This store keeps each school day
+as bitsets over a stable per-school roster ordering. There are three
+status masks (present, late, absent) and three bit planes holding the
+behaviour score (1-7). Comments stay as sparse rows. A day for 1,000
+students is about 750 bytes, against tens of kilobytes of rows and index
+entries. Counts and rates are popcounts over the stacked day bitsets, so
+a year-long scan reads a few hundred small blobs instead of every row.
+
+The attendance table stays the store of record: the write path, change
+log, notifications and student totals all work on rows. The store follows
+it through the change log. New attendance is packed into the affected
+days; edits and deletes repack the school. attendance_bitmap_rows expands
+the store back into attendance's row shape, one record per student per day
+with the latest record winning.
+
+The bitmap queries return exactly what the SQL in jengahub_analytics.QUERIES
+returns for the same rows. A day's bitsets can only stand for one Present,
+Late or Absent record per student with a score of 1-7 or none. Rows beyond
+that (a second record for the same student and day, any other status or
+score, no student, or a date with a time part) are counted per day in
+attendance_bitmap_counts, and any date range that touches such a day is
+answered by the SQL queries instead.
+
+    JENGAHUB_ANALYTICS=bitmap   answer attendance rate/count queries from bitmaps
+
+    python3 jengahub_bitmaps.py sync
+    python3 jengahub_bitmaps.py stats --school 1
+"""
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from jengahub_analytics import ANALYTICS_BACKEND, SqliteBackend
+from jengahub_cdc import data_version, pruned_before
+from jengahub_db import DB_PATH, connect
+
+BITMAPS_ENABLED = ANALYTICS_BACKEND == 'bitmap'
+
+STATUSES = ['Present', 'Late', 'Absent']
+PLANES = ['present', 'late', 'absent', 'score0', 'score1', 'score2']
+# Behaviour scores are stored in three bits; 0 means no score
+MAX_SCORE = 7
+SCORES = range(1, MAX_SCORE + 1)
+
+# Byte value of a one-byte blob b is instr(_BYTES, b) - 1
+_BYTES = "X'" + bytes(range(256)).hex() + "'"
+
+
+def _bit(plane):
+    return f"(((instr({_BYTES}, substr(b.{plane}, r.position / 8 + 1, 1)) - 1) >> (r.position % 8)) & 1)"
+
+
+BITMAP_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS attendance_roster (
+        school_id INTEGER NOT NULL,
+        student_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        PRIMARY KEY (school_id, student_id)
+    ) WITHOUT ROWID
+    ''',
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_roster_position ON attendance_roster(school_id, position)",
+    f'''
+    CREATE TABLE IF NOT EXISTS attendance_bitmaps (
+        school_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        {', '.join(f'{plane} BLOB NOT NULL' for plane in PLANES)},
+        PRIMARY KEY (school_id, date)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS attendance_bitmap_comments (
+        school_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        student_id INTEGER NOT NULL,
+        behaviour_comment TEXT,
+        PRIMARY KEY (school_id, date, student_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS attendance_bitmap_counts (
+        school_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        records INTEGER NOT NULL,
+        odd INTEGER NOT NULL,
+        loose INTEGER NOT NULL,
+        PRIMARY KEY (school_id, date)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS attendance_bitmap_state (
+        school_id INTEGER PRIMARY KEY,
+        watermark INTEGER NOT NULL,
+        built_at TEXT
+    )
+    ''',
+    # attendance's row shape; attendance_id is not kept
+    f'''
+    CREATE VIEW IF NOT EXISTS attendance_bitmap_rows AS
+    SELECT NULL AS attendance_id, student_id, school_id, date,
+           CASE WHEN present THEN 'Present' WHEN late THEN 'Late' WHEN absent THEN 'Absent' END AS status,
+           NULLIF(score0 + 2 * score1 + 4 * score2, 0) AS behaviour_score,
+           behaviour_comment
+    FROM (
+        SELECT b.school_id, b.date, r.student_id, c.behaviour_comment,
+               {', '.join(f'{_bit(plane)} AS {plane}' for plane in PLANES)}
+        FROM attendance_bitmaps b
+        JOIN attendance_roster r ON r.school_id = b.school_id
+        LEFT JOIN attendance_bitmap_comments c
+               ON c.school_id = b.school_id AND c.date = b.date AND c.student_id = r.student_id
+    )
+    WHERE present OR late OR absent
+    ''',
+]
+
+
+def init_bitmaps(conn):
+    counted = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'attendance_bitmap_counts'"
+    ).fetchone() is not None
+    for statement in BITMAP_SCHEMA:
+        conn.execute(statement)
+    if not counted:
+        # Stores packed before the per-day counts existed are repacked at the next sync
+        conn.execute("DELETE FROM attendance_bitmap_state")
+    conn.commit()
+
+
+# ===================== PACKING =====================
+def _positions(conn, school_id, student_ids):
+    # Roster positions, assigning the next free ones to new students.
+    # Positions are never reused until the school is repacked.
+    roster = dict(conn.execute(
+        "SELECT student_id, position FROM attendance_roster WHERE school_id=?", (school_id,)
+    ).fetchall())
+    new = sorted({int(s) for s in student_ids} - roster.keys())
+    if new:
+        first = max(roster.values(), default=-1) + 1
+        conn.executemany(
+            "INSERT INTO attendance_roster (school_id, student_id, position) VALUES (?, ?, ?)",
+            [(school_id, student_id, first + i) for i, student_id in enumerate(new)]
+        )
+        roster.update((student_id, first + i) for i, student_id in enumerate(new))
+    return roster
+
+
+def _cells(rows, roster):
+    # (position, status code, score) per row, in the order given
+    positions = np.array([roster[int(row[1])] for row in rows], dtype=np.int64)
+    codes = np.array([STATUSES.index(row[3]) + 1 if row[3] in STATUSES else 0 for row in rows], dtype=np.int8)
+    scores = np.array([row[4] if row[4] is not None and 0 < row[4] <= MAX_SCORE else 0 for row in rows],
+                      dtype=np.int8)
+    return positions, codes, scores
+
+
+def _odd(rows):
+    # Rows the bitsets cannot stand for whatever else is recorded that day
+    return np.array([row[1] is None or len(str(row[2])) != 10
+                     or (row[4] is not None and row[4] not in SCORES) for row in rows], dtype=np.int64)
+
+
+def _pack(codes, scores):
+    # codes/scores: (days, roster) int8 grids -> one (days, bytes) array per plane
+    planes = [codes == i + 1 for i in range(len(STATUSES))]
+    planes += [(scores >> bit) & 1 == 1 for bit in range(3)]
+    return [np.packbits(plane, axis=1, bitorder='little') for plane in planes]
+
+
+def _unpack(blobs, width):
+    # One day's blobs -> (codes, scores) int8 vectors over `width` positions
+    bits = [np.unpackbits(np.frombuffer(blob, dtype=np.uint8), bitorder='little') for blob in blobs]
+    bits = [np.pad(b[:width], (0, max(0, width - len(b)))) for b in bits]
+    codes = np.zeros(width, dtype=np.int8)
+    for i in range(len(STATUSES)):
+        codes[bits[i] == 1] = i + 1
+    scores = (bits[3] | bits[4] << 1 | bits[5] << 2).astype(np.int8)
+    return codes, scores
+
+
+def _write_days(conn, school_id, dates, codes, scores):
+    planes = _pack(codes, scores)
+    conn.executemany(
+        f"INSERT OR REPLACE INTO attendance_bitmaps (school_id, date, {', '.join(PLANES)}) "
+        f"VALUES (?, ?, {', '.join('?' * len(PLANES))})",
+        [(school_id, day) + tuple(plane[i].tobytes() for plane in planes) for i, day in enumerate(dates)]
+    )
+
+
+def _write_counts(conn, school_id, dates, records, odd, codes):
+    # loose: rows of the day that its bitsets do not show as they are
+    loose = records - (codes != 0).sum(axis=1) + odd
+    conn.executemany(
+        "INSERT OR REPLACE INTO attendance_bitmap_counts (school_id, date, records, odd, loose) VALUES (?, ?, ?, ?, ?)",
+        [(school_id, day, int(records[i]), int(odd[i]), int(loose[i])) for i, day in enumerate(dates)]
+    )
+
+
+def _write_comments(conn, school_id, rows):
+    # Rows in attendance_id order; a later record without a comment clears it
+    latest = {(str(row[2])[:10], int(row[1])): row[5] for row in rows}
+    conn.executemany(
+        "INSERT OR REPLACE INTO attendance_bitmap_comments (school_id, date, student_id, behaviour_comment) "
+        "VALUES (?, ?, ?, ?)",
+        [(school_id, day, student_id, comment) for (day, student_id), comment in latest.items() if comment]
+    )
+    conn.executemany(
+        "DELETE FROM attendance_bitmap_comments WHERE school_id=? AND date=? AND student_id=?",
+        [(school_id, day, student_id) for (day, student_id), comment in latest.items() if not comment]
+    )
+
+
+def _set_state(conn, school_id, watermark):
+    conn.execute(
+        "INSERT OR REPLACE INTO attendance_bitmap_state (school_id, watermark, built_at) VALUES (?, ?, ?)",
+        (school_id, watermark, datetime.now().isoformat(timespec='seconds'))
+    )
+
+
+def rebuild_bitmaps(conn, school_id):
+    # Repacks every day of the school from the attendance rows. The caller
+    # commits (the writer does, for jobs run through it).
+    school_id = int(school_id)
+    watermark = data_version(conn, school_id, ['attendance'])
+    for table in ['attendance_bitmaps', 'attendance_bitmap_counts', 'attendance_bitmap_comments', 'attendance_roster']:
+        conn.execute(f"DELETE FROM {table} WHERE school_id=?", (school_id,))
+
+    rows = conn.execute('''
+        SELECT attendance_id, student_id, date, status, behaviour_score, behaviour_comment
+        FROM attendance WHERE school_id=? AND date IS NOT NULL
+        ORDER BY attendance_id
+    ''', (school_id,)).fetchall()
+    if rows:
+        dates, days = np.unique(np.array([str(row[2])[:10] for row in rows]), return_inverse=True)
+        has_student = np.array([row[1] is not None for row in rows], dtype=bool)
+        kept = [row for row in rows if row[1] is not None]
+        roster = _positions(conn, school_id, [row[1] for row in kept])
+        positions, codes, scores = _cells(kept, roster)
+        kept_days = days[has_student]
+
+        # Latest record per student and day wins
+        flat = kept_days * len(roster) + positions
+        _, last = np.unique(flat[::-1], return_index=True)
+        last = len(flat) - 1 - last
+        grid_codes = np.zeros((len(dates), len(roster)), dtype=np.int8)
+        grid_scores = np.zeros((len(dates), len(roster)), dtype=np.int8)
+        grid_codes[kept_days[last], positions[last]] = codes[last]
+        grid_scores[kept_days[last], positions[last]] = scores[last]
+        dates = [str(day) for day in dates]
+        _write_days(conn, school_id, dates, grid_codes, grid_scores)
+        _write_counts(conn, school_id, dates, np.bincount(days, minlength=len(dates)),
+                      np.bincount(days, weights=_odd(rows), minlength=len(dates)).astype(np.int64), grid_codes)
+        _write_comments(conn, school_id, kept)
+    _set_state(conn, school_id, watermark)
+    return len(rows)
+
+
+def sync_bitmaps(conn, school_id):
+    # Brings the school's bitmaps up to date with the change log: added
+    # rows are packed into their days, anything else repacks the school.
+    # Returns the number of attendance rows read.
+    school_id = int(school_id)
+    state = conn.execute(
+        "SELECT watermark FROM attendance_bitmap_state WHERE school_id=?", (school_id,)
+    ).fetchone()
+    if state is None or state[0] + 1 < pruned_before(conn):
+        return rebuild_bitmaps(conn, school_id)
+    log = conn.execute('''
+        SELECT seq, op, pk FROM change_log
+        WHERE seq > ? AND table_name = 'attendance' AND (school_id = ? OR school_id IS NULL)
+        ORDER BY seq
+    ''', (state[0], school_id)).fetchall()
+    if not log:
+        return 0
+    if any(op != 'I' for _, op, _ in log):
+        return rebuild_bitmaps(conn, school_id)
+
+    added = [pk for _, _, pk in log]
+    rows = []
+    for i in range(0, len(added), 500):
+        chunk = added[i:i + 500]
+        rows += conn.execute(f'''
+            SELECT attendance_id, student_id, date, status, behaviour_score, behaviour_comment
+            FROM attendance WHERE attendance_id IN ({','.join('?' * len(chunk))}) AND date IS NOT NULL
+        ''', chunk).fetchall()
+    rows.sort()
+    if rows:
+        row_dates = np.array([str(row[2])[:10] for row in rows])
+        odd = _odd(rows)
+        kept = [row for row in rows if row[1] is not None]
+        kept_dates = row_dates[[row[1] is not None for row in rows]]
+        roster = _positions(conn, school_id, [row[1] for row in kept])
+        width = len(roster)
+        positions, codes, scores = _cells(kept, roster)
+        dates = sorted(set(row_dates))
+        grid_codes = np.zeros((len(dates), width), dtype=np.int8)
+        grid_scores = np.zeros((len(dates), width), dtype=np.int8)
+        day_rows = np.zeros(len(dates), dtype=np.int64)
+        day_odd = np.zeros(len(dates), dtype=np.int64)
+        for i, day in enumerate(dates):
+            stored = conn.execute(
+                f"SELECT {', '.join(PLANES)} FROM attendance_bitmaps WHERE school_id=? AND date=?", (school_id, day)
+            ).fetchone()
+            if stored:
+                grid_codes[i], grid_scores[i] = _unpack(stored, width)
+            counted = conn.execute(
+                "SELECT records, odd FROM attendance_bitmap_counts WHERE school_id=? AND date=?", (school_id, day)
+            ).fetchone() or (0, 0)
+            day_rows[i] = counted[0] + np.sum(row_dates == day)
+            day_odd[i] = counted[1] + odd[row_dates == day].sum()
+            # Rows are in attendance_id order, so later records overwrite earlier ones
+            for j in np.flatnonzero(kept_dates == day):
+                grid_codes[i, positions[j]] = codes[j]
+                grid_scores[i, positions[j]] = scores[j]
+        _write_days(conn, school_id, dates, grid_codes, grid_scores)
+        _write_counts(conn, school_id, dates, day_rows, day_odd, grid_codes)
+        _write_comments(conn, school_id, kept)
+    _set_state(conn, school_id, log[-1][0])
+    return len(rows)
+
+
+def bitmaps_current(conn, school_id):
+    state = conn.execute(
+        "SELECT watermark FROM attendance_bitmap_state WHERE school_id=?", (int(school_id),)
+    ).fetchone()
+    return state is not None and data_version(conn, school_id, ['attendance']) <= state[0]
+
+
+def loose_days(conn, school_id, start, end):
+    # Days in range holding rows that only the SQL queries count as they are
+    return conn.execute(
+        "SELECT COUNT(*) FROM attendance_bitmap_counts WHERE school_id=? AND date BETWEEN ? AND ? AND loose > 0",
+        (int(school_id), str(start), str(end))
+    ).fetchone()[0]
+
+
+# ===================== QUERIES =====================
+def load_days(conn, school_id, start, end):
+    # (dates, planes): planes is a (len(PLANES), days, bytes) uint8 array
+    rows = conn.execute(
+        f"SELECT date, {', '.join(PLANES)} FROM attendance_bitmaps "
+        f"WHERE school_id=? AND date BETWEEN ? AND ? ORDER BY date",
+        (int(school_id), str(start), str(end))
+    ).fetchall()
+    width = max((len(blob) for row in rows for blob in row[1:]), default=0)
+    planes = np.zeros((len(PLANES), len(rows), width), dtype=np.uint8)
+    for j, row in enumerate(rows):
+        for i, blob in enumerate(row[1:]):
+            planes[i, j, :len(blob)] = np.frombuffer(blob, dtype=np.uint8)
+    return [row[0] for row in rows], planes
+
+
+def _count(bits):
+    # Set bits per day
+    return np.bitwise_count(bits).sum(axis=-1, dtype=np.int64)
+
+
+def status_counts(planes, mask=None):
+    # (days, 3) Present/Late/Absent counts, optionally within a roster mask
+    status = planes[:len(STATUSES)]
+    if mask is not None:
+        status = status & mask
+    return np.stack([_count(plane) for plane in status], axis=1)
+
+
+def score_counts(planes, mask=None):
+    # Records per behaviour score 0..MAX_SCORE (0: recorded without a score)
+    recorded = planes[0] | planes[1] | planes[2]
+    if mask is not None:
+        recorded = recorded & mask
+    counts = np.zeros(MAX_SCORE + 1, dtype=np.int64)
+    for score in range(MAX_SCORE + 1):
+        match = recorded
+        for bit in range(3):
+            plane = planes[len(STATUSES) + bit]
+            match = match & (plane if score >> bit & 1 else ~plane)
+        counts[score] = _count(match).sum()
+    return counts
+
+
+def roster_mask(conn, school_id, width, grade):
+    # Packed mask of the roster positions of students currently in `grade`
+    positions = [position for (position,) in conn.execute('''
+        SELECT r.position FROM attendance_roster r JOIN students s ON s.student_id = r.student_id
+        WHERE r.school_id=? AND s.grade IS ?
+    ''', (int(school_id), grade))]
+    bits = np.zeros(width * 8, dtype=bool)
+    bits[[p for p in positions if p < width * 8]] = True
+    return np.packbits(bits, bitorder='little')
+
+
+def _rate(present, records):
+    return 100.0 * present / records if records else None
+
+
+def attendance_overview(conn, school_id, start, end):
+    _, planes = load_days(conn, school_id, start, end)
+    counts = status_counts(planes).sum(axis=0)
+    scores = score_counts(planes)
+    scored = np.flatnonzero(scores[1:]) + 1
+    return pd.DataFrame([{
+        'records': int(counts.sum()),
+        'attendance_rate': _rate(counts[0], counts.sum()),
+        'avg_behaviour': float((scores[1:] * np.arange(1, MAX_SCORE + 1)).sum() / scores[1:].sum()) if len(scored) else None,
+        'max_behaviour': int(scored.max()) if len(scored) else None,
+        'min_behaviour': int(scored.min()) if len(scored) else None,
+    }])
+
+
+def attendance_by_status(conn, school_id, start, end):
+    _, planes = load_days(conn, school_id, start, end)
+    counts = status_counts(planes).sum(axis=0)
+    frame = pd.DataFrame({'status': STATUSES, 'count': counts})
+    return frame[frame['count'] > 0].sort_values('count', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def attendance_by_day(conn, school_id, start, end):
+    dates, planes = load_days(conn, school_id, start, end)
+    counts = status_counts(planes)
+    frame = pd.DataFrame({'date': dates, 'present': counts[:, 0], 'records': counts.sum(axis=1)})
+    frame = frame[frame['records'] > 0]
+    return pd.DataFrame({'date': frame['date'], 'attendance_rate': 100.0 * frame['present'] / frame['records']}
+                        ).reset_index(drop=True)
+
+
+def attendance_by_month(conn, school_id, start, end):
+    dates, planes = load_days(conn, school_id, start, end)
+    counts = status_counts(planes)
+    frame = pd.DataFrame({'month': [d[:7] for d in dates], 'present': counts[:, 0], 'records': counts.sum(axis=1)})
+    frame = frame.groupby('month', sort=True)[['present', 'records']].sum()
+    frame = frame[frame['records'] > 0]
+    return pd.DataFrame({'month': frame.index, 'attendance_rate': 100.0 * frame['present'] / frame['records']}
+                        ).reset_index(drop=True)
+
+
+def attendance_by_grade(conn, school_id, start, end):
+    _, planes = load_days(conn, school_id, start, end)
+    grades = [g for (g,) in conn.execute(
+        "SELECT DISTINCT grade FROM students WHERE school_id=? AND grade IS NOT NULL ORDER BY grade",
+        (int(school_id),)
+    )]
+    recorded = np.bitwise_or.reduce(planes[0] | planes[1] | planes[2], axis=0) if planes.shape[1] else None
+    rows = []
+    for grade in grades:
+        mask = roster_mask(conn, school_id, planes.shape[2], grade)
+        counts = status_counts(planes, mask).sum(axis=0)
+        if counts.sum():
+            rows.append({'grade': grade, 'attendance_rate': _rate(counts[0], counts.sum()),
+                         'students': int(np.bitwise_count(recorded & mask).sum())})
+    return pd.DataFrame(rows, columns=['grade', 'attendance_rate', 'students'])
+
+
+def behaviour_distribution(conn, school_id, start, end):
+    _, planes = load_days(conn, school_id, start, end)
+    scores = score_counts(planes)
+    rows = [{'behaviour_score': None, 'count': int(scores[0])}] if scores[0] else []
+    rows += [{'behaviour_score': score, 'count': int(scores[score])}
+             for score in range(1, MAX_SCORE + 1) if scores[score]]
+    return pd.DataFrame(rows, columns=['behaviour_score', 'count'])
+
+
+BITMAP_QUERIES = {
+    'attendance_overview': attendance_overview,
+    'attendance_by_status': attendance_by_status,
+    'attendance_by_day': attendance_by_day,
+    'attendance_by_month': attendance_by_month,
+    'attendance_by_grade': attendance_by_grade,
+    'behaviour_distribution': behaviour_distribution,
+}
+
+
+class BitmapBackend(SqliteBackend):
+    # Attendance rate and count queries come from the bitmaps while they
+    # are current and the range has no loose rows; everything else runs the SQL
+    name = 'SQLite + bitmaps'
+
+    def query(self, name, school_id, start, end):
+        conn = self.db.connection(school_id)
+        if name in BITMAP_QUERIES and bitmaps_current(conn, school_id) and not loose_days(conn, school_id, start, end):
+            return BITMAP_QUERIES[name](conn, school_id, start, end)
+        return super().query(name, school_id, start, end)
+
+
+# ===================== STATS =====================
+def storage_bytes(conn, school_id):
+    # (row store bytes, bitmap store bytes) of the school's attendance data
+    rows = conn.execute('''
+        SELECT COALESCE(SUM(length(date) + length(status) + length(behaviour_comment) + 24), 0)
+        FROM attendance WHERE school_id=?
+    ''', (int(school_id),)).fetchone()[0]
+    bitmaps = conn.execute(
+        f"SELECT COALESCE(SUM({' + '.join(f'length({plane})' for plane in PLANES)} + length(date) + 8), 0) "
+        f"FROM attendance_bitmaps WHERE school_id=?", (int(school_id),)
+    ).fetchone()[0]
+    bitmaps += conn.execute(
+        "SELECT COALESCE(SUM(length(behaviour_comment) + length(date) + 16), 0) "
+        "FROM attendance_bitmap_comments WHERE school_id=?", (int(school_id),)
+    ).fetchone()[0]
+    bitmaps += 12 * conn.execute(
+        "SELECT COUNT(*) FROM attendance_roster WHERE school_id=?", (int(school_id),)
+    ).fetchone()[0]
+    return rows, bitmaps
+
+
+def main(argv=None):
+    from jengahub_db import init_database
+    from jengahub_shards import SHARD_DIR, open_router
+
+    parser = argparse.ArgumentParser(description="Bitmap attendance store for Jenga Hub PMS")
+    parser.add_argument('command', choices=['sync', 'rebuild', 'stats'])
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--shard-dir', default=SHARD_DIR)
+    parser.add_argument('--school', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    catalog = connect(args.db)
+    db = open_router(catalog, args.shard_dir)
+    schools = [args.school] if args.school is not None else [s for (s,) in catalog.execute(
+        "SELECT school_id FROM schools ORDER BY school_id")]
+    for school_id in schools:
+        conn = db.connection(school_id)
+        init_database(conn)
+        if args.command in ('sync', 'rebuild'):
+            started = time.perf_counter()
+            with conn:
+                read = (rebuild_bitmaps if args.command == 'rebuild' else sync_bitmaps)(conn, school_id)
+            print(f"School {school_id}: {read:,} rows packed in {time.perf_counter() - started:.2f}s")
+            continue
+
+        if not bitmaps_current(conn, school_id):
+            print(f"School {school_id}: bitmaps are not current; run sync first")
+            continue
+        row_bytes, bitmap_bytes = storage_bytes(conn, school_id)
+        started = time.perf_counter()
+        pd.read_sql_query("SELECT status, COUNT(*) FROM attendance WHERE school_id=? GROUP BY status",
+                          conn, params=(school_id,))
+        sql_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        attendance_by_status(conn, school_id, '0000-01-01', '9999-12-31')
+        bitmap_seconds = time.perf_counter() - started
+        print(f"School {school_id}: rows {row_bytes / 1e6:.2f} MB, bitmaps {bitmap_bytes / 1e6:.2f} MB "
+              f"({row_bytes / max(bitmap_bytes, 1):.0f}x); status counts "
+              f"{sql_seconds * 1000:.1f} ms SQL, {bitmap_seconds * 1000:.1f} ms bitmaps")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""Result cache shared by every app process on the host, kept on disk.
+
+Computed frames (analytics query results, score frames, custom-range
+reports) are pickled into a SQLite file, JENGAHUB_CACHE_PATH, so they
+survive restarts and deploys and are shared between app processes. Each
+entry is keyed by a fingerprint of what was computed (the query, its
+parameters and the database file) and stores the data version it was
+computed at (see jengahub_cdc.data_version). A lookup with a different
+version is a miss, so entries never need explicit invalidation. The most
+recently used entries are also held in memory, still pickled, so every
+caller gets its own copy. When the file grows past JENGAHUB_CACHE_MB, the
+least recently used entries are evicted. An empty JENGAHUB_CACHE_PATH
+turns the disk tier off. Within a process, concurrent requests for the
+same entry compute it once; the others wait for the result.
+
+    python3 jengahub_cache.py stats
+    python3 jengahub_cache.py clear
+"""
+import argparse
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_PATH = os.environ.get('JENGAHUB_CACHE_PATH', 'result_cache.db')
+CACHE_MB = float(os.environ.get('JENGAHUB_CACHE_MB', 256))
+MEMORY_MB = float(os.environ.get('JENGAHUB_CACHE_MEMORY_MB', 64))
+# Evicting stops once the store is back under this share of its limit
+EVICT_TO = 0.9
+# A hit only rewrites last_used when it is older than this, so hot
+# entries do not turn every read into a write
+TOUCH_INTERVAL = 60
+BUSY_TIMEOUT_MS = 2000
+
+CACHE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        value BLOB NOT NULL,
+        bytes INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_cache_entries_last_used ON cache_entries(last_used)",
+]
+
+
+def fingerprint(namespace, *parts):
+    # Stable across processes (unlike hash()); parts are reduced to their
+    # str() form, so dates, numpy ints and plain values key alike
+    digest = hashlib.sha256('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+    return f"{namespace}:{digest[:32]}"
+
+
+class ResultCache:
+    def __init__(self, path=CACHE_PATH, max_mb=CACHE_MB, memory_mb=MEMORY_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1e6)
+        self.memory_bytes = int(memory_mb * 1e6)
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._local = threading.local()
+        self._ready = False
+        self.hits = {'memory': 0, 'disk': 0, 'miss': 0}
+
+    # ----- disk tier -----
+    def _conn(self):
+        # One connection per thread; WAL lets processes read while one writes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000)
+            conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            if not self._ready:
+                conn.execute("PRAGMA journal_mode = WAL")
+                for statement in CACHE_SCHEMA:
+                    conn.execute(statement)
+                conn.commit()
+                self._ready = True
+            self._local.conn = conn
+        return conn
+
+    def _disk_get(self, key, version):
+        conn = self._conn()
+        row = conn.execute("SELECT version, value, last_used FROM cache_entries WHERE key=?", (key,)).fetchone()
+        if row is None or row[0] != version:
+            return None
+        now = time.time()
+        if now - row[2] > TOUCH_INTERVAL:
+            conn.execute("UPDATE cache_entries SET last_used=? WHERE key=?", (now, key))
+            conn.commit()
+        return row[1]
+
+    def _disk_put(self, key, version, blob):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('''
+            INSERT OR REPLACE INTO cache_entries (key, version, value, bytes, created_at, last_used)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (key, version, blob, len(blob), now, now))
+        conn.commit()
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM cache_entries").fetchone()[0]
+        if total > self.max_bytes:
+            self._evict(conn, total - int(self.max_bytes * EVICT_TO))
+
+    def _evict(self, conn, excess):
+        # Least recently used first, until `excess` bytes are gone
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, bytes FROM cache_entries ORDER BY last_used"):
+            if freed >= excess:
+                break
+            victims.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM cache_entries WHERE key=?", victims)
+        conn.commit()
+        return len(victims)
+
+    # ----- memory tier -----
+    def _remember(self, key, version, blob):
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_size -= len(previous[1])
+            if len(blob) > self.memory_bytes:
+                return
+            self._memory[key] = (version, blob)
+            self._memory_size += len(blob)
+            while self._memory_size > self.memory_bytes:
+                _, (_, evicted) = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    # ----- callers -----
+    def get(self, key, version):
+        # The cached value for `key` at `version`, or None
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None and cached[0] == version:
+                self._memory.move_to_end(key)
+                self.hits['memory'] += 1
+                return pickle.loads(cached[1])
+        blob = None
+        if self.path:
+            try:
+                blob = self._disk_get(key, version)
+            except sqlite3.Error:
+                # A busy or damaged cache file is only a miss
+                blob = None
+        if blob is None:
+            self.hits['miss'] += 1
+            return None
+        self.hits['disk'] += 1
+        self._remember(key, version, blob)
+        return pickle.loads(blob)
+
+    def put(self, key, version, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, version, blob)
+        if self.path:
+            try:
+                self._disk_put(key, version, blob)
+            except sqlite3.Error:
+                pass
+
+    def get_or_compute(self, key, version, compute):
+        while True:
+            value = self.get(key, version)
+            if value is not None:
+                return value
+            with self._lock:
+                computing = self._inflight.get((key, version))
+                if computing is None:
+                    computing = self._inflight[(key, version)] = threading.Event()
+                    break
+            # Someone else is computing it; if they fail, try ourselves
+            computing.wait()
+        try:
+            value = compute()
+            self.put(key, version, value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[(key, version)]
+            computing.set()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        if self.path:
+            conn = self._conn()
+            conn.execute("DELETE FROM cache_entries")
+            conn.commit()
+
+    def stats(self):
+        stats = {'memory_entries': len(self._memory), 'memory_mb': self._memory_size / 1e6, **self.hits}
+        if self.path:
+            entries, size = self._conn().execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM cache_entries"
+            ).fetchone()
+            stats.update(disk_entries=entries, disk_mb=size / 1e6)
+        return stats
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache():
+    # The process-wide cache
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ResultCache()
+        return _shared
+
+
+def cached(namespace, parts, version, compute):
+    # compute() once per (namespace, parts, version) across processes and restarts
+    return shared_cache().get_or_compute(fingerprint(namespace, *parts), version, compute)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jenga Hub PMS result cache")
+    parser.add_argument('command', choices=['stats', 'clear'])
+    parser.add_argument('--path', default=CACHE_PATH)
+    args = parser.parse_args(argv)
+    if not args.path:
+        parser.error("the disk cache is turned off (JENGAHUB_CACHE_PATH is empty)")
+
+    cache = ResultCache(args.path)
+    if args.command == 'clear':
+        cache.clear()
+        print(f"Cleared {args.path}")
+        return
+    stats = cache.stats()
+    print(f"{args.path}: {stats['disk_entries']} entries, {stats['disk_mb']:.1f} MB "
+          f"(limit {cache.max_bytes / 1e6:.0f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""Attendance calendar: a dense student x day status matrix per class and term.
+
+build_matrix reads a class's attendance for the term once and scatters it
+into an int8 NumPy array, one row per student and one column per day of
+the term. Matrices are cached per (database, school, grade, term). When
+attendance is added, the cached matrix is patched with just the new rows,
+found through the change log. Any other change to the school's attendance
+or students (edits, deletes, a student changing class) rebuilds it. The
+class heatmap, a student's calendar and the weekday summary are all
+slices of the matrix.
+"""
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from jengahub_cdc import current_watermark, pruned_before
+from jengahub_db import database_path
+from jengahub_terms import term_bounds
+
+CACHE_ENTRIES = 32
+
+# Cell codes, in order of concern; 0 is a day with no record
+NO_RECORD = 0
+STATUS_CODES = {'Present': 1, 'Late': 2, 'Absent': 3}
+STATUS_LABELS = np.array(['No record', 'Present', 'Late', 'Absent'], dtype=object)
+STATUS_COLOURS = ['#eeeeee', '#2ca02c', '#ff9f1c', '#d62728']
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class AttendanceMatrix:
+    # statuses[i, j] is the code for student_ids[i] on days[j]. Treated as
+    # immutable once cached; updates produce a new matrix.
+    def __init__(self, student_ids, names, start, end, statuses, watermark):
+        self.student_ids = student_ids
+        self.names = names
+        self.start = start
+        self.end = end
+        self.statuses = statuses
+        self.watermark = watermark
+
+    @property
+    def days(self):
+        return pd.date_range(self.start, self.end, freq='D')
+
+    def row(self, student_id):
+        index = int(np.searchsorted(self.student_ids, student_id))
+        if index == len(self.student_ids) or self.student_ids[index] != student_id:
+            raise KeyError(student_id)
+        return index
+
+
+# ===================== BUILDING =====================
+def _scatter(statuses, student_ids, start, rows):
+    # Writes (student_id, date, status) rows into the matrix in order, so
+    # the latest record for a student and day wins
+    if not rows:
+        return 0
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    days = (np.array([str(row[1])[:10] for row in rows], dtype='datetime64[D]') - np.datetime64(start)).astype(np.int64)
+    codes = np.array([STATUS_CODES.get(row[2], NO_RECORD) for row in rows], dtype=np.int8)
+
+    positions = np.searchsorted(student_ids, ids)
+    known = positions < len(student_ids)
+    known[known] = student_ids[positions[known]] == ids[known]
+    in_term = (days >= 0) & (days < statuses.shape[1])
+    keep = known & in_term
+    positions, days, codes = positions[keep], days[keep], codes[keep]
+
+    # Fancy assignment does not promise an order for repeated cells, so
+    # keep only the last write to each one
+    flat = positions * statuses.shape[1] + days
+    _, last = np.unique(flat[::-1], return_index=True)
+    last = len(flat) - 1 - last
+    statuses[positions[last], days[last]] = codes[last]
+    return int(keep.sum())
+
+
+def build_matrix(conn, school_id, grade, term):
+    start, end = term_bounds(term)
+    # Read before the rows: anything written in between is applied again
+    # by the next update, which is harmless
+    watermark = current_watermark(conn)
+    students = conn.execute(
+        "SELECT student_id, name FROM students WHERE school_id=? AND grade IS ? ORDER BY student_id",
+        (int(school_id), grade)
+    ).fetchall()
+    student_ids = np.array([student_id for student_id, _ in students], dtype=np.int64)
+    statuses = np.zeros((len(students), (end - start).days + 1), dtype=np.int8)
+
+    rows = conn.execute('''
+        SELECT a.student_id, a.date, a.status
+        FROM students s JOIN attendance a ON a.student_id = s.student_id
+        WHERE s.school_id=? AND s.grade IS ? AND a.date BETWEEN ? AND ?
+        ORDER BY a.attendance_id
+    ''', (int(school_id), grade, str(start), str(end))).fetchall()
+    _scatter(statuses, student_ids, start, rows)
+    return AttendanceMatrix(student_ids, [name for _, name in students], start, end, statuses, watermark)
+
+
+def update_matrix(conn, matrix, school_id, grade, term):
+    # Returns `matrix` if nothing changed, a patched copy if attendance was
+    # only added, or a fresh build after any other change (or once the
+    # entries it would need have been pruned)
+    if matrix.watermark + 1 < pruned_before(conn):
+        return build_matrix(conn, school_id, grade, term)
+    log = conn.execute('''
+        SELECT seq, table_name, op, pk FROM change_log
+        WHERE seq > ? AND (school_id = ? OR school_id IS NULL)
+          AND table_name IN ('attendance', 'students')
+        ORDER BY seq
+    ''', (matrix.watermark, int(school_id))).fetchall()
+    if not log:
+        return matrix
+    if any(table != 'attendance' or op != 'I' for _, table, op, _ in log):
+        return build_matrix(conn, school_id, grade, term)
+
+    added = [pk for _, _, _, pk in log]
+    rows = []
+    for i in range(0, len(added), 500):
+        chunk = added[i:i + 500]
+        rows += conn.execute(f'''
+            SELECT a.student_id, a.date, a.status
+            FROM attendance a JOIN students s ON s.student_id = a.student_id
+            WHERE a.attendance_id IN ({','.join('?' * len(chunk))}) AND s.grade IS ?
+            ORDER BY a.attendance_id
+        ''', chunk + [grade]).fetchall()
+    statuses = matrix.statuses.copy()
+    _scatter(statuses, matrix.student_ids, matrix.start, rows)
+    return AttendanceMatrix(matrix.student_ids, matrix.names, matrix.start, matrix.end, statuses, log[-1][0])
+
+
+def attendance_matrix(conn, school_id, grade, term):
+    # Cached matrix for a class and term, brought up to date with the change log
+    key = (database_path(conn), int(school_id), grade, term)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is None:
+        matrix = build_matrix(conn, school_id, grade, term)
+    else:
+        matrix = update_matrix(conn, cached, school_id, grade, term)
+    with _cache_lock:
+        current = _cache.get(key)
+        # Another session may have moved the entry further on meanwhile
+        if current is None or current.watermark <= matrix.watermark:
+            _cache[key] = matrix
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return matrix
+
+
+# ===================== SUMMARIES =====================
+def weekday_summary(matrix, student_id=None):
+    # Present/Late/Absent counts and absence rate per weekday, for the
+    # class or one student; weekdays with no records are left out
+    statuses = matrix.statuses if student_id is None else matrix.statuses[[matrix.row(student_id)]]
+    weekdays = matrix.days.weekday.to_numpy()
+    summary = pd.DataFrame(0, index=WEEKDAYS, columns=list(STATUS_CODES))
+    for status, code in STATUS_CODES.items():
+        counts = np.bincount(weekdays, weights=(statuses == code).sum(axis=0), minlength=7)
+        summary[status] = counts.astype(np.int64)
+    summary = summary[summary.sum(axis=1) > 0]
+    summary['Absence Rate %'] = (summary['Absent'] * 100.0 / summary.sum(axis=1)).round(1)
+    return summary
+
+
+def status_totals(matrix):
+    # Per-student Present/Late/Absent counts, worst absence rate first
+    totals = pd.DataFrame({'Student': matrix.names}, index=matrix.student_ids)
+    for status, code in STATUS_CODES.items():
+        totals[status] = (matrix.statuses == code).sum(axis=1)
+    recorded = totals[list(STATUS_CODES)].sum(axis=1)
+    totals['Absence Rate %'] = (totals['Absent'] * 100.0 / recorded.where(recorded > 0)).round(1)
+    return totals.sort_values('Absence Rate %', ascending=False)
+
+
+# ===================== HEATMAPS =====================
+def _colour_scale():
+    # Discrete bands for codes 0..3 on a 0..3 z range
+    scale = []
+    for code, colour in enumerate(STATUS_COLOURS):
+        scale += [[code / len(STATUS_COLOURS), colour], [(code + 1) / len(STATUS_COLOURS), colour]]
+    return scale
+
+
+def _heatmap(z, x, y, text, title, height):
+    fig = go.Figure(go.Heatmap(
+        z=z, x=x, y=y, text=text, zmin=-0.5, zmax=len(STATUS_COLOURS) - 0.5,
+        colorscale=_colour_scale(), xgap=1, ygap=1, showscale=False,
+        hovertemplate="%{y} %{x}: %{text}<extra></extra>",
+    ))
+    fig.update_layout(title=title, height=height, yaxis_autorange='reversed', margin=dict(l=10, r=10, t=40, b=10))
+    return fig
+
+
+def class_heatmap(matrix, title=None):
+    # Students down the side, days of the term across
+    days = matrix.days
+    labels = [f"{name} ({student_id})" for name, student_id in zip(matrix.names, matrix.student_ids)]
+    return _heatmap(matrix.statuses, days, labels, STATUS_LABELS[matrix.statuses], title,
+                    height=max(250, 22 * len(labels) + 80))
+
+
+def student_calendar(matrix, student_id, title=None):
+    # One student's term as a calendar: weekdays down the side, weeks across
+    values = matrix.statuses[matrix.row(student_id)]
+    lead = matrix.start.weekday()
+    weeks = -(-(lead + len(values)) // 7)
+    grid = np.full(weeks * 7, -1, dtype=np.int8)
+    grid[lead:lead + len(values)] = values
+    grid = grid.reshape(weeks, 7).T
+
+    week_starts = [matrix.start - timedelta(days=lead) + timedelta(weeks=w) for w in range(weeks)]
+    text = np.where(grid >= 0, STATUS_LABELS[np.clip(grid, 0, None)], '')
+    z = np.where(grid >= 0, grid, np.nan)
+    return _heatmap(z, [f"w/c {d:%d %b}" for d in week_starts], WEEKDAYS, text, title, height=300)
+
@@ -0,0 +1,241 @@
+"""Change-data-capture log and watermark-based incremental export.
+
+Triggers on every core table append (table, primary key, operation) to
+change_log under a monotonically increasing seq. A downstream feed keeps
+the last seq it has seen (its watermark) and asks only for what changed
+after it, including deletes. Rows written before the log was installed
+are not in it, so a new consumer starts from one full export.
+
+Daily maintenance prunes entries older than JENGAHUB_CHANGE_LOG_DAYS
+(default 30) that the bitmap store has already read, keeping the latest
+entry per table and school so data_version (and every cache keyed on it)
+is unchanged. A consumer whose watermark falls before the pruned range
+(the calendar matrices, the bitmap store, an export feed) starts again
+from the tables.
+
+    python3 jengahub_cdc.py export --since 1200 --out changes.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+from jengahub_db import CORE_TABLES, DB_PATH, connect
+
+PRIMARY_KEYS = {
+    'schools': 'school_id',
+    'students': 'student_id',
+    'attendance': 'attendance_id',
+    'assessments': 'assessment_id',
+    'teachers': 'teacher_id',
+    'teacher_assignments': 'assignment_id',
+}
+
+EXPORT_LIMIT = 50000
+CHANGE_LOG_DAYS = int(os.environ.get('JENGAHUB_CHANGE_LOG_DAYS', 30))
+
+# (table, column) of watermarks that consumers keep in the database;
+# pruning stays behind the oldest of them
+CONSUMER_WATERMARKS = [('attendance_bitmap_state', 'watermark')]
+
+CDC_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        op TEXT NOT NULL,
+        pk INTEGER,
+        school_id INTEGER,
+        changed_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_change_log_school ON change_log(school_id, seq)",
+    "CREATE INDEX IF NOT EXISTS idx_change_log_table ON change_log(table_name, school_id, seq)",
+    # Entries below before_seq may have been pruned
+    '''
+    CREATE TABLE IF NOT EXISTS change_log_pruned (
+        before_seq INTEGER NOT NULL
+    )
+    ''',
+]
+
+# op codes: I insert, U update, D delete, T table emptied by a system reset
+OPS = {'INSERT': ('I', 'NEW'), 'UPDATE': ('U', 'NEW'), 'DELETE': ('D', 'OLD')}
+
+
+def _trigger_sql(table, event):
+    op, row = OPS[event]
+    pk = PRIMARY_KEYS[table]
+    return f'''
+    CREATE TRIGGER IF NOT EXISTS trg_cdc_{table}_{event.lower()} AFTER {event} ON {table}
+    BEGIN
+        INSERT INTO change_log (table_name, op, pk, school_id)
+        VALUES ('{table}', '{op}', {row}.{pk}, {row}.school_id);
+    END
+    '''
+
+
+def init_cdc(conn):
+    for statement in CDC_SCHEMA:
+        conn.execute(statement)
+    for table in CORE_TABLES:
+        for event in OPS:
+            conn.execute(_trigger_sql(table, event))
+    conn.commit()
+
+
+def record_reset(conn):
+    # DROP TABLE fires no triggers, so a full reset is logged explicitly
+    conn.executemany(
+        "INSERT INTO change_log (table_name, op) VALUES (?, 'T')",
+        [(table,) for table in CORE_TABLES]
+    )
+    conn.commit()
+
+
+def current_watermark(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+
+
+def data_version(conn, school_id, tables=None):
+    # Latest change touching a school's rows in `tables` (or any system
+    # reset): a cheap key for caches of derived data
+    tables = tables or CORE_TABLES
+    version = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log WHERE school_id IS NULL").fetchone()[0]
+    for table in tables:
+        latest = conn.execute(
+            "SELECT MAX(seq) FROM change_log WHERE table_name=? AND school_id=?", (table, int(school_id))
+        ).fetchone()[0]
+        version = max(version, latest or 0)
+    return version
+
+
+def export_changes(conn, since=0, school_id=None, tables=None, limit=EXPORT_LIMIT):
+    # Changes after watermark `since`, collapsed to the latest operation per
+    # row, with the current row attached to inserts and updates. Returns
+    # (changes, new_watermark); pass new_watermark as `since` next time.
+    horizon = pruned_before(conn)
+    if since + 1 < horizon:
+        raise ValueError(f"Changes before seq {horizon} have been pruned; start again from a full export")
+    sql = "SELECT seq, table_name, op, pk, changed_at FROM change_log WHERE seq > ?"
+    params = [since]
+    if school_id is not None:
+        sql += " AND (school_id = ? OR op = 'T')"
+        params.append(int(school_id))
+    if tables:
+        sql += f" AND table_name IN ({','.join('?' * len(tables))})"
+        params += list(tables)
+    sql += " ORDER BY seq LIMIT ?"
+    params.append(limit)
+    log = conn.execute(sql, params).fetchall()
+    if not log:
+        return [], since
+
+    latest = {}
+    for seq, table, op, pk, changed_at in log:
+        if op == 'T':
+            # Everything logged for the table before the reset is moot
+            latest = {k: v for k, v in latest.items() if k[0] != table}
+        latest[(table, pk)] = (seq, op, changed_at)
+
+    wanted = {}
+    for (table, pk), (_, op, _) in latest.items():
+        if op in ('I', 'U'):
+            wanted.setdefault(table, []).append(pk)
+
+    rows = {}
+    for table, pks in wanted.items():
+        key = PRIMARY_KEYS[table]
+        for i in range(0, len(pks), 500):
+            chunk = pks[i:i + 500]
+            cursor = conn.execute(
+                f"SELECT * FROM {table} WHERE {key} IN ({','.join('?' * len(chunk))})", chunk
+            )
+            columns = [c[0] for c in cursor.description]
+            for values in cursor:
+                record = dict(zip(columns, values))
+                rows[(table, record[key])] = record
+
+    changes = []
+    for (table, pk), (seq, op, changed_at) in sorted(latest.items(), key=lambda item: item[1][0]):
+        if op in ('I', 'U') and (table, pk) not in rows:
+            # Inserted or updated, then deleted by a later change beyond this page
+            continue
+        changes.append({
+            'seq': seq,
+            'table': table,
+            'op': op,
+            'pk': pk,
+            'changed_at': changed_at,
+            'row': rows.get((table, pk)),
+        })
+    return changes, log[-1][0]
+
+
+def to_jsonl(changes):
+    return ''.join(json.dumps(change, default=str) + '\n' for change in changes)
+
+
+def pruned_before(conn):
+    return conn.execute("SELECT COALESCE(MAX(before_seq), 0) FROM change_log_pruned").fetchone()[0]
+
+
+def retention_seq(conn, days=CHANGE_LOG_DAYS):
+    # First seq to keep: the oldest entry of the last `days` days, held back
+    # further by any consumer that has not read that far
+    keep = conn.execute(
+        "SELECT MIN(seq) FROM change_log WHERE changed_at >= strftime('%Y-%m-%dT%H:%M:%f', 'now', ?)",
+        (f'-{int(days)} days',)
+    ).fetchone()[0]
+    if keep is None:
+        keep = current_watermark(conn) + 1
+    for table, column in CONSUMER_WATERMARKS:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone():
+            oldest = conn.execute(f"SELECT MIN({column}) FROM {table}").fetchone()[0]
+            if oldest is not None:
+                keep = min(keep, oldest + 1)
+    return keep
+
+
+def prune_changes(conn, before_seq):
+    # Drop log entries before before_seq, except the latest one per table
+    # and school, which data_version reads
+    deleted = conn.execute('''
+        DELETE FROM change_log WHERE seq < ?
+          AND seq NOT IN (SELECT MAX(seq) FROM change_log GROUP BY table_name, school_id)
+    ''', (before_seq,)).rowcount
+    if before_seq > pruned_before(conn):
+        conn.execute("DELETE FROM change_log_pruned")
+        conn.execute("INSERT INTO change_log_pruned (before_seq) VALUES (?)", (before_seq,))
+    conn.commit()
+    return deleted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental change export for Jenga Hub PMS")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="write changes after a watermark as JSON lines")
+    export.add_argument('--db', default=DB_PATH)
+    export.add_argument('--since', type=int, default=0)
+    export.add_argument('--school', type=int, default=None)
+    export.add_argument('--out', default='-')
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    init_cdc(conn)
+    try:
+        changes, watermark = export_changes(conn, args.since, args.school)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    output = sys.stdout if args.out == '-' else open(args.out, 'w')
+    try:
+        output.write(to_jsonl(changes))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"{len(changes)} changes, watermark {watermark} ({datetime.now():%Y-%m-%d %H:%M})", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Chart data layer: downsample long series before they are handed to plotly."""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+# Default number of points sent to the browser per series
+MAX_CHART_POINTS = 500
+
+
+def _numeric_x(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype('int64').to_numpy(dtype='float64')
+    return pd.to_numeric(values).to_numpy(dtype='float64')
+
+
+# ===================== DOWNSAMPLING =====================
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the visually significant points
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start = int(np.floor(i * every)) + 1
+        end = int(np.floor((i + 1) * every)) + 1
+        next_start = end
+        next_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        if next_start >= n - 1:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        keep[i + 1] = a
+    keep[-1] = n - 1
+    return keep
+
+
+def minmax_indices(y, threshold):
+    # Keep the lowest and highest point of each bucket (plus both ends)
+    n = len(y)
+    if threshold >= n or threshold < 4:
+        return np.arange(n)
+
+    buckets = np.array_split(np.arange(1, n - 1), (threshold - 2) // 2)
+    keep = [0]
+    for bucket in buckets:
+        if len(bucket) == 0:
+            continue
+        values = y[bucket]
+        keep.append(bucket[np.nanargmin(values)])
+        keep.append(bucket[np.nanargmax(values)])
+    keep.append(n - 1)
+    return np.unique(np.array(keep, dtype=np.int64))
+
+
+def downsample(df, x, y, max_points=MAX_CHART_POINTS, method='lttb', color=None):
+    if df.empty:
+        return df
+
+    def reduce(group):
+        group = group.dropna(subset=[y]).sort_values(x)
+        if len(group) <= max_points:
+            return group
+        ys = group[y].to_numpy(dtype='float64')
+        if method == 'minmax':
+            idx = minmax_indices(ys, max_points)
+        else:
+            idx = lttb_indices(_numeric_x(group[x]), ys, max_points)
+        return group.iloc[idx]
+
+    if color is None:
+        return reduce(df).reset_index(drop=True)
+    parts = [reduce(group) for _, group in df.groupby(color, sort=False)]
+    return pd.concat(parts, ignore_index=True)
+
+
+def zoom(df, x, start=None, end=None):
+    values = pd.to_datetime(df[x])
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= values >= pd.Timestamp(start)
+    if end is not None:
+        mask &= values <= pd.Timestamp(end)
+    return df[mask]
+
+
+# ===================== STREAMLIT RENDERING =====================
+def trend_chart(df, x, y, title, key, color=None, max_points=MAX_CHART_POINTS, method='lttb', **line_kwargs):
+    # Line chart with a date-range zoom. The series is downsampled to
+    # max_points per line; a narrow enough range is drawn at full resolution.
+    df = df.copy()
+    df[x] = pd.to_datetime(df[x])
+    first, last = df[x].min().date(), df[x].max().date()
+
+    if first < last:
+        start, end = st.slider(
+            "Zoom to date range",
+            min_value=first, max_value=last, value=(first, last),
+            key=f"{key}_zoom"
+        )
+        df = zoom(df, x, start, end)
+
+    total_points = len(df)
+    plot_df = downsample(df, x, y, max_points=max_points, method=method, color=color)
+    fig = px.line(plot_df, x=x, y=y, color=color, title=title, **line_kwargs)
+    st.plotly_chart(fig)
+    if len(plot_df) < total_points:
+        st.caption(f"Showing {len(plot_df):,} of {total_points:,} points. Narrow the date range for full resolution.")
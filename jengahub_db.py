@@ -0,0 +1,326 @@
+"""Database connection and schema setup shared by the app and its helpers."""
+import os
+import sqlite3
+
+import numpy as np
+
+# Field devices run the app against their own copy (see jengahub_sync)
+DB_PATH = os.environ.get('JENGAHUB_DB', 'school_management.db')
+
+# Bumped whenever init_schema needs to migrate existing data
+SCHEMA_VERSION = 2
+
+# numpy scalars (e.g. from df[...].values[0]) would otherwise be stored as BLOBs
+for _np_type in (np.int8, np.int16, np.int32, np.int64):
+    sqlite3.register_adapter(_np_type, int)
+for _np_type in (np.float32, np.float64):
+    sqlite3.register_adapter(_np_type, float)
+
+CORE_TABLES = ['schools', 'students', 'attendance', 'assessments', 'teachers', 'teacher_assignments']
+
+SCHEMA = [
+    # Schools Table
+    '''
+    CREATE TABLE IF NOT EXISTS schools (
+        school_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE
+    )
+    ''',
+    # Students Table
+    '''
+    CREATE TABLE IF NOT EXISTS students (
+        student_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        school_id INTEGER,
+        name TEXT,
+        age INTEGER,
+        grade TEXT,
+        parent_name TEXT,
+        parent_contact TEXT,
+        FOREIGN KEY(school_id) REFERENCES schools(school_id)
+    )
+    ''',
+    # Attendance & Behaviour Table
+    '''
+    CREATE TABLE IF NOT EXISTS attendance (
+        attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INTEGER,
+        school_id INTEGER,
+        date TEXT,
+        status TEXT,
+        behaviour_score INTEGER,
+        behaviour_comment TEXT,
+        FOREIGN KEY(student_id) REFERENCES students(student_id),
+        FOREIGN KEY(school_id) REFERENCES schools(school_id)
+    )
+    ''',
+    # Assessments Table
+    '''
+    CREATE TABLE IF NOT EXISTS assessments (
+        assessment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id INTEGER,
+        school_id INTEGER,
+        date TEXT,
+        subject TEXT,
+        marks INTEGER,
+        total INTEGER,
+        grade TEXT,
+        percentage REAL,
+        FOREIGN KEY(student_id) REFERENCES students(student_id),
+        FOREIGN KEY(school_id) REFERENCES schools(school_id)
+    )
+    ''',
+    # Teachers Table
+    '''
+    CREATE TABLE IF NOT EXISTS teachers (
+        teacher_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        school_id INTEGER,
+        name TEXT,
+        email TEXT,
+        phone TEXT,
+        subject TEXT,
+        qualification TEXT,
+        join_date TEXT,
+        status TEXT DEFAULT 'Active',
+        FOREIGN KEY(school_id) REFERENCES schools(school_id)
+    )
+    ''',
+    # Teacher Assignments Table
+    '''
+    CREATE TABLE IF NOT EXISTS teacher_assignments (
+        assignment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        teacher_id INTEGER,
+        school_id INTEGER,
+        class_grade TEXT,
+        subject TEXT,
+        academic_year TEXT,
+        FOREIGN KEY(teacher_id) REFERENCES teachers(teacher_id),
+        FOREIGN KEY(school_id) REFERENCES schools(school_id)
+    )
+    ''',
+    # Per-student history lookups (Parent Portal)
+    "CREATE INDEX IF NOT EXISTS idx_attendance_student_date ON attendance(student_id, date)",
+    "CREATE INDEX IF NOT EXISTS idx_assessments_student_date ON assessments(student_id, date)",
+    # Per-school list views page through these in primary key order
+    "CREATE INDEX IF NOT EXISTS idx_students_school ON students(school_id)",
+    "CREATE INDEX IF NOT EXISTS idx_teachers_school ON teachers(school_id)",
+]
+
+# Running per-student totals, kept current by triggers so the Parent Portal
+# summary is a single point read instead of an aggregate over all history
+STUDENT_TOTALS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS student_totals (
+        student_id INTEGER PRIMARY KEY,
+        attendance_days INTEGER NOT NULL DEFAULT 0,
+        present_days INTEGER NOT NULL DEFAULT 0,
+        late_days INTEGER NOT NULL DEFAULT 0,
+        absent_days INTEGER NOT NULL DEFAULT 0,
+        behaviour_sum INTEGER NOT NULL DEFAULT 0,
+        behaviour_count INTEGER NOT NULL DEFAULT 0,
+        assessment_count INTEGER NOT NULL DEFAULT 0,
+        marks_sum INTEGER NOT NULL DEFAULT 0,
+        total_sum INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_totals_attendance_insert AFTER INSERT ON attendance
+    BEGIN
+        INSERT OR IGNORE INTO student_totals (student_id) VALUES (NEW.student_id);
+        UPDATE student_totals SET
+            attendance_days = attendance_days + 1,
+            present_days = present_days + (NEW.status = 'Present'),
+            late_days = late_days + (NEW.status = 'Late'),
+            absent_days = absent_days + (NEW.status = 'Absent'),
+            behaviour_sum = behaviour_sum + COALESCE(NEW.behaviour_score, 0),
+            behaviour_count = behaviour_count + (NEW.behaviour_score IS NOT NULL)
+        WHERE student_id = NEW.student_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_totals_attendance_delete AFTER DELETE ON attendance
+    BEGIN
+        UPDATE student_totals SET
+            attendance_days = attendance_days - 1,
+            present_days = present_days - (OLD.status = 'Present'),
+            late_days = late_days - (OLD.status = 'Late'),
+            absent_days = absent_days - (OLD.status = 'Absent'),
+            behaviour_sum = behaviour_sum - COALESCE(OLD.behaviour_score, 0),
+            behaviour_count = behaviour_count - (OLD.behaviour_score IS NOT NULL)
+        WHERE student_id = OLD.student_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_totals_attendance_update AFTER UPDATE ON attendance
+    BEGIN
+        UPDATE student_totals SET
+            attendance_days = attendance_days - 1,
+            present_days = present_days - (OLD.status = 'Present'),
+            late_days = late_days - (OLD.status = 'Late'),
+            absent_days = absent_days - (OLD.status = 'Absent'),
+            behaviour_sum = behaviour_sum - COALESCE(OLD.behaviour_score, 0),
+            behaviour_count = behaviour_count - (OLD.behaviour_score IS NOT NULL)
+        WHERE student_id = OLD.student_id;
+        INSERT OR IGNORE INTO student_totals (student_id) VALUES (NEW.student_id);
+        UPDATE student_totals SET
+            attendance_days = attendance_days + 1,
+            present_days = present_days + (NEW.status = 'Present'),
+            late_days = late_days + (NEW.status = 'Late'),
+            absent_days = absent_days + (NEW.status = 'Absent'),
+            behaviour_sum = behaviour_sum + COALESCE(NEW.behaviour_score, 0),
+            behaviour_count = behaviour_count + (NEW.behaviour_score IS NOT NULL)
+        WHERE student_id = NEW.student_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_totals_assessments_insert AFTER INSERT ON assessments
+    BEGIN
+        INSERT OR IGNORE INTO student_totals (student_id) VALUES (NEW.student_id);
+        UPDATE student_totals SET
+            assessment_count = assessment_count + 1,
+            marks_sum = marks_sum + COALESCE(NEW.marks, 0),
+            total_sum = total_sum + COALESCE(NEW.total, 0)
+        WHERE student_id = NEW.student_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_totals_assessments_delete AFTER DELETE ON assessments
+    BEGIN
+        UPDATE student_totals SET
+            assessment_count = assessment_count - 1,
+            marks_sum = marks_sum - COALESCE(OLD.marks, 0),
+            total_sum = total_sum - COALESCE(OLD.total, 0)
+        WHERE student_id = OLD.student_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_totals_assessments_update AFTER UPDATE ON assessments
+    BEGIN
+        UPDATE student_totals SET
+            assessment_count = assessment_count - 1,
+            marks_sum = marks_sum - COALESCE(OLD.marks, 0),
+            total_sum = total_sum - COALESCE(OLD.total, 0)
+        WHERE student_id = OLD.student_id;
+        INSERT OR IGNORE INTO student_totals (student_id) VALUES (NEW.student_id);
+        UPDATE student_totals SET
+            assessment_count = assessment_count + 1,
+            marks_sum = marks_sum + COALESCE(NEW.marks, 0),
+            total_sum = total_sum + COALESCE(NEW.total, 0)
+        WHERE student_id = NEW.student_id;
+    END
+    ''',
+]
+
+DERIVED_TABLES = ['student_totals']
+
+# Columns that older versions of the app wrote as 8-byte numpy BLOBs
+ID_COLUMNS = {
+    'students': ['school_id'],
+    'attendance': ['student_id', 'school_id'],
+    'assessments': ['student_id', 'school_id'],
+    'teachers': ['school_id'],
+    'teacher_assignments': ['teacher_id', 'school_id'],
+}
+
+
+def connect(path=DB_PATH):
+    return sqlite3.connect(path, check_same_thread=False)
+
+
+def database_path(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def repair_blob_ids(conn):
+    for table, columns in ID_COLUMNS.items():
+        for column in columns:
+            rows = conn.execute(
+                f"SELECT rowid, {column} FROM {table} WHERE typeof({column})='blob' AND length({column})=8"
+            ).fetchall()
+            conn.executemany(
+                f"UPDATE {table} SET {column}=? WHERE rowid=?",
+                [(int.from_bytes(value, 'little', signed=True), rowid) for rowid, value in rows]
+            )
+
+
+def rebuild_student_totals(conn):
+    conn.execute("DELETE FROM student_totals")
+    conn.execute('''
+        INSERT INTO student_totals (student_id, attendance_days, present_days, late_days,
+                                    absent_days, behaviour_sum, behaviour_count)
+        SELECT student_id, COUNT(*), SUM(status = 'Present'), SUM(status = 'Late'),
+               SUM(status = 'Absent'), COALESCE(SUM(behaviour_score), 0), COUNT(behaviour_score)
+        FROM attendance
+        GROUP BY student_id
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO student_totals (student_id)
+        SELECT DISTINCT student_id FROM assessments
+    ''')
+    conn.execute('''
+        UPDATE student_totals SET
+            assessment_count = agg.n, marks_sum = agg.marks, total_sum = agg.total
+        FROM (
+            SELECT student_id, COUNT(*) AS n, COALESCE(SUM(marks), 0) AS marks,
+                   COALESCE(SUM(total), 0) AS total
+            FROM assessments GROUP BY student_id
+        ) AS agg
+        WHERE student_totals.student_id = agg.student_id
+    ''')
+
+
+def init_schema(conn):
+    cursor = conn.cursor()
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if cursor.execute("PRAGMA page_count").fetchone()[0] == 0:
+        # Only takes effect before the first table is created; existing
+        # files are converted by jengahub_maintenance.enable_incremental_vacuum
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    totals_exist = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='student_totals'"
+    ).fetchone()
+
+    for statement in SCHEMA + STUDENT_TOTALS_SCHEMA:
+        cursor.execute(statement)
+
+    if version < 1:
+        repair_blob_ids(conn)
+    if version < 2:
+        # Percentage of available marks; back-filled by jengahub_scores
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(assessments)")]
+        if 'percentage' not in columns:
+            cursor.execute("ALTER TABLE assessments ADD COLUMN percentage REAL")
+    if not totals_exist:
+        rebuild_student_totals(conn)
+    if version < SCHEMA_VERSION:
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+
+
+def reset_schema(conn):
+    cursor = conn.cursor()
+    for table in CORE_TABLES + DERIVED_TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.commit()
+    init_schema(conn)
+
+
+def init_database(conn):
+    # Core schema plus the tables and triggers owned by the feature modules
+    from jengahub_bitmaps import init_bitmaps
+    from jengahub_cdc import init_cdc
+    from jengahub_maintenance import init_maintenance
+    from jengahub_notify import init_outbox
+    from jengahub_ranks import init_ranks
+    from jengahub_scores import init_scores
+    from jengahub_search import init_search
+    from jengahub_sync import init_sync
+
+    init_schema(conn)
+    init_outbox(conn)
+    init_sync(conn)
+    init_cdc(conn)
+    init_maintenance(conn)
+    init_ranks(conn)
+    init_bitmaps(conn)
+    init_search(conn)
+    init_scores(conn)
@@ -0,0 +1,129 @@
+"""Typed, memory-compact DataFrames from SQL.
+
+read_frame is a drop-in for pd.read_sql_query that gives each known column
+a compact dtype: repeated labels (status, grade, subject, ...) become
+categoricals, dates are parsed to datetime64 once, and small integers
+(scores, marks, ages) are downcast. Columns not listed in COLUMN_TYPES
+keep pandas' defaults. With chunksize the result is built a chunk at a
+time, so the uncompacted rows never all exist at once.
+
+    python3 jengahub_frames.py measure --table attendance
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+CHUNK_SIZE = 50000
+
+# column -> 'category', 'datetime' or a numpy integer type. Integer columns
+# with NULLs use the matching nullable type; values that do not fit (or are
+# not whole numbers) are left as they are.
+COLUMN_TYPES = {
+    'status': 'category',
+    'grade': 'category',
+    'class_grade': 'category',
+    'subject': 'category',
+    'academic_year': 'category',
+    'qualification': 'category',
+    'date': 'datetime',
+    'join_date': 'datetime',
+    # Ids fit in 32 bits except in high-numbered shards, which keep int64
+    'school_id': 'int32',
+    'student_id': 'int32',
+    'teacher_id': 'int32',
+    'attendance_id': 'int32',
+    'assessment_id': 'int32',
+    'assignment_id': 'int32',
+    'behaviour_score': 'int8',
+    'age': 'int8',
+    'marks': 'int16',
+    'total': 'int16',
+}
+
+
+def _to_integer(values, dtype):
+    numbers = pd.to_numeric(values, errors='coerce')
+    present = numbers.dropna()
+    if len(present) != values.notna().sum() or not (present % 1 == 0).all():
+        return values
+    limits = np.iinfo(dtype)
+    if len(present) and (present.min() < limits.min or present.max() > limits.max):
+        return values
+    if len(present) < len(numbers):
+        return numbers.astype(dtype.capitalize())
+    return numbers.astype(dtype)
+
+
+def compact(df, types=None):
+    # Converts the columns named in `types` (default COLUMN_TYPES) in place
+    types = COLUMN_TYPES if types is None else types
+    for column in df.columns:
+        kind = types.get(column)
+        if kind is None:
+            continue
+        if kind == 'category':
+            df[column] = df[column].astype('category')
+        elif kind == 'datetime':
+            df[column] = pd.to_datetime(df[column], format='ISO8601', errors='coerce')
+        else:
+            df[column] = _to_integer(df[column], kind)
+    return df
+
+
+def _concat(chunks):
+    # Categoricals from different chunks only concatenate as categoricals
+    # when they share categories
+    for column in chunks[0].columns:
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals(
+                [chunk[column] for chunk in chunks if isinstance(chunk[column].dtype, pd.CategoricalDtype)]
+            ).categories
+            for chunk in chunks:
+                chunk[column] = chunk[column].astype(pd.CategoricalDtype(categories))
+    # Integer columns come out as the widest type any chunk needed
+    return pd.concat(chunks, ignore_index=True)
+
+
+def iter_frames(sql, conn, params=None, chunksize=CHUNK_SIZE, types=None):
+    # Compacted chunks, for callers that can aggregate as they go
+    for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunksize):
+        yield compact(chunk, types)
+
+
+def read_frame(sql, conn, params=None, chunksize=None, types=None):
+    if chunksize is None:
+        return compact(pd.read_sql_query(sql, conn, params=params), types)
+    chunks = list(iter_frames(sql, conn, params, chunksize, types))
+    if not chunks:
+        return compact(pd.read_sql_query(sql, conn, params=params), types)
+    return _concat(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def main(argv=None):
+    from jengahub_db import CORE_TABLES, DB_PATH, connect
+
+    parser = argparse.ArgumentParser(description="Compare plain and compact DataFrame memory")
+    parser.add_argument('command', choices=['measure'])
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--table', choices=CORE_TABLES, default='attendance')
+    parser.add_argument('--school', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    sql, params = f"SELECT * FROM {args.table}", ()
+    if args.school is not None:
+        sql, params = sql + " WHERE school_id=?", (args.school,)
+    plain = pd.read_sql_query(sql, conn, params=params)
+    typed = read_frame(sql, conn, params=params, chunksize=CHUNK_SIZE)
+    print(f"{args.table}: {len(plain):,} rows, {memory_mb(plain):.1f} MB plain, "
+          f"{memory_mb(typed):.1f} MB compact ({memory_mb(plain) / max(memory_mb(typed), 1e-9):.1f}x smaller)")
+    print(pd.DataFrame({'plain': plain.dtypes.astype(str), 'compact': typed.dtypes.astype(str)}).to_string())
+
+
+if __name__ == '__main__':
+    main()
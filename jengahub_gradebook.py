@@ -0,0 +1,89 @@
+"""Gradebook grid: students down the side, subjects or assessment dates across.
+
+Each cell is the student's percentage for that subject (or date) over the
+term, with the student's overall percentage as the right-hand margin and
+the class percentage per column as the bottom margin. The grid is
+pivoted from a single (student, column) rollup of marks and totals, and
+cached per (database, school, grade, term, layout) until the school's
+assessments or students change, so paging across columns is a slice of
+the cached frame.
+"""
+import threading
+from collections import OrderedDict
+
+from jengahub_cdc import data_version
+from jengahub_db import database_path
+from jengahub_frames import read_frame
+from jengahub_terms import term_bounds
+
+COLUMN_PAGE_SIZE = 15
+CACHE_ENTRIES = 32
+
+LAYOUTS = {'subject': 'subject', 'date': 'date'}
+AVERAGE = 'Average'
+CLASS_AVERAGE = 'Class Average'
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def build_gradebook(conn, school_id, grade, term, layout='subject'):
+    # Returns the full grid: one row per student (plus the class average
+    # row), one column per subject or date, plus the average column
+    column = LAYOUTS[layout]
+    start, end = term_bounds(term)
+    students = read_frame(
+        "SELECT student_id, name AS Student FROM students WHERE school_id=? AND grade IS ? ORDER BY name, student_id",
+        conn, params=(int(school_id), grade)
+    ).set_index('student_id')
+    rollup = read_frame(f'''
+        SELECT a.student_id, a.{column} AS key, SUM(a.marks) AS marks, SUM(a.total) AS total
+        FROM assessments a JOIN students s ON s.student_id = a.student_id
+        WHERE a.school_id=? AND s.grade IS ? AND a.date BETWEEN ? AND ? AND a.total > 0
+          AND a.{column} IS NOT NULL
+        GROUP BY a.student_id, a.{column}
+    ''', conn, params=(int(school_id), grade, str(start), str(end)))
+
+    rollup['percentage'] = rollup['marks'] * 100.0 / rollup['total']
+    cells = rollup.pivot(index='student_id', columns='key', values='percentage')
+    by_student = rollup.groupby('student_id')[['marks', 'total']].sum()
+    by_column = rollup.groupby('key')[['marks', 'total']].sum()
+
+    grid = students.join(cells)
+    grid[AVERAGE] = by_student['marks'] * 100.0 / by_student['total']
+    # Bottom margin: class percentage per column, from the summed marks
+    class_row = (by_column['marks'] * 100.0 / by_column['total']).to_dict()
+    class_row['Student'] = CLASS_AVERAGE
+    class_row[AVERAGE] = rollup['marks'].sum() * 100.0 / rollup['total'].sum() if len(rollup) else None
+    grid.loc[-1] = class_row
+    grid.columns.name = None
+    return grid.round(1)
+
+
+def gradebook(conn, school_id, grade, term, layout='subject'):
+    # Cached build_gradebook, rebuilt after the school's data changes
+    path = database_path(conn)
+    key = (path, int(school_id), grade, term, layout)
+    version = data_version(conn, school_id, ['assessments', 'students'])
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and cached[0] == version:
+            _cache.move_to_end(key)
+            return cached[1]
+    grid = build_gradebook(conn, school_id, grade, term, layout)
+    with _cache_lock:
+        _cache[key] = (version, grid)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return grid
+
+
+def column_pages(grid, page_size=COLUMN_PAGE_SIZE):
+    return max(1, -(-(len(grid.columns) - 2) // page_size))
+
+
+def column_page(grid, page, page_size=COLUMN_PAGE_SIZE):
+    # The student and average margins stay on every page
+    keys = list(grid.columns[1:-1])
+    return grid[['Student'] + keys[page * page_size:(page + 1) * page_size] + [AVERAGE]]
@@ -0,0 +1,374 @@
+"""Load test: concurrent sessions driving the app through scripted flows.
+
+Each simulated session is a Streamlit AppTest of jengahub_pms.py running in
+its own thread of one process, so sessions share the caches, writer threads
+and connections a single app instance would. Sessions repeatedly pick a
+flow (a teacher taking class attendance, opening Analytics, generating a
+report, browsing the student list), and every script run is timed. The
+report has p50/p95/p99 latency per step and overall, error and lock-error
+rates, and whether the SLO was met; append it to a history file to track
+releases against each other. AppTest sessions sharing a process
+occasionally trip over each other's widget state; those failures are
+counted as driver errors and kept out of the SLO.
+
+    python3 jengahub_loadtest.py generate loadtest.db --schools 4 --students 600
+    python3 jengahub_loadtest.py run loadtest.db --sessions 20 --duration 120 \\
+        --report loadtest_report.json --history loadtest_history.jsonl
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jengahub_pms.py')
+
+GRADES = [f"Grade {n}" for n in range(1, 9)]
+SUBJECTS = ['Mathematics', 'English', 'Kiswahili', 'Science', 'Social Studies', 'CRE']
+# Share of attendance records with a behaviour comment, and what they say
+COMMENT_RATE = 0.05
+COMMENTS = ['Helpful in class', 'Talking during lessons', 'Late back from break', 'Got into a fight at lunch',
+            'Reported bullying by older pupils', 'Excellent participation', 'Disrupted the lesson',
+            'Left early, parent collected', 'Forgot homework again', 'Kind to classmates']
+
+# Share of flows a session picks; attendance dominates the morning rush
+FLOW_WEIGHTS = {'attendance': 0.5, 'analytics': 0.2, 'report': 0.2, 'browse': 0.1}
+
+# Default SLO: 95% of script runs within this many seconds, and few errors
+SLO_P95_SECONDS = 2.0
+SLO_ERROR_RATE = 0.01
+
+RUN_TIMEOUT = 120
+LOCK_MARKERS = ('database is locked', 'database table is locked', 'busy', 'queue for')
+
+
+# ===================== DATA =====================
+def generate_database(path, schools=4, students=600, days=60, assessments=6, seed=42):
+    # A database shaped like a real school year: `students` per school spread
+    # over eight grades, one teacher per grade and subject pair, `days` school
+    # days of attendance and `assessments` assessments per subject
+    from jengahub_db import connect, init_database
+
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    conn = connect(path)
+    init_database(conn)
+
+    school_days = []
+    day = date.today()
+    while len(school_days) < days:
+        day -= timedelta(days=1)
+        if day.weekday() < 5:
+            school_days.append(str(day))
+    assessment_days = school_days[::max(1, days // assessments)][:assessments]
+
+    with conn:
+        for school in range(1, schools + 1):
+            school_id = conn.execute("INSERT INTO schools (name) VALUES (?)", (f"Load Test School {school}",)).lastrowid
+            conn.executemany(
+                "INSERT INTO students (school_id, name, age, grade, parent_name, parent_contact) VALUES (?, ?, ?, ?, ?, ?)",
+                [(school_id, f"Student {school}-{n}", rng.randint(6, 15), GRADES[n % len(GRADES)],
+                  f"Parent {school}-{n}", f"07{rng.randint(10000000, 99999999)}") for n in range(students)]
+            )
+            for grade in GRADES:
+                for subject in SUBJECTS:
+                    teacher_id = conn.execute(
+                        "INSERT INTO teachers (school_id, name, email, subject, join_date) VALUES (?, ?, ?, ?, ?)",
+                        (school_id, f"Teacher {school}-{grade[-1]}-{subject}", f"t{school}{grade[-1]}@school.test",
+                         subject, '2020-01-06')
+                    ).lastrowid
+                    conn.execute(
+                        "INSERT INTO teacher_assignments (teacher_id, school_id, class_grade, subject, academic_year) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (teacher_id, school_id, grade, subject, f"{date.today().year}")
+                    )
+
+            roster = [row[0] for row in conn.execute("SELECT student_id FROM students WHERE school_id=?", (school_id,))]
+            conn.executemany(
+                "INSERT INTO attendance (student_id, school_id, date, status, behaviour_score, behaviour_comment) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((student_id, school_id, day, rng.choices(['Present', 'Late', 'Absent'], [0.88, 0.07, 0.05])[0],
+                  rng.randint(2, 5), rng.choice(COMMENTS) if rng.random() < COMMENT_RATE else '')
+                 for day in school_days for student_id in roster)
+            )
+            conn.executemany(
+                "INSERT INTO assessments (student_id, school_id, date, subject, marks, total, grade, percentage) "
+                "VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?5 * 100.0 / ?6)",
+                ((student_id, school_id, day, subject, rng.randint(20, 100), 100, '')
+                 for day in assessment_days for subject in SUBJECTS for student_id in roster)
+            )
+    conn.close()
+
+
+# ===================== FLOWS =====================
+def _widget(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"No widget labelled {label!r}")
+
+
+def _flow_attendance(session, rng):
+    at = session.menu("Teacher Portal")
+    names = _widget(at.selectbox, "Select Your Name").options
+    at = session.step('select_teacher', _widget(at.selectbox, "Select Your Name").set_value(rng.choice(names)))
+    classes = _widget(at.selectbox, "Select Class")
+    at = session.step('select_class', classes.set_value(rng.choice(classes.options)))
+    _widget(at.date_input, "Attendance Date").set_value(date.today())
+    session.step('save_attendance', _widget(at.button, "Save Attendance").click())
+
+
+def _flow_analytics(session, rng):
+    at = session.menu("Analytics")
+    schools = _widget(at.selectbox, "Select School")
+    session.step('open_analytics', schools.set_value(rng.choice(schools.options)))
+
+
+def _flow_report(session, rng):
+    at = session.menu("Reports")
+    schools = _widget(at.selectbox, "Select School")
+    at = session.step('select_school', schools.set_value(rng.choice(schools.options)))
+    report_types = _widget(at.selectbox, "Select Report Type")
+    report_types.set_value(rng.choice(report_types.options))
+    # Mostly the precomputed periods, sometimes a custom range
+    from jengahub_reports import PERIODS
+
+    period = rng.choice(list(PERIODS) + ['custom'])
+    at = session.step('select_period', _widget(at.selectbox, "Report Period").set_value(period))
+    if period == 'custom':
+        _widget(at.date_input, "Report Start Date").set_value(date.today() - timedelta(days=90))
+    session.step('generate_report', _widget(at.button, "Generate Report").click())
+
+
+def _flow_browse(session, rng):
+    at = session.menu("Students")
+    schools = _widget(at.selectbox, "Select School")
+    at = session.step('select_school', schools.set_value(rng.choice(schools.options)))
+    session.step('next_page', at.button(key='students_list_next').click())
+
+
+FLOWS = {
+    'attendance': _flow_attendance,
+    'analytics': _flow_analytics,
+    'report': _flow_report,
+    'browse': _flow_browse,
+}
+
+
+class Session:
+    # One simulated browser session; every script run is recorded
+    def __init__(self, number, results, timeout=RUN_TIMEOUT):
+        self.number = number
+        self.results = results
+        self.timeout = timeout
+        self.flow = 'start'
+        self.reload()
+
+    def reload(self):
+        # A fresh page, as after a browser refresh
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(APP_PATH, default_timeout=self.timeout)
+        self.step('open_app', self.at)
+
+    def step(self, name, action):
+        # `action` is the AppTest or a widget with a pending interaction;
+        # running it reruns the script
+        started = time.perf_counter()
+        error = None
+        driver_error = False
+        try:
+            self.at = action.run()
+        except Exception as e:
+            # A timed-out run is the app being too slow; anything else raised
+            # by AppTest itself is the test driver, not the app
+            error = f"{type(e).__name__}: {e}"
+            driver_error = 'timed out' not in str(e)
+        seconds = time.perf_counter() - started
+        if error is None:
+            shown = [str(e.message or e.value) for e in self.at.exception]
+            shown += [str(e.value) for e in self.at.error]
+            error = shown[0] if shown else None
+        self.results.append({
+            'session': self.number,
+            'flow': self.flow,
+            'step': name,
+            'seconds': seconds,
+            'error': None if driver_error else error,
+            'lock_error': bool(error) and any(marker in error.lower() for marker in LOCK_MARKERS),
+            'driver_error': error if driver_error else None,
+        })
+        if error:
+            raise RuntimeError(error)
+        return self.at
+
+    def menu(self, item):
+        return self.step('menu', self.at.sidebar.radio[0].set_value(item))
+
+
+def _run_session(number, deadline, results, think, seed, timeout):
+    rng = random.Random(seed + number)
+    try:
+        session = Session(number, results, timeout)
+    except RuntimeError:
+        return
+    flows, weights = zip(*FLOW_WEIGHTS.items())
+    while time.monotonic() < deadline:
+        session.flow = rng.choices(flows, weights)[0]
+        try:
+            FLOWS[session.flow](session, rng)
+        except (RuntimeError, LookupError) as e:
+            if isinstance(e, LookupError):
+                # The page rendered without the widget the flow needs next
+                results.append({'session': number, 'flow': session.flow, 'step': 'missing_widget',
+                                'seconds': 0.0, 'error': None, 'lock_error': False,
+                                'driver_error': f"{type(e).__name__}: {e}"})
+            # Carry on from a fresh page, as a user would after an error
+            try:
+                session.reload()
+            except RuntimeError:
+                return
+        if think:
+            time.sleep(rng.expovariate(1 / think))
+
+
+def run_load(sessions=10, duration=60, ramp=10, think=1.0, seed=1, timeout=RUN_TIMEOUT):
+    # Returns one record per script run
+    results = []
+    deadline = time.monotonic() + ramp + duration
+    threads = []
+    for number in range(sessions):
+        thread = threading.Thread(target=_run_session, args=(number, deadline, results, think, seed, timeout),
+                                  name=f'loadtest-session-{number}', daemon=True)
+        thread.start()
+        threads.append(thread)
+        time.sleep(ramp / max(sessions, 1))
+    for thread in threads:
+        thread.join()
+    return results
+
+
+# ===================== REPORT =====================
+def _latency_stats(frame, elapsed):
+    seconds = frame['seconds'].to_numpy()
+    return {
+        'runs': int(len(frame)),
+        'errors': int(frame['error'].notna().sum()),
+        'lock_errors': int(frame['lock_error'].sum()),
+        'error_rate': float(frame['error'].notna().mean()) if len(frame) else 0.0,
+        'lock_error_rate': float(frame['lock_error'].mean()) if len(frame) else 0.0,
+        'driver_errors': int(frame['driver_error'].notna().sum()),
+        'throughput_per_s': len(frame) / elapsed if elapsed else None,
+        'p50': float(np.percentile(seconds, 50)) if len(seconds) else None,
+        'p95': float(np.percentile(seconds, 95)) if len(seconds) else None,
+        'p99': float(np.percentile(seconds, 99)) if len(seconds) else None,
+        'max': float(seconds.max()) if len(seconds) else None,
+    }
+
+
+def build_report(results, config, elapsed, slo_p95=SLO_P95_SECONDS, slo_error_rate=SLO_ERROR_RATE):
+    import streamlit
+
+    frame = pd.DataFrame(results, columns=['session', 'flow', 'step', 'seconds', 'error', 'lock_error', 'driver_error'])
+    timed = frame[frame['step'] != 'missing_widget']
+    overall = _latency_stats(timed, elapsed)
+    overall['driver_errors'] = int(frame['driver_error'].notna().sum())
+    met = (overall['p95'] is not None and overall['p95'] <= slo_p95
+           and overall['error_rate'] <= slo_error_rate)
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'config': config,
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'streamlit': streamlit.__version__,
+            'cpus': os.cpu_count(),
+        },
+        'elapsed_seconds': elapsed,
+        'overall': overall,
+        'steps': {f"{flow}.{step}": _latency_stats(group, elapsed)
+                  for (flow, step), group in timed.groupby(['flow', 'step'])},
+        'flows': {flow: _latency_stats(group, elapsed) for flow, group in timed.groupby('flow')},
+        'slo': {'p95_seconds': slo_p95, 'max_error_rate': slo_error_rate, 'met': bool(met)},
+        'sample_errors': frame['error'].dropna().value_counts().head(10).to_dict(),
+        'sample_driver_errors': frame['driver_error'].dropna().value_counts().head(10).to_dict(),
+    }
+
+
+def print_report(report):
+    steps = pd.DataFrame(report['steps']).T[['runs', 'errors', 'lock_errors', 'driver_errors',
+                                             'p50', 'p95', 'p99', 'max']]
+    print(steps.to_string(float_format=lambda v: f"{v:.3f}"))
+    overall = report['overall']
+    print(f"\n{overall['runs']} runs in {report['elapsed_seconds']:.0f}s ({overall['throughput_per_s']:.1f}/s), "
+          f"p50 {overall['p50']:.3f}s, p95 {overall['p95']:.3f}s, p99 {overall['p99']:.3f}s, "
+          f"errors {overall['error_rate']:.2%} (locks {overall['lock_error_rate']:.2%})")
+    slo = report['slo']
+    print(f"SLO p95 <= {slo['p95_seconds']}s and errors <= {slo['max_error_rate']:.0%}: "
+          f"{'met' if slo['met'] else 'MISSED'}")
+    for message, count in report['sample_errors'].items():
+        print(f"  {count} x {message[:160]}")
+    if overall['driver_errors']:
+        print(f"{overall['driver_errors']} test driver errors (not counted against the SLO):")
+        for message, count in report['sample_driver_errors'].items():
+            print(f"  {count} x {message[:160]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for Jenga Hub PMS")
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate = commands.add_parser('generate', help="create a test database")
+    generate.add_argument('db')
+    generate.add_argument('--schools', type=int, default=4)
+    generate.add_argument('--students', type=int, default=600, help="per school")
+    generate.add_argument('--days', type=int, default=60, help="school days of attendance history")
+    generate.add_argument('--seed', type=int, default=42)
+    run = commands.add_parser('run', help="drive concurrent sessions against a database")
+    run.add_argument('db')
+    run.add_argument('--sessions', type=int, default=10)
+    run.add_argument('--duration', type=float, default=60, help="seconds at full load")
+    run.add_argument('--ramp', type=float, default=10, help="seconds over which sessions start")
+    run.add_argument('--think', type=float, default=1.0, help="mean pause between flows, seconds")
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--slo-p95', type=float, default=SLO_P95_SECONDS)
+    run.add_argument('--slo-error-rate', type=float, default=SLO_ERROR_RATE)
+    run.add_argument('--report', default='loadtest_report.json')
+    run.add_argument('--history', default=None, help="JSON lines file each run's report is appended to")
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        started = time.monotonic()
+        generate_database(args.db, args.schools, args.students, args.days, seed=args.seed)
+        print(f"{args.db}: {args.schools} schools x {args.students} students, "
+              f"{args.days} days ({time.monotonic() - started:.1f}s)")
+        return 0
+
+    # The app reads its database path when jengahub_db is first imported
+    if 'jengahub_db' in sys.modules:
+        sys.exit("run must start before jengahub_db is imported")
+    os.environ['JENGAHUB_DB'] = os.path.abspath(args.db)
+    config = {key: value for key, value in vars(args).items() if key not in ('command', 'report', 'history')}
+    started = time.monotonic()
+    results = run_load(args.sessions, args.duration, args.ramp, args.think, args.seed)
+    report = build_report(results, config, time.monotonic() - started, args.slo_p95, args.slo_error_rate)
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    if args.history:
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(report, default=str) + '\n')
+    print_report(report)
+    return 0 if report['slo']['met'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
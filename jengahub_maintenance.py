@@ -0,0 +1,285 @@
+"""Storage maintenance: orphan cleanup, planner statistics and space reclaim.
+
+Deleting a student, teacher or school cascades to the rows that belong to
+it. For rows orphaned before the cascade existed (or by direct edits),
+purge_orphans removes them in small committed batches. run_maintenance
+also prunes the change log (see jengahub_cdc), refreshes planner
+statistics (PRAGMA optimize) and returns free pages
+to the filesystem a bounded number at a time, which needs
+auto_vacuum=INCREMENTAL: new databases get it automatically, existing
+ones are converted once with a full VACUUM (enable_incremental_vacuum).
+
+    python3 jengahub_maintenance.py run
+    python3 jengahub_maintenance.py stats
+    python3 jengahub_maintenance.py convert
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from jengahub_cdc import prune_changes, retention_seq
+from jengahub_db import DB_PATH, connect, init_database
+from jengahub_writer import writer_for
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL = int(os.environ.get('JENGAHUB_MAINTENANCE_INTERVAL', 86400))
+
+ORPHAN_BATCH_SIZE = 5000
+# Pages released per incremental_vacuum call (4 MB at the default page size)
+VACUUM_STEP_PAGES = 1000
+VACUUM_MAX_STEPS = 20
+# Rows examined per index by PRAGMA optimize's ANALYZE
+ANALYSIS_LIMIT = 1000
+
+# (child table, column, parent table, parent key), parents before children
+ORPHAN_RULES = [
+    ('students', 'school_id', 'schools', 'school_id'),
+    ('teachers', 'school_id', 'schools', 'school_id'),
+    ('attendance', 'student_id', 'students', 'student_id'),
+    ('assessments', 'student_id', 'students', 'student_id'),
+    ('teacher_assignments', 'teacher_id', 'teachers', 'teacher_id'),
+    ('student_totals', 'student_id', 'students', 'student_id'),
+]
+
+MAINTENANCE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS maintenance_log (
+        run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ran_at TEXT,
+        orphans_purged INTEGER,
+        pages_freed INTEGER,
+        seconds REAL
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_teacher_assignments_teacher ON teacher_assignments(teacher_id)",
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_cascade_students_delete AFTER DELETE ON students
+    BEGIN
+        DELETE FROM attendance WHERE student_id = OLD.student_id;
+        DELETE FROM assessments WHERE student_id = OLD.student_id;
+        DELETE FROM student_totals WHERE student_id = OLD.student_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_cascade_teachers_delete AFTER DELETE ON teachers
+    BEGIN
+        DELETE FROM teacher_assignments WHERE teacher_id = OLD.teacher_id;
+    END
+    ''',
+]
+
+
+def init_maintenance(conn):
+    for statement in MAINTENANCE_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+# ===================== TASKS =====================
+def purge_orphans(conn, batch_size=ORPHAN_BATCH_SIZE):
+    # Deletes child rows whose parent no longer exists, one committed batch
+    # at a time so writers are never locked out for long
+    purged = {}
+    for table, column, parent, key in ORPHAN_RULES:
+        total = 0
+        while True:
+            deleted = conn.execute(f'''
+                DELETE FROM {table} WHERE rowid IN (
+                    SELECT rowid FROM {table}
+                    WHERE {column} IS NOT NULL AND {column} NOT IN (SELECT {key} FROM {parent})
+                    LIMIT ?
+                )
+            ''', (batch_size,)).rowcount
+            conn.commit()
+            total += deleted
+            if deleted < batch_size:
+                break
+        if total:
+            purged[table] = total
+    return purged
+
+
+def optimize(conn, full=False):
+    # PRAGMA optimize only re-analyzes tables whose statistics are stale
+    if full:
+        conn.execute("ANALYZE")
+    else:
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        conn.execute("PRAGMA optimize")
+    conn.commit()
+
+
+def incremental_vacuum(conn, max_steps=VACUUM_MAX_STEPS, step_pages=VACUUM_STEP_PAGES):
+    # Returns the number of pages released; 0 unless auto_vacuum is INCREMENTAL
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    for _ in range(max_steps):
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            break
+        # executescript steps the pragma to completion; a plain execute
+        # frees a single page
+        conn.executescript(f"PRAGMA incremental_vacuum({step_pages})")
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def enable_incremental_vacuum(conn):
+    # One-off conversion of an existing database: rewrites the whole file
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+def run_maintenance(conn):
+    started = time.monotonic()
+    purged = purge_orphans(conn)
+    pruned = prune_changes(conn, retention_seq(conn))
+    optimize(conn)
+    freed = incremental_vacuum(conn)
+    seconds = time.monotonic() - started
+    conn.execute(
+        "INSERT INTO maintenance_log (ran_at, orphans_purged, pages_freed, seconds) VALUES (?, ?, ?, ?)",
+        (datetime.now().isoformat(timespec='seconds'), sum(purged.values()), freed, round(seconds, 3))
+    )
+    conn.commit()
+    return {'orphans_purged': purged, 'changes_pruned': pruned, 'pages_freed': freed, 'seconds': seconds}
+
+
+def last_run(conn):
+    row = conn.execute("SELECT MAX(ran_at) FROM maintenance_log").fetchone()
+    return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+
+# ===================== STATS =====================
+def storage_stats(conn):
+    # (per-table frame, file summary). Page counts come from the dbstat
+    # virtual table where SQLite was built with it.
+    tables = [name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    pages = {}
+    try:
+        pages = dict(conn.execute(
+            "SELECT name, COUNT(*) FROM dbstat WHERE name NOT LIKE 'sqlite_%' GROUP BY name"
+        ).fetchall())
+    except sqlite3.OperationalError:
+        pass
+    indexes = {}
+    for table, index in conn.execute(
+        "SELECT tbl_name, name FROM sqlite_master WHERE type='index' AND name NOT LIKE 'sqlite_%'"
+    ):
+        indexes.setdefault(table, []).append(index)
+
+    rows = []
+    for table in tables:
+        rows.append({
+            'table': table,
+            'rows': conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0],
+            'table_pages': pages.get(table),
+            'index_pages': sum(pages.get(index, 0) for index in indexes.get(table, [])) if pages else None,
+        })
+
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    summary = {
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist,
+        'file_mb': page_size * page_count / 1e6,
+        'free_mb': page_size * freelist / 1e6,
+        'auto_vacuum': {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}[conn.execute("PRAGMA auto_vacuum").fetchone()[0]],
+        'last_run': last_run(conn),
+    }
+    return pd.DataFrame(rows, columns=['table', 'rows', 'table_pages', 'index_pages']), summary
+
+
+# ===================== SCHEDULER =====================
+class MaintenanceScheduler:
+    def __init__(self, db_paths, interval=MAINTENANCE_INTERVAL, poll_interval=600):
+        # db_paths: list of database files, or a callable returning one
+        self.db_paths = db_paths
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+
+    def run_due(self):
+        paths = self.db_paths() if callable(self.db_paths) else self.db_paths
+        ran = 0
+        for path in paths:
+            conn = connect(path)
+            try:
+                previous = last_run(conn)
+                if previous is None or datetime.now() - previous >= timedelta(seconds=self.interval):
+                    # Through the file's writer, like every other write
+                    writer_for(path).submit(run_maintenance, exclusive=True).result()
+                    ran += 1
+            finally:
+                conn.close()
+        return ran
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_due()
+            except Exception:
+                logger.exception("Maintenance failed")
+            self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+def start_maintenance_thread(db_paths, **kwargs):
+    scheduler = MaintenanceScheduler(db_paths, **kwargs)
+    threading.Thread(target=scheduler.run, name='jengahub-maintenance', daemon=True).start()
+    return scheduler
+
+
+def main(argv=None):
+    from jengahub_shards import SHARD_DIR, open_router
+
+    parser = argparse.ArgumentParser(description="Storage maintenance for Jenga Hub PMS")
+    parser.add_argument('command', choices=['run', 'stats', 'convert'])
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--shard-dir', default=SHARD_DIR)
+    args = parser.parse_args(argv)
+
+    catalog = connect(args.db)
+    paths = [args.db] + [p for p in open_router(catalog, args.shard_dir).paths()
+                         if os.path.abspath(p) != os.path.abspath(args.db)]
+    catalog.close()
+    for path in paths:
+        conn = connect(path)
+        try:
+            init_database(conn)
+            if args.command == 'run':
+                result = run_maintenance(conn)
+                print(f"{path}: purged {result['orphans_purged'] or 'no orphans'}, "
+                      f"pruned {result['changes_pruned']} change log entries, "
+                      f"freed {result['pages_freed']} pages in {result['seconds']:.1f}s")
+            elif args.command == 'convert':
+                converted = enable_incremental_vacuum(conn)
+                print(f"{path}: {'converted to' if converted else 'already'} auto_vacuum=INCREMENTAL")
+            else:
+                stats, summary = storage_stats(conn)
+                print(f"{path}: {summary['file_mb']:.1f} MB, {summary['freelist_count']} free pages, "
+                      f"auto_vacuum={summary['auto_vacuum']}")
+                print(stats.to_string(index=False))
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
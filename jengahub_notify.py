@@ -0,0 +1,386 @@
+"""Parent notifications: transactional outbox plus an asyncio dispatcher.
+
+Notices are written to notification_outbox on the same cursor (and so in
+the same transaction) as the attendance or assessment rows that caused
+them. A dispatcher running on its own thread drains the outbox in batches
+per provider, so saving a class never waits on email or SMS delivery.
+"""
+import asyncio
+import json
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from email.message import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+LOW_GRADE_PERCENT = 50
+MAX_ATTEMPTS = 5
+
+OUTBOX_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        notification_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        school_id INTEGER,
+        student_id INTEGER,
+        kind TEXT,
+        channel TEXT,
+        recipient TEXT,
+        message TEXT,
+        dedup_key TEXT UNIQUE,
+        status TEXT DEFAULT 'pending',
+        attempts INTEGER DEFAULT 0,
+        next_attempt_at REAL DEFAULT 0,
+        last_error TEXT,
+        created_at TEXT,
+        sent_at TEXT
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_outbox_due ON notification_outbox(status, next_attempt_at)",
+]
+
+
+def init_outbox(conn):
+    for statement in OUTBOX_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+def channel_for(contact):
+    contact = (contact or '').strip()
+    if '@' in contact:
+        return 'email'
+    digits = contact.replace('+', '').replace(' ', '').replace('-', '')
+    if digits.isdigit() and len(digits) >= 7:
+        return 'sms'
+    return None
+
+
+# ===================== OUTBOX WRITES =====================
+def _parent_contacts(cursor, student_ids):
+    if not student_ids:
+        return {}
+    placeholders = ','.join('?' * len(student_ids))
+    rows = cursor.execute(
+        f"SELECT student_id, name, parent_name, parent_contact FROM students WHERE student_id IN ({placeholders})",
+        [int(s) for s in student_ids]
+    ).fetchall()
+    return {row[0]: row[1:] for row in rows}
+
+
+def _queue(cursor, school_id, kind, notices):
+    # notices: (student_id, dedup_key, message_template); the template may
+    # use {student} and {parent}
+    contacts = _parent_contacts(cursor, [n[0] for n in notices])
+    now = datetime.now().isoformat(timespec='seconds')
+    rows = []
+    for student_id, dedup_key, template in notices:
+        if int(student_id) not in contacts:
+            continue
+        name, parent_name, contact = contacts[int(student_id)]
+        channel = channel_for(contact)
+        if channel is None:
+            continue
+        message = template.format(student=name, parent=parent_name or 'Parent/Guardian')
+        rows.append((int(school_id), int(student_id), kind, channel, contact.strip(), message, dedup_key, now))
+    cursor.executemany('''
+        INSERT OR IGNORE INTO notification_outbox
+            (school_id, student_id, kind, channel, recipient, message, dedup_key, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    # Rows already queued under the same dedup_key are skipped
+    return max(cursor.rowcount, 0)
+
+
+def queue_attendance_notices(cursor, school_id, date, records):
+    # records: iterable of dicts with student_id and status
+    notices = [
+        (r['student_id'], f"absence:{int(r['student_id'])}:{date}",
+         f"Dear {{parent}}, {{student}} was marked absent from school on {date}.")
+        for r in records if r['status'] == 'Absent'
+    ]
+    return _queue(cursor, school_id, 'absence', notices)
+
+
+def queue_assessment_notices(cursor, school_id, date, subject, records):
+    # records: iterable of dicts with student_id, marks and total
+    notices = []
+    for r in records:
+        if not r['total'] or r['marks'] / r['total'] * 100 >= LOW_GRADE_PERCENT:
+            continue
+        notices.append((
+            r['student_id'], f"low_grade:{int(r['student_id'])}:{date}:{subject}",
+            f"Dear {{parent}}, {{student}} scored {r['marks']}/{r['total']} in {subject} on {date}."
+        ))
+    return _queue(cursor, school_id, 'low_grade', notices)
+
+
+# ===================== PROVIDERS =====================
+class Provider:
+    channel = None
+    batch_size = 50
+    rate_per_second = 10.0
+
+    async def send_batch(self, messages):
+        # messages: list of (notification_id, recipient, message). Returns
+        # {notification_id: error or None}.
+        raise NotImplementedError
+
+
+class SmtpProvider(Provider):
+    channel = 'email'
+
+    def __init__(self, host, port=25, sender='noreply@jengahub.org', username=None,
+                 password=None, starttls=False, subject='Message from school'):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.subject = subject
+
+    def _send(self, messages):
+        results = {}
+        # One SMTP session per batch
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for notification_id, recipient, text in messages:
+                msg = EmailMessage()
+                msg['From'] = self.sender
+                msg['To'] = recipient
+                msg['Subject'] = self.subject
+                msg.set_content(text)
+                try:
+                    smtp.send_message(msg)
+                    results[notification_id] = None
+                except smtplib.SMTPException as e:
+                    results[notification_id] = str(e)
+        return results
+
+    async def send_batch(self, messages):
+        return await asyncio.to_thread(self._send, messages)
+
+
+class SmsGatewayProvider(Provider):
+    # Posts a whole batch as one JSON request:
+    #   {"messages": [{"id": ..., "to": ..., "text": ...}, ...]}
+    # and expects {"failed": {"<id>": "<reason>", ...}} (or an empty body) back.
+    channel = 'sms'
+    batch_size = 100
+
+    def __init__(self, url, api_key=None, timeout=30):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def _send(self, messages):
+        body = json.dumps({'messages': [
+            {'id': notification_id, 'to': recipient, 'text': text}
+            for notification_id, recipient, text in messages
+        ]}).encode()
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        if self.api_key:
+            request.add_header('Authorization', f'Bearer {self.api_key}')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload = response.read()
+        failed = json.loads(payload).get('failed', {}) if payload else {}
+        return {n[0]: failed.get(str(n[0])) for n in messages}
+
+    async def send_batch(self, messages):
+        return await asyncio.to_thread(self._send, messages)
+
+
+def providers_from_env(env=os.environ):
+    providers = []
+    if env.get('JENGAHUB_SMTP_HOST'):
+        providers.append(SmtpProvider(
+            env['JENGAHUB_SMTP_HOST'],
+            int(env.get('JENGAHUB_SMTP_PORT', 25)),
+            sender=env.get('JENGAHUB_SMTP_SENDER', 'noreply@jengahub.org'),
+            username=env.get('JENGAHUB_SMTP_USER'),
+            password=env.get('JENGAHUB_SMTP_PASSWORD'),
+            starttls=env.get('JENGAHUB_SMTP_STARTTLS') == '1',
+        ))
+    if env.get('JENGAHUB_SMS_URL'):
+        providers.append(SmsGatewayProvider(env['JENGAHUB_SMS_URL'], env.get('JENGAHUB_SMS_API_KEY')))
+    return providers
+
+
+# ===================== DISPATCHER =====================
+class RateLimiter:
+    # Token bucket shared by all batches of one provider
+    def __init__(self, rate_per_second, burst=None):
+        self.rate = rate_per_second
+        self.capacity = burst or max(rate_per_second, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self, count):
+        # Every message is charged. A batch larger than the bucket goes out
+        # once the bucket is full and leaves it in debt, which the next
+        # batch waits off.
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            needed = min(count, self.capacity)
+            if self.tokens >= needed:
+                self.tokens -= count
+                return
+            await asyncio.sleep((needed - self.tokens) / self.rate)
+
+
+class NotificationDispatcher:
+    def __init__(self, db_paths, providers, poll_interval=5.0, max_attempts=MAX_ATTEMPTS):
+        # db_paths: one path, or a callable returning the current list of
+        # database files (one per school in sharded mode)
+        self.db_paths = db_paths
+        self.providers = {p.channel: p for p in providers}
+        self.limiters = {p.channel: RateLimiter(p.rate_per_second) for p in providers}
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._stop = None
+        self._loop = None
+
+    def _paths(self):
+        if callable(self.db_paths):
+            return list(self.db_paths())
+        return [self.db_paths]
+
+    def _connect(self, path):
+        conn = sqlite3.connect(path, timeout=30)
+        init_outbox(conn)
+        return conn
+
+    def _claim(self, conn, channel, limit):
+        with conn:
+            rows = conn.execute('''
+                SELECT notification_id, recipient, message FROM notification_outbox
+                WHERE status='pending' AND channel=? AND next_attempt_at <= ?
+                ORDER BY notification_id LIMIT ?
+            ''', (channel, time.time(), limit)).fetchall()
+            conn.executemany(
+                "UPDATE notification_outbox SET status='sending' WHERE notification_id=?",
+                [(r[0],) for r in rows]
+            )
+        # Several notices for the same recipient in one batch go out as one message
+        merged = {}
+        for notification_id, recipient, message in rows:
+            merged.setdefault(recipient, []).append((notification_id, message))
+        return merged
+
+    def _record(self, conn, merged, results):
+        now = datetime.now().isoformat(timespec='seconds')
+        sent, failed = [], []
+        for recipient, items in merged.items():
+            error = results.get(items[0][0])
+            for notification_id, _ in items:
+                if error is None:
+                    sent.append((now, notification_id))
+                else:
+                    failed.append((str(error)[:500], notification_id))
+        with conn:
+            conn.executemany(
+                "UPDATE notification_outbox SET status='sent', sent_at=?, attempts=attempts+1 WHERE notification_id=?",
+                sent
+            )
+            # Exponential backoff; give up after max_attempts
+            conn.executemany('''
+                UPDATE notification_outbox SET
+                    attempts = attempts + 1,
+                    last_error = ?,
+                    status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+                    next_attempt_at = ? + (30 * (1 << attempts))
+                WHERE notification_id = ?
+            ''', [(error, self.max_attempts, time.time(), notification_id) for error, notification_id in failed])
+        return len(sent), len(failed)
+
+    async def _drain_channel(self, conn, channel):
+        provider = self.providers[channel]
+        total = 0
+        while True:
+            merged = self._claim(conn, channel, provider.batch_size)
+            if not merged:
+                return total
+            batch = [(items[0][0], recipient, '\n\n'.join(m for _, m in items))
+                     for recipient, items in merged.items()]
+            await self.limiters[channel].acquire(len(batch))
+            try:
+                results = await provider.send_batch(batch)
+            except Exception as e:
+                results = {n[0]: str(e) or type(e).__name__ for n in batch}
+            self._record(conn, merged, results)
+            total += len(batch)
+
+    async def drain(self, conn=None):
+        # Send everything currently due, all providers concurrently
+        if conn is not None:
+            counts = await asyncio.gather(*(self._drain_channel(conn, c) for c in self.providers))
+            return sum(counts)
+        total = 0
+        for path in self._paths():
+            conn = self._connect(path)
+            try:
+                total += await self.drain(conn)
+            finally:
+                conn.close()
+        return total
+
+    async def run(self):
+        self._stop = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        conns = {}
+        try:
+            while not self._stop.is_set():
+                try:
+                    paths = self._paths()
+                except Exception:
+                    logger.exception("Could not list databases for notifications")
+                    paths = list(conns)
+                # Files that are gone (a reset drops the shards) are let go
+                for path in set(conns) - set(paths):
+                    conns.pop(path).close()
+                for path in paths:
+                    try:
+                        if path not in conns:
+                            conns[path] = self._connect(path)
+                            # Anything left 'sending' by a crashed dispatcher is retried
+                            with conns[path]:
+                                conns[path].execute(
+                                    "UPDATE notification_outbox SET status='pending' WHERE status='sending'")
+                        await self.drain(conns[path])
+                    except Exception:
+                        # Reconnected on the next poll
+                        logger.exception("Sending notifications from %s failed", path)
+                        if path in conns:
+                            conns.pop(path).close()
+                try:
+                    await asyncio.wait_for(self._stop.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for conn in conns.values():
+                conn.close()
+
+    def stop(self):
+        # Safe to call from any thread
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+
+def start_dispatcher_thread(db_paths, providers, poll_interval=5.0):
+    # Runs the dispatcher on a daemon thread with its own event loop
+    dispatcher = NotificationDispatcher(db_paths, providers, poll_interval=poll_interval)
+    thread = threading.Thread(target=asyncio.run, args=(dispatcher.run(),),
+                              name='notification-dispatcher', daemon=True)
+    thread.start()
+    return dispatcher, thread
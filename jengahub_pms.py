@@ -4,6 +4,35 @@ import sqlite3
 from datetime import datetime
 import plotly.express as px
 import os
+from jengahub_analytics import analytics_backend
+from jengahub_backup import (backup_sources, create_backup, list_backups, restore_backup, start_backup_thread,
+                             verify_backup)
+from jengahub_bitmaps import BITMAPS_ENABLED, sync_bitmaps
+from jengahub_cache import shared_cache
+from jengahub_calendar import attendance_matrix, class_heatmap, status_totals, student_calendar, weekday_summary
+from jengahub_cdc import export_changes, record_reset, to_jsonl
+from jengahub_charts import trend_chart
+from jengahub_db import DB_PATH, connect, database_path, init_database, reset_schema
+from jengahub_frames import read_frame
+from jengahub_gradebook import COLUMN_PAGE_SIZE, column_page, column_pages, gradebook
+from jengahub_maintenance import (enable_incremental_vacuum, incremental_vacuum, optimize, purge_orphans,
+                                  run_maintenance, start_maintenance_thread, storage_stats)
+from jengahub_notify import (providers_from_env, queue_assessment_notices, queue_attendance_notices,
+                             start_dispatcher_thread)
+from jengahub_replica import REPLICA_DIR, ReplicaRouter, start_refresher_thread
+from jengahub_reports import (PERIODS, REPORT_TYPES, cached_report, compute_artifact, drop_artifacts, load_artifact,
+                              period_bounds, start_report_thread)
+from jengahub_prefetch import Prefetcher, school_roster
+from jengahub_ranks import rank_board, student_ranks
+from jengahub_reportcards import report_cards_zip
+from jengahub_scores import GROUPINGS, percentage, school_scores, score_stats, standardize
+from jengahub_search import SEARCH_LIMIT, escape_markdown, highlight_markdown, search_comments
+from jengahub_shards import open_router
+from jengahub_tables import count_rows, paged_table
+from jengahub_terms import current_term, recent_terms, term_bounds, term_label
+from jengahub_transfer import export_workbook
+from jengahub_portal import HISTORY_TABLES, history_page, performance_series, student_summary
+from jengahub_writer import WriterBusy, writer_for
 
 # ===================== CUSTOM CSS FOR YELLOW MAIN CONTENT =====================
 st.markdown("""
@@ -35,92 +64,108 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ===================== DATABASE SETUP =====================
-conn = sqlite3.connect('school_management.db', check_same_thread=False)
+# In sharded mode this is the catalog (schools only); school pages switch
+# `conn` to that school's database via db.connection(school_id)
+# Schema setup writes, so it runs once per process rather than on every rerun
+@st.cache_resource
+def prepare_database(path):
+    setup = connect(path)
+    try:
+        init_database(setup)
+    finally:
+        setup.close()
+    return True
+
+
+prepare_database(DB_PATH)
+conn = connect(DB_PATH)
 cursor = conn.cursor()
+db = open_router(conn)
+# Analytics, Reports and Export Data read from snapshot copies when a
+# replica directory is configured, so they never hold locks writers wait on
+reads = ReplicaRouter(db) if REPLICA_DIR else db
+
+
+def database_paths():
+    # Every database file holding school data (one per school when sharded)
+    catalog = connect(DB_PATH)
+    try:
+        return open_router(catalog).paths()
+    finally:
+        catalog.close()
+
+
+# Parent notifications are sent from a background thread, started once per process
+@st.cache_resource
+def notification_dispatcher():
+    providers = providers_from_env()
+    if providers:
+        return start_dispatcher_thread(database_paths, providers)
+
+
+notification_dispatcher()
+
+
+@st.cache_resource
+def replica_refresher():
+    if REPLICA_DIR:
+        return start_refresher_thread(database_paths)
+
+
+replica_refresher()
+
+
+# Orphan cleanup, statistics and space reclaim, once a day per database
+@st.cache_resource
+def maintenance_scheduler():
+    return start_maintenance_thread(database_paths)
+
+
+maintenance_scheduler()
+
+
+# Standard reports for every school, precomputed nightly
+@st.cache_resource
+def report_scheduler():
+    return start_report_thread()
 
-# Schools Table
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS schools (
-    school_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT UNIQUE
-)
-''')
-
-# Students Table
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS students (
-    student_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    school_id INTEGER,
-    name TEXT,
-    age INTEGER,
-    grade TEXT,
-    parent_name TEXT,
-    parent_contact TEXT,
-    FOREIGN KEY(school_id) REFERENCES schools(school_id)
-)
-''')
-
-# Attendance & Behaviour Table
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS attendance (
-    attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    student_id INTEGER,
-    school_id INTEGER,
-    date TEXT,
-    status TEXT,
-    behaviour_score INTEGER,
-    behaviour_comment TEXT,
-    FOREIGN KEY(student_id) REFERENCES students(student_id),
-    FOREIGN KEY(school_id) REFERENCES schools(school_id)
-)
-''')
-
-# Assessments Table
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS assessments (
-    assessment_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    student_id INTEGER,
-    school_id INTEGER,
-    date TEXT,
-    subject TEXT,
-    marks INTEGER,
-    total INTEGER,
-    grade TEXT,
-    FOREIGN KEY(student_id) REFERENCES students(student_id),
-    FOREIGN KEY(school_id) REFERENCES schools(school_id)
-)
-''')
-
-# Teachers Table (NEW)
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS teachers (
-    teacher_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    school_id INTEGER,
-    name TEXT,
-    email TEXT,
-    phone TEXT,
-    subject TEXT,
-    qualification TEXT,
-    join_date TEXT,
-    status TEXT DEFAULT 'Active',
-    FOREIGN KEY(school_id) REFERENCES schools(school_id)
-)
-''')
-
-# Teacher Assignments Table (NEW)
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS teacher_assignments (
-    assignment_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    teacher_id INTEGER,
-    school_id INTEGER,
-    class_grade TEXT,
-    subject TEXT,
-    academic_year TEXT,
-    FOREIGN KEY(teacher_id) REFERENCES teachers(teacher_id),
-    FOREIGN KEY(school_id) REFERENCES schools(school_id)
-)
-''')
-conn.commit()
+
+report_scheduler()
+
+
+# Compressed snapshots of every database file, once a day
+@st.cache_resource
+def backup_scheduler():
+    return start_backup_thread(lambda: backup_sources(DB_PATH))
+
+
+backup_scheduler()
+
+
+# Loads a school's working set in the background as soon as it is picked;
+# picking another school cancels the previous session's job
+@st.cache_resource
+def school_prefetcher():
+    return Prefetcher(DB_PATH, REPLICA_DIR)
+
+
+def prefetch_school(school_id):
+    job = st.session_state.get('prefetch_job')
+    if job is not None and job.school_id == int(school_id):
+        return
+    if job is not None:
+        job.cancel()
+    st.session_state['prefetch_job'] = school_prefetcher().submit(school_id)
+
+
+def show_replica_status(school_id):
+    if reads is db:
+        return
+    status = reads.status(school_id)
+    if status:
+        minutes = int(status['age_seconds'] // 60)
+        st.caption(f"📸 Data as of {status['refreshed_at']:%Y-%m-%d %H:%M:%S} "
+                   f"({minutes} min old, {status['changes_behind']} changes since)")
 
 # ===================== SIDEBAR =====================
 try:
@@ -135,9 +180,13 @@ menu = st.sidebar.radio("Navigation", [
     "Teachers", 
     "Students", 
     "Attendance & Behaviour", 
+    "Attendance Calendar",
+    "Behaviour Search",
     "Assessments", 
+    "Gradebook",
     "Analytics", 
     "Reports",
+    "Report Cards",
     "Teacher Portal",
     "Parent Portal",
     "Export Data", 
@@ -150,27 +199,31 @@ if menu == "Schools":
     school_name = st.text_input("Add a New School")
     if st.button("Add School") and school_name:
         try:
-            cursor.execute("INSERT INTO schools (name) VALUES (?)", (school_name,))
-            conn.commit()
+            writer_for(conn).execute("INSERT INTO schools (name) VALUES (?)", (school_name,)).result()
+        except sqlite3.IntegrityError:
+            st.error("School already exists!")
+        except WriterBusy as e:
+            st.error(str(e))
+        else:
             st.success(f"School '{school_name}' added successfully!")
             st.rerun()
-        except:
-            st.error("School already exists!")
 
     st.subheader("Existing Schools")
-    df_schools = pd.read_sql_query("SELECT * FROM schools", conn)
-    st.dataframe(df_schools)
+    paged_table(conn, 'schools', key='schools_list')
 
 # ===================== TEACHERS (NEW) =====================
 elif menu == "Teachers":
     st.header("👨‍🏫 Teacher Management")
     
-    df_schools = pd.read_sql_query("SELECT * FROM schools", conn)
+    df_schools = read_frame("SELECT * FROM schools", conn)
     if df_schools.empty:
         st.warning("No schools available. Please add a school first!")
     else:
         school_select = st.selectbox("Select School", df_schools['name'])
         school_id = df_schools[df_schools['name'] == school_select]['school_id'].values[0]
+        prefetch_school(school_id)
+        conn = db.connection(school_id)
+        cursor = conn.cursor()
         
         # Add Teacher Form
         with st.form("add_teacher_form", clear_on_submit=True):
@@ -188,24 +241,28 @@ elif menu == "Teachers":
             submitted = st.form_submit_button("Add Teacher")
             if submitted:
                 if t_name.strip():
-                    cursor.execute('''
-                        INSERT INTO teachers (school_id, name, email, phone, subject, qualification, join_date)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (school_id, t_name, t_email, t_phone, t_subject, t_qualification, str(t_join_date)))
-                    conn.commit()
-                    st.success(f"Teacher '{t_name}' added successfully!")
-                    st.rerun()
+                    try:
+                        writer_for(conn).execute('''
+                            INSERT INTO teachers (school_id, name, email, phone, subject, qualification, join_date)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ''', (school_id, t_name, t_email, t_phone, t_subject, t_qualification, str(t_join_date))).result()
+                    except WriterBusy as e:
+                        st.error(str(e))
+                    else:
+                        st.success(f"Teacher '{t_name}' added successfully!")
+                        st.rerun()
         
         # Teacher List
-        df_teachers = pd.read_sql_query("SELECT * FROM teachers WHERE school_id=?", conn, params=(school_id,))
         st.subheader("📋 Teaching Staff")
+        if count_rows(conn, 'teachers', {'school_id': school_id}):
+            df_teachers = paged_table(conn, 'teachers', key='teachers_list', where={'school_id': school_id})
+        else:
+            df_teachers = pd.DataFrame()
         if not df_teachers.empty:
-            st.dataframe(df_teachers)
-            
-            # Teacher Assignments
+            # Teacher Assignments (teachers on the page shown above)
             st.subheader("📚 Class Assignments")
-            selected_teacher = st.selectbox("Select Teacher", df_teachers['name'].tolist())
-            teacher_id = df_teachers[df_teachers['name'] == selected_teacher]['teacher_id'].values[0]
+            teacher_names = dict(zip(df_teachers['teacher_id'], df_teachers['name']))
+            teacher_id = st.selectbox("Select Teacher", list(teacher_names), format_func=teacher_names.get)
             
             with st.form("assignment_form"):
                 col1, col2 = st.columns(2)
@@ -216,26 +273,32 @@ elif menu == "Teachers":
                     academic_year = st.text_input("Academic Year", "2024-2025")
                 
                 if st.form_submit_button("Assign Class"):
-                    cursor.execute('''
-                        INSERT INTO teacher_assignments (teacher_id, school_id, class_grade, subject, academic_year)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (teacher_id, school_id, assign_class, assign_subject, academic_year))
-                    conn.commit()
-                    st.success("Class assigned successfully!")
-                    st.rerun()
-        else:
+                    try:
+                        writer_for(conn).execute('''
+                            INSERT INTO teacher_assignments (teacher_id, school_id, class_grade, subject, academic_year)
+                            VALUES (?, ?, ?, ?, ?)
+                        ''', (teacher_id, school_id, assign_class, assign_subject, academic_year)).result()
+                    except WriterBusy as e:
+                        st.error(str(e))
+                    else:
+                        st.success("Class assigned successfully!")
+                        st.rerun()
+        elif not count_rows(conn, 'teachers', {'school_id': school_id}):
             st.info("No teachers found for this school.")
 
 # ===================== STUDENTS =====================
 elif menu == "Students":
     st.header("🧑‍🎓 Manage Students")
 
-    df_schools = pd.read_sql_query("SELECT * FROM schools", conn)
+    df_schools = read_frame("SELECT * FROM schools", conn)
     if df_schools.empty:
         st.warning("No schools available. Please add a school first!")
     else:
         school_select = st.selectbox("Select School", df_schools['name'])
         school_id = df_schools[df_schools['name'] == school_select]['school_id'].values[0]
+        prefetch_school(school_id)
+        conn = db.connection(school_id)
+        cursor = conn.cursor()
 
         with st.form("add_student_form", clear_on_submit=True):
             st.subheader("➕ Add New Student")
@@ -249,11 +312,10 @@ elif menu == "Students":
             if submitted:
                 if s_name.strip():
                     try:
-                        cursor.execute('''
+                        writer_for(conn).execute('''
                             INSERT INTO students (school_id, name, age, grade, parent_name, parent_contact)
                             VALUES (?, ?, ?, ?, ?, ?)
-                        ''', (school_id, s_name.strip(), s_age, s_grade, s_parent, s_contact))
-                        conn.commit()
+                        ''', (school_id, s_name.strip(), s_age, s_grade, s_parent, s_contact)).result()
                         st.success(f"Student '{s_name}' added successfully!")
                         st.rerun()
                     except Exception as e:
@@ -261,16 +323,19 @@ elif menu == "Students":
                 else:
                     st.error("Student name is required!")
 
-        df_students = pd.read_sql_query("SELECT * FROM students WHERE school_id=?", conn, params=(school_id,))
         st.subheader("📋 Existing Students")
         
-        if df_students.empty:
+        if not count_rows(conn, 'students', {'school_id': school_id}):
             st.info("No students found for this school.")
+            df_students = pd.DataFrame()
         else:
-            st.dataframe(df_students)
+            df_students = paged_table(conn, 'students', key='students_list', where={'school_id': school_id})
 
         if not df_students.empty:
-            selected_id = st.selectbox("Select Student ID to Edit/Delete", df_students['student_id'].tolist())
+            # Picks from the page shown above; filter the list to find a student
+            student_labels = {row.student_id: f"{row.student_id} - {row.name}" for row in df_students.itertuples()}
+            selected_id = st.selectbox("Select Student to Edit/Delete", list(student_labels),
+                                       format_func=student_labels.get)
             student = df_students[df_students['student_id'] == selected_id].iloc[0]
 
             s_edit_name = st.text_input("Student Name", student['name'])
@@ -283,28 +348,34 @@ elif menu == "Students":
             with col1:
                 if st.button("Update Student"):
                     if s_edit_name.strip():
-                        cursor.execute('''
-                            UPDATE students 
-                            SET name=?, age=?, grade=?, parent_name=?, parent_contact=?
-                            WHERE student_id=?
-                        ''', (s_edit_name, s_edit_age, s_edit_grade, s_edit_parent, s_edit_contact, selected_id))
-                        conn.commit()
-                        st.success("Student updated successfully!")
-                        st.rerun()
+                        try:
+                            writer_for(conn).execute('''
+                                UPDATE students 
+                                SET name=?, age=?, grade=?, parent_name=?, parent_contact=?
+                                WHERE student_id=?
+                            ''', (s_edit_name, s_edit_age, s_edit_grade, s_edit_parent, s_edit_contact, selected_id)).result()
+                        except WriterBusy as e:
+                            st.error(str(e))
+                        else:
+                            st.success("Student updated successfully!")
+                            st.rerun()
                     else:
                         st.error("Student name is required!")
             
             with col2:
                 if st.button("Delete Student"):
-                    cursor.execute("DELETE FROM students WHERE student_id=?", (selected_id,))
-                    conn.commit()
-                    st.success("Student deleted successfully!")
-                    st.rerun()
+                    try:
+                        writer_for(conn).execute("DELETE FROM students WHERE student_id=?", (selected_id,)).result()
+                    except WriterBusy as e:
+                        st.error(str(e))
+                    else:
+                        st.success("Student deleted successfully!")
+                        st.rerun()
 
 # ===================== ATTENDANCE & BEHAVIOUR =====================
 elif menu == "Attendance & Behaviour":
     st.header("✅ Record Attendance & Behaviour")
-    df_schools = pd.read_sql_query("SELECT * FROM schools", conn)
+    df_schools = read_frame("SELECT * FROM schools", conn)
     
     if df_schools.empty:
         st.warning("No schools available. Please add a school first!")
@@ -313,14 +384,17 @@ elif menu == "Attendance & Behaviour":
         
         if school_select:
             school_id = df_schools[df_schools['name']==school_select]['school_id'].values[0]
+            prefetch_school(school_id)
+            conn = db.connection(school_id)
+            cursor = conn.cursor()
             
-            df_students = pd.read_sql_query("SELECT * FROM students WHERE school_id=?", conn, params=(school_id,))
+            df_students = school_roster(conn, school_id)
             
             if df_students.empty:
                 st.warning("No students found for this school. Please add students first.")
             else:
                 st.subheader(f"📋 Students in {school_select}")
-                st.dataframe(df_students[['student_id', 'name', 'grade', 'age']])
+                paged_table(conn, 'students', key=f"roster_{menu}", where={'school_id': school_id})
                 
                 st.subheader("🎯 Record Attendance & Behaviour")
                 date = st.date_input("Select Date")
@@ -368,25 +442,123 @@ elif menu == "Attendance & Behaviour":
                         submitted = st.form_submit_button("💾 Save All Attendance Records")
                         
                         if submitted:
-                            success_count = 0
-                            for data in attendance_data:
-                                try:
-                                    cursor.execute('''
-                                        INSERT INTO attendance (student_id, school_id, date, status, behaviour_score, behaviour_comment)
-                                        VALUES (?, ?, ?, ?, ?, ?)
-                                    ''', (data['student_id'], school_id, str(date), data['status'], data['behaviour_score'], data['behaviour_comment']))
-                                    success_count += 1
-                                except Exception as e:
-                                    st.error(f"Error saving record for {data['name']}: {e}")
+                            # One bulk write; parent notices go in the same transaction
+                            def save_attendance(writer_conn):
+                                writer_cursor = writer_conn.cursor()
+                                writer_cursor.executemany('''
+                                    INSERT INTO attendance (student_id, school_id, date, status, behaviour_score, behaviour_comment)
+                                    VALUES (?, ?, ?, ?, ?, ?)
+                                ''', [(data['student_id'], school_id, str(date), data['status'], data['behaviour_score'], data['behaviour_comment'])
+                                      for data in attendance_data])
+                                queue_attendance_notices(writer_cursor, school_id, date, attendance_data)
+                                if BITMAPS_ENABLED:
+                                    sync_bitmaps(writer_conn, school_id)
                             
-                            conn.commit()
-                            st.success(f"✅ Successfully saved attendance records for {success_count} out of {len(attendance_data)} students!")
-                            st.rerun()
+                            try:
+                                writer_for(conn).submit(save_attendance).result()
+                            except WriterBusy as e:
+                                st.error(str(e))
+                            except Exception as e:
+                                st.error(f"Error saving attendance records: {e}")
+                            else:
+                                st.success(f"✅ Successfully saved attendance records for {len(attendance_data)} students!")
+                                st.rerun()
+
+# ===================== ATTENDANCE CALENDAR =====================
+elif menu == "Attendance Calendar":
+    st.header("🗓️ Attendance Calendar")
+    df_schools = read_frame("SELECT * FROM schools", conn)
+    
+    if df_schools.empty:
+        st.warning("No schools available. Please add a school first!")
+    else:
+        school_select = st.selectbox("Select School", df_schools['name'])
+        school_id = df_schools[df_schools['name']==school_select]['school_id'].values[0]
+        prefetch_school(school_id)
+        conn = db.connection(school_id)
+        cursor = conn.cursor()
+        
+        grades = [g for (g,) in cursor.execute(
+            "SELECT DISTINCT grade FROM students WHERE school_id=? ORDER BY grade", (int(school_id),)
+        )]
+        if not grades:
+            st.warning("No students found for this school. Please add students first.")
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                cal_grade = st.selectbox("Grade/Class", grades)
+            with col2:
+                cal_term = st.selectbox("Term", recent_terms(6))
+            
+            matrix = attendance_matrix(conn, school_id, cal_grade, cal_term)
+            if not matrix.statuses.any():
+                st.info(f"No attendance recorded for {cal_grade} in {cal_term}.")
+            else:
+                st.caption("🟩 Present  🟧 Late  🟥 Absent  ⬜ No record")
+                st.plotly_chart(class_heatmap(matrix, title=f"{cal_grade}, {cal_term}"))
+                
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.subheader("📅 By Weekday")
+                    st.dataframe(weekday_summary(matrix))
+                with col2:
+                    st.subheader("⚠️ Most Absences")
+                    st.dataframe(status_totals(matrix).head(10), hide_index=True)
+                
+                st.subheader("👤 Student Calendar")
+                cal_student = st.selectbox(
+                    "Student", list(matrix.student_ids),
+                    format_func=lambda s: f"{matrix.names[matrix.row(s)]} ({s})"
+                )
+                st.plotly_chart(student_calendar(matrix, cal_student, title=matrix.names[matrix.row(cal_student)]))
+                st.dataframe(weekday_summary(matrix, cal_student))
+
+# ===================== BEHAVIOUR SEARCH =====================
+elif menu == "Behaviour Search":
+    st.header("🔎 Behaviour Comment Search")
+    df_schools = read_frame("SELECT * FROM schools", conn)
+    
+    if df_schools.empty:
+        st.warning("No schools available. Please add a school first!")
+    else:
+        school_select = st.selectbox("Select School", df_schools['name'])
+        school_id = df_schools[df_schools['name']==school_select]['school_id'].values[0]
+        prefetch_school(school_id)
+        conn = db.connection(school_id)
+        cursor = conn.cursor()
+        
+        search_text = st.text_input("Search comments", placeholder='e.g. bullying fight, "left early", disrupt*')
+        col1, col2, col3 = st.columns(3)
+        term_start, _ = term_bounds(current_term())
+        with col1:
+            search_start = st.date_input("From", value=term_start, key="search_start")
+        with col2:
+            search_end = st.date_input("To", key="search_end")
+        with col3:
+            grades = [g for (g,) in cursor.execute(
+                "SELECT DISTINCT grade FROM students WHERE school_id=? AND grade IS NOT NULL ORDER BY grade",
+                (int(school_id),)
+            )]
+            search_grade = st.selectbox("Grade/Class", ["All"] + grades, key="search_grade")
+        st.caption("Finds comments with any of the words (fight also finds fighting), best matches first. "
+                   "Use quotes for a phrase and * for word starts.")
+        
+        if search_text.strip():
+            results = search_comments(conn, search_text, school_id, search_start, search_end,
+                                      None if search_grade == "All" else search_grade)
+            if results.empty:
+                st.info("No comments match your search.")
+            else:
+                st.write(f"**{len(results)}** matching comments" +
+                         (" (best matches shown)" if len(results) >= SEARCH_LIMIT else ""))
+                for row in results.itertuples():
+                    st.markdown(f"**{escape_markdown(row.name)}** · {escape_markdown(row.grade)} · {row.date} · "
+                                f"{row.status}, behaviour {row.behaviour_score}  \n{highlight_markdown(row.comment)}")
 
 # ===================== ASSESSMENTS =====================
 elif menu == "Assessments":
     st.header("📝 Record Assessments")
-    df_schools = pd.read_sql_query("SELECT * FROM schools", conn)
+    df_schools = read_frame("SELECT * FROM schools", conn)
     
     if df_schools.empty:
         st.warning("No schools available. Please add a school first!")
@@ -395,14 +567,17 @@ elif menu == "Assessments":
         
         if school_select:
             school_id = df_schools[df_schools['name']==school_select]['school_id'].values[0]
+            prefetch_school(school_id)
+            conn = db.connection(school_id)
+            cursor = conn.cursor()
             
-            df_students = pd.read_sql_query("SELECT * FROM students WHERE school_id=?", conn, params=(school_id,))
+            df_students = school_roster(conn, school_id)
             
             if df_students.empty:
                 st.warning("No students found for this school. Please add students first.")
             else:
                 st.subheader(f"📋 Students in {school_select}")
-                st.dataframe(df_students[['student_id', 'name', 'grade', 'age']])
+                paged_table(conn, 'students', key=f"roster_{menu}", where={'school_id': school_id})
                 
                 st.subheader("🎯 Record Assessments")
                 
@@ -433,20 +608,20 @@ elif menu == "Assessments":
                                     key=f"marks_{row['student_id']}"
                                 )
                             with col3:
-                                percentage = (marks / total_marks) * 100 if total_marks > 0 else 0
-                                if percentage >= 90:
+                                score_pct = (marks / total_marks) * 100 if total_marks > 0 else 0
+                                if score_pct >= 90:
                                     grade = "A"
-                                elif percentage >= 80:
+                                elif score_pct >= 80:
                                     grade = "B"
-                                elif percentage >= 70:
+                                elif score_pct >= 70:
                                     grade = "C"
-                                elif percentage >= 60:
+                                elif score_pct >= 60:
                                     grade = "D"
                                 else:
                                     grade = "E"
                                 
                                 st.write(f"**Grade: {grade}**")
-                                st.write(f"({percentage:.1f}%)")
+                                st.write(f"({score_pct:.1f}%)")
                             
                             assessment_data.append({
                                 'student_id': row['student_id'],
@@ -459,31 +634,88 @@ elif menu == "Assessments":
                         submitted = st.form_submit_button("💾 Save All Assessment Records")
                         
                         if submitted:
-                            success_count = 0
-                            for data in assessment_data:
-                                try:
-                                    cursor.execute('''
-                                        INSERT INTO assessments (student_id, school_id, date, subject, marks, total, grade)
-                                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                                    ''', (data['student_id'], school_id, str(date), subject, data['marks'], data['total'], data['grade']))
-                                    success_count += 1
-                                except Exception as e:
-                                    st.error(f"Error saving assessment for {data['name']}: {e}")
+                            # One bulk write; parent notices go in the same transaction
+                            def save_assessments(writer_conn):
+                                writer_cursor = writer_conn.cursor()
+                                writer_cursor.executemany('''
+                                    INSERT INTO assessments (student_id, school_id, date, subject, marks, total, grade, percentage)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                                ''', [(data['student_id'], school_id, str(date), subject, data['marks'], data['total'], data['grade'],
+                                       percentage(data['marks'], data['total']))
+                                      for data in assessment_data])
+                                queue_assessment_notices(writer_cursor, school_id, date, subject, assessment_data)
                             
-                            conn.commit()
-                            st.success(f"✅ Successfully saved assessment records for {success_count} out of {len(assessment_data)} students!")
-                            st.rerun()
+                            try:
+                                writer_for(conn).submit(save_assessments).result()
+                            except WriterBusy as e:
+                                st.error(str(e))
+                            except Exception as e:
+                                st.error(f"Error saving assessment records: {e}")
+                            else:
+                                st.success(f"✅ Successfully saved assessment records for {len(assessment_data)} students!")
+                                st.rerun()
+
+# ===================== GRADEBOOK =====================
+elif menu == "Gradebook":
+    st.header("📒 Gradebook")
+    df_schools = read_frame("SELECT * FROM schools", conn)
+    
+    if df_schools.empty:
+        st.warning("No schools available. Please add a school first!")
+    else:
+        school_select = st.selectbox("Select School", df_schools['name'])
+        school_id = df_schools[df_schools['name']==school_select]['school_id'].values[0]
+        prefetch_school(school_id)
+        conn = db.connection(school_id)
+        cursor = conn.cursor()
+        
+        grades = [g for (g,) in cursor.execute(
+            "SELECT DISTINCT grade FROM students WHERE school_id=? ORDER BY grade", (int(school_id),)
+        )]
+        if not grades:
+            st.warning("No students found for this school. Please add students first.")
+        else:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                gb_grade = st.selectbox("Grade/Class", grades)
+            with col2:
+                gb_term = st.selectbox("Term", recent_terms(6))
+            with col3:
+                gb_layout = st.radio("Columns", ["subject", "date"], horizontal=True,
+                                     format_func=lambda l: "Subjects" if l == "subject" else "Assessment Dates")
+            
+            grid = gradebook(conn, school_id, gb_grade, gb_term, gb_layout)
+            if len(grid.columns) <= 2:
+                st.info(f"No assessments recorded for {gb_grade} in {gb_term}.")
+            else:
+                pages = column_pages(grid)
+                page = 0
+                if pages > 1:
+                    page = st.number_input(f"Column page (of {pages}, {COLUMN_PAGE_SIZE} columns each)",
+                                           min_value=1, max_value=pages, value=1, step=1) - 1
+                st.caption("Percentages over the term. Right column: student average; last row: class average.")
+                st.dataframe(column_page(grid, page), hide_index=True)
+                st.download_button(
+                    label="⬇️ Download Gradebook (CSV)",
+                    data=grid.to_csv(index=False),
+                    file_name=f"{school_select}_{gb_grade}_{gb_term}_gradebook.csv",
+                    mime="text/csv"
+                )
 
 ## ===================== ANALYTICS (ENHANCED) - FIXED VERSION =====================
 elif menu == "Analytics":
     st.header("📊 Advanced Analytics & M&E Dashboard")
-    df_schools = pd.read_sql_query("SELECT * FROM schools", conn)
+    df_schools = read_frame("SELECT * FROM schools", conn)
     
     if df_schools.empty:
         st.warning("No schools available. Please add a school first!")
     else:
         school_select = st.selectbox("Select School", df_schools['name'])
         school_id = df_schools[df_schools['name']==school_select]['school_id'].values[0]
+        prefetch_school(school_id)
+        conn = reads.connection(school_id)
+        cursor = conn.cursor()
+        show_replica_status(school_id)
         
         # Time period selection
         col1, col2 = st.columns(2)
@@ -492,28 +724,22 @@ elif menu == "Analytics":
         with col2:
             end_date = st.date_input("End Date", datetime.now())
         
+        analytics = analytics_backend(reads)
+        overview = analytics.query('attendance_overview', school_id, start_date, end_date).iloc[0]
+        assessment_overview = analytics.query('assessment_overview', school_id, start_date, end_date).iloc[0]
+        has_attendance = overview['records'] > 0
+        has_assessments = assessment_overview['records'] > 0
+        
         # Alert System
-        def check_alerts(school_id, start_date, end_date):
-            alerts = []
-            df_attendance = pd.read_sql_query(
-                "SELECT * FROM attendance WHERE school_id=? AND date BETWEEN ? AND ?", 
-                conn, params=(school_id, str(start_date), str(end_date))
-            )
-            
-            if not df_attendance.empty:
-                # Low attendance alert
-                attendance_rate = (df_attendance['status'] == 'Present').mean() * 100
-                if attendance_rate < 80:
-                    alerts.append(f"⚠️ Low attendance rate: {attendance_rate:.1f}%")
-                
-                # Poor behaviour alert
-                avg_behaviour = df_attendance['behaviour_score'].mean()
-                if avg_behaviour < 2.5:
-                    alerts.append(f"😟 Low average behaviour score: {avg_behaviour:.1f}/5")
+        alerts = []
+        if has_attendance:
+            # Low attendance alert
+            if overview['attendance_rate'] < 80:
+                alerts.append(f"⚠️ Low attendance rate: {overview['attendance_rate']:.1f}%")
             
-            return alerts
-        
-        alerts = check_alerts(school_id, start_date, end_date)
+            # Poor behaviour alert
+            if overview['avg_behaviour'] < 2.5:
+                alerts.append(f"😟 Low average behaviour score: {overview['avg_behaviour']:.1f}/5")
         if alerts:
             st.subheader("🚨 System Alerts")
             for alert in alerts:
@@ -522,123 +748,83 @@ elif menu == "Analytics":
         # Key Performance Indicators
         st.subheader("📈 Key Performance Indicators")
         
-        df_students = pd.read_sql_query("SELECT * FROM students WHERE school_id=?", conn, params=(school_id,))
-        df_attendance = pd.read_sql_query(
-            "SELECT * FROM attendance WHERE school_id=? AND date BETWEEN ? AND ?", 
-            conn, params=(school_id, str(start_date), str(end_date))
-        )
-        df_assessments = pd.read_sql_query(
-            "SELECT * FROM assessments WHERE school_id=? AND date BETWEEN ? AND ?", 
-            conn, params=(school_id, str(start_date), str(end_date))
-        )
-        
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            total_students = len(df_students)
+            total_students = cursor.execute("SELECT COUNT(*) FROM students WHERE school_id=?", (int(school_id),)).fetchone()[0]
             st.metric("Total Students", total_students)
         
         with col2:
-            attendance_rate = (len(df_attendance[df_attendance['status'] == 'Present']) / len(df_attendance) * 100) if len(df_attendance) > 0 else 0
+            attendance_rate = overview['attendance_rate'] if has_attendance else 0
             st.metric("Attendance Rate", f"{attendance_rate:.1f}%")
         
         with col3:
-            avg_behaviour = df_attendance['behaviour_score'].mean() if not df_attendance.empty else 0
+            avg_behaviour = overview['avg_behaviour'] if has_attendance else 0
             st.metric("Avg Behaviour", f"{avg_behaviour:.1f}/5")
         
         with col4:
-            avg_marks = df_assessments['marks'].mean() if not df_assessments.empty else 0
-            st.metric("Avg Marks", f"{avg_marks:.1f}%")
+            avg_score = assessment_overview['avg_percentage'] if has_assessments else 0
+            st.metric("Avg Score", f"{avg_score:.1f}%")
         
         # Trend Analysis
         st.subheader("📅 Trend Analysis")
         
-        if not df_attendance.empty:
+        if has_attendance:
             try:
-                df_attendance['date'] = pd.to_datetime(df_attendance['date'])
-                monthly_attendance = df_attendance.groupby(df_attendance['date'].dt.to_period('M'))['status'].apply(
-                    lambda x: (x == 'Present').sum() / len(x) * 100
-                ).reset_index()
-                monthly_attendance['date'] = monthly_attendance['date'].astype(str)
-                
-                fig_trend = px.line(monthly_attendance, x='date', y='status', 
+                monthly_attendance = analytics.query('attendance_by_month', school_id, start_date, end_date)
+                fig_trend = px.line(monthly_attendance, x='month', y='attendance_rate', 
                                    title='Monthly Attendance Trend', markers=True)
                 st.plotly_chart(fig_trend)
             except Exception as e:
                 st.error(f"Error generating trend analysis: {e}")
         
-        # Performance by Grade - COMPLETELY FIXED VERSION
+        # Performance by Grade
         st.subheader("🎯 Performance by Grade")
-        if not df_assessments.empty and not df_students.empty:
+        if has_assessments:
             try:
-                # Debug: Check what columns we have
-                st.write("🔍 Debug Info:")
-                st.write(f"Assessments columns: {list(df_assessments.columns)}")
-                st.write(f"Students columns: {list(df_students.columns)}")
-                
-                # Merge assessments with student data
-                df_merged = df_assessments.merge(df_students[['student_id', 'grade']], on='student_id', how='left')
-                
-                # Debug: Check merged data
-                st.write(f"Merged columns: {list(df_merged.columns)}")
-                st.write(f"Sample merged data:")
-                st.dataframe(df_merged.head(3))
-                
-                # SAFE GRADE PERFORMANCE CALCULATION
-                if 'grade' in df_merged.columns:
-                    # Check if we have any non-null grade values
-                    if df_merged['grade'].notna().any():
-                        grade_performance = df_merged.groupby('grade')['marks'].agg(['mean', 'count']).round(2)
-                        grade_performance.columns = ['Average Marks', 'Number of Assessments']
-                        st.dataframe(grade_performance)
-                        
-                        # Visualize grade performance
-                        fig_grade = px.bar(grade_performance.reset_index(), 
-                                          x='grade', y='Average Marks',
-                                          title='Average Marks by Grade',
-                                          color='Average Marks')
-                        st.plotly_chart(fig_grade)
-                    else:
-                        st.info("No grade data available (all grade values are null).")
-                        
-                        # Show performance by subject instead
-                        st.subheader("📚 Performance by Subject")
-                        subject_performance = df_assessments.groupby('subject')['marks'].agg(['mean', 'count']).round(2)
-                        subject_performance.columns = ['Average Marks', 'Number of Assessments']
-                        st.dataframe(subject_performance)
+                grade_performance = analytics.query('marks_by_grade', school_id, start_date, end_date)
+                if not grade_performance.empty:
+                    grade_performance = grade_performance.set_index('grade')[['avg_percentage', 'assessments']].round(2)
+                    grade_performance.columns = ['Average Score %', 'Number of Assessments']
+                    st.dataframe(grade_performance)
+                    
+                    # Visualize grade performance
+                    fig_grade = px.bar(grade_performance.reset_index(), 
+                                      x='grade', y='Average Score %',
+                                      title='Average Score by Grade',
+                                      color='Average Score %')
+                    st.plotly_chart(fig_grade)
                 else:
-                    st.warning("Grade column not found in merged data. Showing performance by subject instead.")
+                    st.info("No grade data available (all grade values are null).")
                     
-                    # Fallback: Show performance by subject
+                    # Show performance by subject instead
                     st.subheader("📚 Performance by Subject")
-                    subject_performance = df_assessments.groupby('subject')['marks'].agg(['mean', 'count']).round(2)
-                    subject_performance.columns = ['Average Marks', 'Number of Assessments']
+                    subject_performance = analytics.query('marks_by_subject', school_id, start_date, end_date)
+                    subject_performance = subject_performance.set_index('subject').round(2)
+                    subject_performance.columns = ['Average Score %', 'Number of Assessments']
                     st.dataframe(subject_performance)
                     
             except Exception as e:
                 st.error(f"Error generating performance analysis: {str(e)}")
-                st.info("Showing basic assessment data instead:")
-                st.dataframe(df_assessments.head(10))
 
         # Original Analytics Charts
-        if not df_attendance.empty:
+        if has_attendance:
             try:
-                att_summary = df_attendance.groupby('status').size().reset_index(name='count')
+                att_summary = analytics.query('attendance_by_status', school_id, start_date, end_date)
                 fig = px.pie(att_summary, names='status', values='count', title='Attendance Breakdown')
                 st.plotly_chart(fig)
             except Exception as e:
                 st.error(f"Error generating attendance chart: {e}")
 
-        if not df_attendance.empty and not df_students.empty:
             st.subheader("😊 Behaviour Analytics")
             try:
-                df_beh = df_attendance.groupby('student_id')['behaviour_score'].mean().reset_index()
-                df_beh = df_beh.merge(df_students[['student_id','name']], on='student_id', how='left')
+                df_beh = analytics.query('behaviour_by_student', school_id, start_date, end_date)
                 
                 if len(df_beh) > 15:
                     col1, col2 = st.columns(2)
                     with col1:
                         st.write("🏆 Top 10 Behaviour Scores")
-                        top_students = df_beh.nlargest(10, 'behaviour_score')
+                        ranking = analytics.query('behaviour_ranking', school_id, start_date, end_date)
+                        top_students = ranking[ranking['top_rank'] <= 10].sort_values('top_rank')
                         fig2a = px.bar(top_students, x='name', y='behaviour_score')
                         st.plotly_chart(fig2a, use_container_width=True)
                     
@@ -654,92 +840,174 @@ elif menu == "Analytics":
             except Exception as e:
                 st.error(f"Error generating behaviour analytics: {e}")
 
-        if not df_assessments.empty:
+        if has_assessments:
             st.subheader("📝 Assessment Analytics")
             try:
-                df_ass_avg = df_assessments.groupby('subject')['marks'].mean().reset_index()
-                fig3 = px.bar(df_ass_avg, x='subject', y='marks', title='Average Marks per Subject')
+                df_ass_avg = analytics.query('marks_by_subject', school_id, start_date, end_date)
+                fig3 = px.bar(df_ass_avg, x='subject', y='avg_percentage', title='Average Score % per Subject')
                 st.plotly_chart(fig3)
             except Exception as e:
                 st.error(f"Error generating assessment analytics: {e}")
 
+            # Distribution of scores per group, from the stored percentages
+            st.subheader("📐 Score Statistics")
+            try:
+                grouping = st.selectbox("Group scores by", list(GROUPINGS),
+                                        format_func=lambda g: g.replace('_', ' & ').title())
+                scores = school_scores(conn, school_id, start_date, end_date)
+                stats = score_stats(scores, GROUPINGS[grouping]).round(1)
+                st.dataframe(stats, hide_index=True)
+                if not scores.empty:
+                    by = GROUPINGS[grouping]
+                    fig_scores = px.box(scores, x=by[-1], y='percentage', color=by[0] if len(by) > 1 else None,
+                                        title='Score Distribution', labels={'percentage': 'Score %'})
+                    st.plotly_chart(fig_scores)
+                    standings = standardize(scores, by)
+                    standings = standings.groupby(['student_id', 'name'], observed=True)[['z_score', 'percentile']].mean()
+                    standings = standings.sort_values('z_score', ascending=False).round(2).reset_index()
+                    standings.columns = ['Student ID', 'Student', 'Mean Z-Score', 'Mean Percentile']
+                    st.write("Students by mean z-score within their groups")
+                    st.dataframe(standings, hide_index=True)
+            except Exception as e:
+                st.error(f"Error generating score statistics: {e}")
+
+        # Cross-school comparison over the same period
+        st.subheader("🏫 School Comparison")
+        try:
+            comparison = analytics.school_comparison(start_date, end_date)
+            comparison = comparison[['school', 'students', 'attendance_rate', 'avg_behaviour', 'avg_percentage', 'assessments']].round(2)
+            comparison.columns = ['School', 'Students', 'Attendance Rate %', 'Avg Behaviour', 'Avg Score %', 'Assessments']
+            st.dataframe(comparison)
+            if len(comparison) > 1:
+                fig_compare = px.bar(comparison, x='School', y='Avg Score %', color='Attendance Rate %',
+                                     title='Average Score and Attendance by School')
+                st.plotly_chart(fig_compare)
+        except Exception as e:
+            st.error(f"Error generating school comparison: {e}")
+        st.caption(f"Analytics engine: {analytics.name}")
+
 # ===================== REPORTS (COMPLETELY FIXED) =====================
 elif menu == "Reports":
     st.header("📑 Comprehensive Reports")
     
-    df_schools = pd.read_sql_query("SELECT * FROM schools", conn)
+    df_schools = read_frame("SELECT * FROM schools", conn)
     if not df_schools.empty:
         school_select = st.selectbox("Select School", df_schools['name'])
         school_id = df_schools[df_schools['name'] == school_select]['school_id'].values[0]
+        prefetch_school(school_id)
+        conn = reads.connection(school_id)
+        cursor = conn.cursor()
+        show_replica_status(school_id)
         
-        report_type = st.selectbox("Select Report Type", [
-            "Student Performance Report",
-            "Teacher Performance Report", 
-            "Attendance Summary Report",
-            "Behaviour Analysis Report",
-            "Comprehensive School Report"
-        ])
+        report_type = st.selectbox("Select Report Type", REPORT_TYPES)
         
-        col1, col2 = st.columns(2)
-        with col1:
-            report_start = st.date_input("Report Start Date")
-        with col2:
-            report_end = st.date_input("Report End Date")
+        # Standard periods are precomputed every night; custom ranges are built on demand
+        period = st.selectbox("Report Period", list(PERIODS) + ['custom'],
+                              format_func=lambda p: PERIODS.get(p, "Custom range"))
+        if period == 'custom':
+            col1, col2 = st.columns(2)
+            with col1:
+                report_start = st.date_input("Report Start Date")
+            with col2:
+                report_end = st.date_input("Report End Date")
+        else:
+            report_start, report_end = period_bounds(period)
+            st.caption(f"{report_start} to {report_end}")
         
+        # Keep the report on screen across reruns so chart controls stay usable
+        report_key = (int(school_id), report_type, str(report_start), str(report_end))
         if st.button("Generate Report"):
+            st.session_state['active_report'] = report_key
+        
+        if st.session_state.get('active_report') == report_key:
+            artifact = (load_artifact(db.connection(school_id), school_id, report_type, report_start, report_end)
+                        if period != 'custom' else None)
+            if artifact is not None:
+                report, report_meta = artifact
+                col1, col2 = st.columns([4, 1])
+                with col1:
+                    st.caption(f"⚡ Precomputed {report_meta['computed_at'].replace('T', ' ')}")
+                with col2:
+                    if st.button("🔄 Recompute"):
+                        compute_artifact(db.connection(school_id), analytics_backend(reads), school_id, report_type,
+                                         report_start, report_end)
+                        st.rerun()
+            else:
+                with st.spinner("Building report..."):
+                    report = cached_report(conn, analytics_backend(reads), school_id, report_type,
+                                           report_start, report_end)
             
             # STUDENT PERFORMANCE REPORT - FIXED
             if report_type == "Student Performance Report":
-                df_students = pd.read_sql_query("SELECT * FROM students WHERE school_id=?", conn, params=(school_id,))
-                df_assessments = pd.read_sql_query(
-                    "SELECT * FROM assessments WHERE school_id=? AND date BETWEEN ? AND ?",
-                    conn, params=(school_id, str(report_start), str(report_end))
-                )
+                performance_report = report['performance']
                 
-                if not df_assessments.empty and not df_students.empty:
+                if not performance_report.empty:
                     try:
-                        # Safe merge with error handling
-                        performance_report = df_assessments.merge(
-                            df_students[['student_id', 'name', 'grade']], 
-                            on='student_id', 
-                            how='left'
-                        )
-                        
                         st.subheader("📊 Student Performance Report")
-                        st.dataframe(performance_report)
+                        performance_report = performance_report[['date', 'name', 'grade', 'subject', 'marks', 'total',
+                                                                 'percentage', 'z_score', 'percentile']]
+                        performance_report = performance_report.round({'percentage': 1, 'z_score': 2, 'percentile': 1})
+                        performance_report.columns = ['Date', 'Student', 'Grade', 'Subject', 'Marks', 'Total',
+                                                      'Score %', 'Z-Score (Subject)', 'Percentile (Subject)']
+                        st.dataframe(performance_report, hide_index=True)
                         
-                        # SAFE GRADE SUMMARY - No KeyError
-                        if 'grade' in performance_report.columns and performance_report['grade'].notna().any():
-                            summary = performance_report.groupby('grade').agg({
-                                'marks': ['mean', 'max', 'min', 'count'],
-                                'student_id': 'nunique'
-                            }).round(2)
-                            summary.columns = ['Average Marks', 'Highest Marks', 'Lowest Marks', 'Total Assessments', 'Unique Students']
+                        st.subheader("📐 Score Statistics by Grade and Subject")
+                        st.dataframe(report['score_stats'].round(1), hide_index=True)
+                        
+                        summary = report['marks_by_grade']
+                        if not summary.empty:
+                            summary = summary.set_index('grade').round(2)
+                            summary.columns = ['Average Score %', 'Highest Score %', 'Lowest Score %', 'Total Assessments', 'Unique Students']
                             st.subheader("🎯 Performance Summary by Grade")
                             st.dataframe(summary)
                             
                             # Visualize grade performance
                             fig_grade = px.bar(summary.reset_index(), 
-                                              x='grade', y='Average Marks',
-                                              title='Average Marks by Grade',
-                                              color='Average Marks')
+                                              x='grade', y='Average Score %',
+                                              title='Average Score by Grade',
+                                              color='Average Score %')
                             st.plotly_chart(fig_grade)
                         else:
                             st.info("No grade data available for summary.")
                             
                             # Show overall performance instead
+                            overall = report['assessment_overview'].iloc[0]
                             overall_stats = {
-                                'Metric': ['Average Marks', 'Highest Marks', 'Lowest Marks', 'Total Assessments', 'Students Assessed'],
+                                'Metric': ['Average Score %', 'Highest Score %', 'Lowest Score %', 'Total Assessments', 'Students Assessed'],
                                 'Value': [
-                                    f"{performance_report['marks'].mean():.1f}",
-                                    f"{performance_report['marks'].max()}",
-                                    f"{performance_report['marks'].min()}",
-                                    f"{len(performance_report)}",
-                                    f"{performance_report['student_id'].nunique()}"
+                                    f"{overall['avg_percentage']:.1f}",
+                                    f"{overall['max_percentage']:.1f}",
+                                    f"{overall['min_percentage']:.1f}",
+                                    f"{overall['records']}",
+                                    f"{overall['students']}"
                                 ]
                             }
                             st.subheader("📈 Overall Performance Summary")
                             st.dataframe(pd.DataFrame(overall_stats))
+                        
+                        # Class rankings for the term the report period ends in
+                        ranking_term = term_label(report_end)
+                        st.subheader(f"🏅 Class Rankings ({ranking_term})")
+                        rank_conn = db.connection(school_id)
+                        school_board = rank_board(rank_conn, school_id, ranking_term, 'school')
+                        if not school_board.empty:
+                            grades = sorted(school_board['grade'].dropna().unique())
+                            col1, col2 = st.columns(2)
+                            with col1:
+                                rank_grade = st.selectbox("Grade", grades, key='rank_grade') if grades else None
+                            with col2:
+                                subjects = [''] + sorted(
+                                    read_frame("SELECT DISTINCT subject FROM assessments WHERE school_id=? AND subject IS NOT NULL",
+                                                      conn, params=(school_id,))['subject'])
+                                rank_subject = st.selectbox("Subject", subjects, key='rank_subject',
+                                                            format_func=lambda s: s or "All subjects")
+                            board = rank_board(rank_conn, school_id, ranking_term,
+                                               'subject' if rank_subject else 'grade', rank_grade, rank_subject)
+                            board = board[['rank', 'name', 'score', 'percentile', 'cohort']].round(1)
+                            board.columns = ['Position', 'Student', 'Score %', 'Percentile', 'Out Of']
+                            st.dataframe(board, hide_index=True)
+                        else:
+                            st.info(f"No assessments recorded in {ranking_term}.")
                             
                     except Exception as e:
                         st.error(f"Error generating performance report: {e}")
@@ -748,87 +1016,37 @@ elif menu == "Reports":
             
             # TEACHER PERFORMANCE REPORT - FIXED
             elif report_type == "Teacher Performance Report":
-                df_teachers = pd.read_sql_query("SELECT * FROM teachers WHERE school_id=?", conn, params=(school_id,))
-                df_assignments = pd.read_sql_query("SELECT * FROM teacher_assignments WHERE school_id=?", conn, params=(school_id,))
-                df_students = pd.read_sql_query("SELECT * FROM students WHERE school_id=?", conn, params=(school_id,))
-                df_assessments = pd.read_sql_query(
-                    "SELECT * FROM assessments WHERE school_id=? AND date BETWEEN ? AND ?",
-                    conn, params=(school_id, str(report_start), str(report_end))
-                )
-                
                 st.subheader("👨‍🏫 Teacher Performance Report")
                 
-                if not df_teachers.empty:
+                if not report['teachers'].empty:
                     # Teacher basic info
                     st.write("### Teaching Staff")
-                    st.dataframe(df_teachers[['name', 'subject', 'qualification', 'join_date', 'status']])
+                    paged_table(conn, 'teachers', key='report_teachers', where={'school_id': school_id})
                     
                     # Teacher assignments
-                    if not df_assignments.empty:
+                    if not report['workload'].empty:
                         st.write("### Class Assignments")
-                        st.dataframe(df_assignments)
+                        paged_table(conn, 'teacher_assignments', key='report_assignments', where={'school_id': school_id})
                         
                         # Teacher workload summary
-                        workload = df_assignments.groupby('teacher_id').agg({
-                            'class_grade': 'count',
-                            'subject': lambda x: ', '.join(x.unique())
-                        }).reset_index()
-                        
-                        # Merge with teacher names
-                        workload = workload.merge(df_teachers[['teacher_id', 'name']], on='teacher_id')
-                        workload.columns = ['Teacher ID', 'Number of Classes', 'Subjects', 'Teacher Name']
                         st.write("### Teacher Workload Summary")
-                        st.dataframe(workload[['Teacher Name', 'Number of Classes', 'Subjects']])
+                        st.dataframe(report['workload'][['Teacher Name', 'Number of Classes', 'Subjects']])
                     else:
                         st.info("No class assignments found.")
                         
                     # Teacher performance metrics (if assessments exist)
-                    if not df_assessments.empty and not df_students.empty:
-                        try:
-                            # Get classes taught by each teacher
-                            teacher_classes = df_assignments.groupby('teacher_id')['class_grade'].unique().reset_index()
-                            
-                            performance_data = []
-                            for _, teacher in df_teachers.iterrows():
-                                teacher_id = teacher['teacher_id']
-                                teacher_classes_list = teacher_classes[teacher_classes['teacher_id'] == teacher_id]['class_grade'].iloc[0] if not teacher_classes[teacher_classes['teacher_id'] == teacher_id].empty else []
-                                
-                                if len(teacher_classes_list) > 0:
-                                    # Get students in teacher's classes
-                                    teacher_students = df_students[df_students['grade'].isin(teacher_classes_list)]
-                                    if not teacher_students.empty:
-                                        # Get assessments for these students
-                                        teacher_assessments = df_assessments[df_assessments['student_id'].isin(teacher_students['student_id'])]
-                                        if not teacher_assessments.empty:
-                                            avg_marks = teacher_assessments['marks'].mean()
-                                            performance_data.append({
-                                                'Teacher': teacher['name'],
-                                                'Subject': teacher['subject'],
-                                                'Classes': ', '.join(teacher_classes_list),
-                                                'Average Student Marks': f"{avg_marks:.1f}%",
-                                                'Students Assessed': teacher_assessments['student_id'].nunique()
-                                            })
-                            
-                            if performance_data:
-                                st.write("### Teacher Performance Metrics")
-                                st.dataframe(pd.DataFrame(performance_data))
-                                
-                        except Exception as e:
-                            st.info("Could not calculate teacher performance metrics.")
+                    if not report['teacher_performance'].empty:
+                        st.write("### Teacher Performance Metrics")
+                        st.dataframe(report['teacher_performance'])
                 else:
                     st.info("No teacher data available.")
             
             # ATTENDANCE SUMMARY REPORT - FIXED
             elif report_type == "Attendance Summary Report":
-                df_attendance = pd.read_sql_query(
-                    "SELECT * FROM attendance WHERE school_id=? AND date BETWEEN ? AND ?",
-                    conn, params=(school_id, str(report_start), str(report_end))
-                )
-                df_students = pd.read_sql_query("SELECT * FROM students WHERE school_id=?", conn, params=(school_id,))
+                attendance_summary = report['attendance_by_status']
                 
-                if not df_attendance.empty:
+                if not attendance_summary.empty:
                     # Basic attendance summary
-                    attendance_summary = df_attendance.groupby('status').size().reset_index(name='count')
                     total_records = attendance_summary['count'].sum()
                     attendance_summary['percentage'] = (attendance_summary['count'] / total_records * 100).round(1)
                     
@@ -837,60 +1055,45 @@ elif menu == "Reports":
                     
                     # Attendance trend
                     try:
-                        df_attendance['date'] = pd.to_datetime(df_attendance['date'])
-                        daily_attendance = df_attendance.groupby('date')['status'].apply(
-                            lambda x: (x == 'Present').mean() * 100
-                        ).reset_index()
+                        daily_attendance = report['attendance_by_day']
+                        daily_attendance['date'] = pd.to_datetime(daily_attendance['date'])
                         daily_attendance.columns = ['Date', 'Attendance Rate']
                         
-                        fig_attendance = px.line(daily_attendance, x='Date', y='Attendance Rate', 
-                                               title='Daily Attendance Trend', markers=True)
-                        st.plotly_chart(fig_attendance)
+                        trend_chart(daily_attendance, x='Date', y='Attendance Rate',
+                                    title='Daily Attendance Trend', key='daily_attendance_trend',
+                                    markers=True)
                     except Exception as e:
                         st.error(f"Error generating attendance trend: {e}")
                     
                     # Attendance by grade (if student data available)
-                    if not df_students.empty:
-                        try:
-                            attendance_with_grades = df_attendance.merge(
-                                df_students[['student_id', 'grade']], 
-                                on='student_id', 
-                                how='left'
-                            )
+                    try:
+                        grade_attendance = report['attendance_by_grade']
+                        if not grade_attendance.empty:
+                            grade_attendance = grade_attendance.set_index('grade')
+                            grade_attendance.columns = ['Attendance Rate %', 'Number of Students']
+                            grade_attendance['Attendance Rate %'] = grade_attendance['Attendance Rate %'].round(1)
                             
-                            if 'grade' in attendance_with_grades.columns and attendance_with_grades['grade'].notna().any():
-                                grade_attendance = attendance_with_grades.groupby('grade').agg({
-                                    'status': lambda x: (x == 'Present').mean() * 100,
-                                    'student_id': 'nunique'
-                                }).round(2)
-                                grade_attendance.columns = ['Attendance Rate %', 'Number of Students']
-                                grade_attendance['Attendance Rate %'] = grade_attendance['Attendance Rate %'].round(1)
-                                
-                                st.subheader("📊 Attendance by Grade")
-                                st.dataframe(grade_attendance)
-                        except Exception as e:
-                            st.info("Could not generate grade-wise attendance breakdown.")
+                            st.subheader("📊 Attendance by Grade")
+                            st.dataframe(grade_attendance)
+                    except Exception as e:
+                        st.info("Could not generate grade-wise attendance breakdown.")
                             
                 else:
                     st.info("No attendance data available for the selected period.")
             
             # BEHAVIOUR ANALYSIS REPORT - FIXED
             elif report_type == "Behaviour Analysis Report":
-                df_attendance = pd.read_sql_query(
-                    "SELECT * FROM attendance WHERE school_id=? AND date BETWEEN ? AND ?",
-                    conn, params=(school_id, str(report_start), str(report_end))
-                )
-                df_students = pd.read_sql_query("SELECT * FROM students WHERE school_id=?", conn, params=(school_id,))
+                overview = report['attendance_overview'].iloc[0]
                 
-                if not df_attendance.empty:
+                if overview['records'] > 0:
                     # Behaviour score summary
                     behaviour_stats = {
                         'Metric': ['Average Behaviour Score', 'Highest Score', 'Lowest Score', 'Total Records'],
                         'Value': [
-                            f"{df_attendance['behaviour_score'].mean():.1f}/5",
-                            f"{df_attendance['behaviour_score'].max()}/5",
-                            f"{df_attendance['behaviour_score'].min()}/5",
-                            f"{len(df_attendance)}"
+                            f"{overview['avg_behaviour']:.1f}/5",
+                            f"{overview['max_behaviour']}/5",
+                            f"{overview['min_behaviour']}/5",
+                            f"{overview['records']}"
                         ]
                     }
                     
@@ -898,7 +1101,7 @@ elif menu == "Reports":
                     st.dataframe(pd.DataFrame(behaviour_stats))
                     
                     # Behaviour score distribution
-                    score_distribution = df_attendance['behaviour_score'].value_counts().sort_index().reset_index()
+                    score_distribution = report['behaviour_distribution']
                     score_distribution.columns = ['Behaviour Score', 'Count']
                     
                     fig_behaviour = px.bar(score_distribution, x='Behaviour Score', y='Count',
@@ -906,45 +1109,35 @@ elif menu == "Reports":
                     st.plotly_chart(fig_behaviour)
                     
                     # Top and bottom performers
-                    if not df_students.empty:
-                        try:
-                            student_behaviour = df_attendance.groupby('student_id')['behaviour_score'].mean().reset_index()
-                            student_behaviour = student_behaviour.merge(
-                                df_students[['student_id', 'name', 'grade']], 
-                                on='student_id', 
-                                how='left'
-                            )
-                            
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                st.write("🏆 Top 10 Behaviour Scores")
-                                top_performers = student_behaviour.nlargest(10, 'behaviour_score')[['name', 'grade', 'behaviour_score']]
-                                st.dataframe(top_performers.round(2))
+                    try:
+                        ranking = report['behaviour_ranking']
+                        
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.write("🏆 Top 10 Behaviour Scores")
+                            top_performers = ranking[ranking['top_rank'] <= 10].sort_values(['top_rank', 'name'])
+                            top_performers = top_performers[['top_rank', 'name', 'grade', 'behaviour_score']]
+                            top_performers.columns = ['Rank', 'name', 'grade', 'behaviour_score']
+                            st.dataframe(top_performers.round(2), hide_index=True)
+                        
+                        with col2:
+                            st.write("📉 Bottom 10 Behaviour Scores")
+                            bottom_performers = ranking[ranking['bottom_rank'] <= 10].sort_values(['bottom_rank', 'name'])
+                            bottom_performers = bottom_performers[['bottom_rank', 'name', 'grade', 'behaviour_score']]
+                            bottom_performers.columns = ['Rank', 'name', 'grade', 'behaviour_score']
+                            st.dataframe(bottom_performers.round(2), hide_index=True)
                             
-                            with col2:
-                                st.write("📉 Bottom 10 Behaviour Scores")
-                                bottom_performers = student_behaviour.nsmallest(10, 'behaviour_score')[['name', 'grade', 'behaviour_score']]
-                                st.dataframe(bottom_performers.round(2))
-                                
-                        except Exception as e:
-                            st.info("Could not generate student behaviour rankings.")
+                    except Exception as e:
+                        st.info("Could not generate student behaviour rankings.")
                             
                 else:
                     st.info("No attendance/behaviour data available for the selected period.")
             
             # COMPREHENSIVE SCHOOL REPORT - FIXED
             elif report_type == "Comprehensive School Report":
-                # Gather all data
-                df_students = pd.read_sql_query("SELECT * FROM students WHERE school_id=?", conn, params=(school_id,))
-                df_teachers = pd.read_sql_query("SELECT * FROM teachers WHERE school_id=?", conn, params=(school_id,))
-                df_attendance = pd.read_sql_query(
-                    "SELECT * FROM attendance WHERE school_id=? AND date BETWEEN ? AND ?",
-                    conn, params=(school_id, str(report_start), str(report_end))
-                )
-                df_assessments = pd.read_sql_query(
-                    "SELECT * FROM assessments WHERE school_id=? AND date BETWEEN ? AND ?",
-                    conn, params=(school_id, str(report_start), str(report_end))
-                )
+                counts = report['counts'].iloc[0]
+                overview = report['attendance_overview'].iloc[0]
+                assessment_overview = report['assessment_overview'].iloc[0]
                 
                 st.subheader("🏫 Comprehensive School Report")
                 st.write(f"**School:** {school_select}")
@@ -953,66 +1146,112 @@ elif menu == "Reports":
                 # Key Metrics
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
-                    st.metric("Total Students", len(df_students))
+                    st.metric("Total Students", counts['students'])
                 with col2:
-                    st.metric("Teaching Staff", len(df_teachers))
+                    st.metric("Teaching Staff", counts['teachers'])
                 with col3:
-                    attendance_rate = (len(df_attendance[df_attendance['status'] == 'Present']) / len(df_attendance) * 100) if len(df_attendance) > 0 else 0
+                    attendance_rate = overview['attendance_rate'] if overview['records'] > 0 else 0
                     st.metric("Attendance Rate", f"{attendance_rate:.1f}%")
                 with col4:
-                    avg_marks = df_assessments['marks'].mean() if not df_assessments.empty else 0
-                    st.metric("Average Marks", f"{avg_marks:.1f}%")
+                    avg_score = assessment_overview['avg_percentage'] if assessment_overview['records'] > 0 else 0
+                    st.metric("Average Score", f"{avg_score:.1f}%")
                 
                 # Detailed Sections
                 st.subheader("📋 Student Demographics")
-                if not df_students.empty:
-                    grade_distribution = df_students['grade'].value_counts().reset_index()
+                if counts['students']:
+                    grade_distribution = report['grade_distribution']
                     grade_distribution.columns = ['Grade', 'Number of Students']
                     st.dataframe(grade_distribution)
                 
                 st.subheader("📊 Academic Performance")
-                if not df_assessments.empty:
-                    subject_performance = df_assessments.groupby('subject')['marks'].agg(['mean', 'count']).round(2)
-                    subject_performance.columns = ['Average Marks', 'Number of Assessments']
+                if assessment_overview['records'] > 0:
+                    subject_performance = report['marks_by_subject']
+                    subject_performance = subject_performance.set_index('subject').round(2)
+                    subject_performance.columns = ['Average Score %', 'Number of Assessments']
                     st.dataframe(subject_performance)
                 
                 st.subheader("✅ Attendance Overview")
-                if not df_attendance.empty:
-                    attendance_breakdown = df_attendance['status'].value_counts().reset_index()
+                if overview['records'] > 0:
+                    attendance_breakdown = report['attendance_by_status']
                     attendance_breakdown.columns = ['Status', 'Count']
                     st.dataframe(attendance_breakdown)
                 
                 st.subheader("👨‍🏫 Teaching Staff Overview")
-                if not df_teachers.empty:
-                    teacher_summary = df_teachers[['name', 'subject', 'qualification', 'status']]
-                    st.dataframe(teacher_summary)
+                if counts['teachers']:
+                    st.dataframe(report['teacher_summary'])
                     
+# ===================== REPORT CARDS =====================
+elif menu == "Report Cards":
+    st.header("🎓 Bulk Report Cards")
+    
+    df_schools = read_frame("SELECT * FROM schools", conn)
+    if not df_schools.empty:
+        school_select = st.selectbox("Select School", df_schools['name'])
+        school_id = df_schools[df_schools['name'] == school_select]['school_id'].values[0]
+        prefetch_school(school_id)
+        conn = db.connection(school_id)
+        cursor = conn.cursor()
+        
+        grades = read_frame(
+            "SELECT DISTINCT grade FROM students WHERE school_id=? ORDER BY grade", conn, params=(school_id,)
+        )['grade'].dropna().tolist()
+        grade_select = st.selectbox("Grade/Class", ["All Grades"] + grades)
+        
+        term_start, term_end = term_bounds(current_term())
+        col1, col2 = st.columns(2)
+        with col1:
+            card_start = st.date_input("Period Start", term_start)
+        with col2:
+            card_end = st.date_input("Period End", term_end)
+        
+        if st.button("🖨️ Generate Report Cards"):
+            with st.spinner("Rendering report cards..."):
+                zip_data, card_count = report_cards_zip(
+                    conn, school_id, card_start, card_end,
+                    grade=None if grade_select == "All Grades" else grade_select
+                )
+            if card_count:
+                st.success(f"✅ {card_count} report cards generated!")
+                st.download_button(
+                    label="⬇️ Download Report Cards (zip)",
+                    data=zip_data,
+                    file_name=f"{school_select}_report_cards_{card_start}_{card_end}.zip",
+                    mime="application/zip"
+                )
+            else:
+                st.info("No students found for this selection.")
+    else:
+        st.warning("No schools available. Please add a school first!")
+
 # ===================== TEACHER PORTAL (NEW) =====================
 elif menu == "Teacher Portal":
     st.header("👨‍🏫 Teacher Portal")
     
-    df_teachers = pd.read_sql_query("SELECT name FROM teachers", conn)
+    df_teachers = db.fan_out("SELECT teacher_id, school_id, name FROM teachers")
     if not df_teachers.empty:
         teacher_name = st.selectbox("Select Your Name", df_teachers['name'].tolist())
         
         if teacher_name:
             st.success(f"Welcome, {teacher_name}!")
             
-            teacher_info = pd.read_sql_query("SELECT * FROM teachers WHERE name=?", conn, params=(teacher_name,))
+            teacher_info = df_teachers[df_teachers['name'] == teacher_name]
             teacher_id = teacher_info['teacher_id'].iloc[0]
             school_id = teacher_info['school_id'].iloc[0]
+            conn = db.connection(school_id)
+            cursor = conn.cursor()
             
-            assignments = pd.read_sql_query("SELECT * FROM teacher_assignments WHERE teacher_id=?", conn, params=(teacher_id,))
+            assignments = read_frame("SELECT DISTINCT class_grade FROM teacher_assignments WHERE teacher_id=?",
+                                            conn, params=(teacher_id,))
             
             if not assignments.empty:
                 st.subheader("My Classes")
-                st.dataframe(assignments)
+                paged_table(conn, 'teacher_assignments', key='my_classes', where={'teacher_id': teacher_id})
                 
                 st.subheader("📝 Quick Attendance")
                 selected_class = st.selectbox("Select Class", assignments['class_grade'].unique())
                 
                 if selected_class:
-                    df_students = pd.read_sql_query(
+                    df_students = read_frame(
                         "SELECT * FROM students WHERE school_id=? AND grade=?", 
                         conn, params=(school_id, selected_class)
                     )
@@ -1020,21 +1259,33 @@ elif menu == "Teacher Portal":
                     if not df_students.empty:
                         attendance_date = st.date_input("Attendance Date")
                         with st.form("quick_attendance"):
+                            quick_attendance = []
                             for idx, row in df_students.iterrows():
                                 status = st.selectbox(
                                     f"{row['name']}",
                                     ["Present", "Absent", "Late"],
                                     key=f"att_{row['student_id']}"
                                 )
+                                quick_attendance.append({'student_id': row['student_id'], 'status': status})
                             
                             if st.form_submit_button("Save Attendance"):
-                                for idx, row in df_students.iterrows():
-                                    cursor.execute('''
+                                def save_quick_attendance(writer_conn):
+                                    writer_cursor = writer_conn.cursor()
+                                    writer_cursor.executemany('''
                                         INSERT INTO attendance (student_id, school_id, date, status, behaviour_score)
                                         VALUES (?, ?, ?, ?, ?)
-                                    ''', (row['student_id'], school_id, str(attendance_date), status, 3))
-                                conn.commit()
-                                st.success("Attendance saved for all students!")
+                                    ''', [(data['student_id'], school_id, str(attendance_date), data['status'], 3)
+                                          for data in quick_attendance])
+                                    queue_attendance_notices(writer_cursor, school_id, attendance_date, quick_attendance)
+                                    if BITMAPS_ENABLED:
+                                        sync_bitmaps(writer_conn, school_id)
+                                
+                                try:
+                                    writer_for(conn).submit(save_quick_attendance).result()
+                                except WriterBusy as e:
+                                    st.error(str(e))
+                                else:
+                                    st.success("Attendance saved for all students!")
             else:
                 st.info("No class assignments found.")
     else:
@@ -1044,37 +1295,89 @@ elif menu == "Teacher Portal":
 elif menu == "Parent Portal":
     st.header("👨‍👩‍👧‍👦 Parent Portal")
     
-    df_students = pd.read_sql_query("SELECT name FROM students", conn)
+    df_students = db.fan_out("SELECT student_id, school_id, name FROM students")
     if not df_students.empty:
         student_name = st.selectbox("Select Student", df_students['name'].tolist())
         
         if student_name:
-            student_id = pd.read_sql_query("SELECT student_id FROM students WHERE name=?", conn, params=(student_name,))['student_id'].iloc[0]
+            student = df_students[df_students['name'] == student_name].iloc[0]
+            student_id = student['student_id']
+            conn = db.connection(student['school_id'])
+            
+            summary = student_summary(conn, student_id)
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                rate = summary['attendance_rate']
+                st.metric("Overall Attendance Rate", f"{rate:.1f}%" if rate is not None else "N/A")
+            with col2:
+                behaviour = summary['avg_behaviour']
+                st.metric("Avg Behaviour", f"{behaviour:.1f}/5" if behaviour is not None else "N/A")
+            with col3:
+                score = summary['avg_percentage']
+                st.metric("Average Score", f"{score:.1f}%" if score is not None else "N/A")
+            
+            ranks = student_ranks(conn, student['school_id'], student_id, summary['term'])
+            if not ranks.empty:
+                st.subheader(f"🏅 Class Position ({summary['term']})")
+                overall = ranks[ranks['scope'] != 'subject'].set_index('scope')
+                col1, col2 = st.columns(2)
+                for column, scope, label in [(col1, 'grade', 'Position in Grade'), (col2, 'school', 'Position in School')]:
+                    if scope in overall.index:
+                        row = overall.loc[scope]
+                        column.metric(label, f"{row['rank']} of {row['cohort']}",
+                                      f"percentile {row['percentile']:.0f}", delta_color='off')
+                subject_ranks = ranks[ranks['scope'] == 'subject'][['subject', 'score', 'rank', 'cohort', 'percentile']].round(1)
+                subject_ranks.columns = ['Subject', 'Score %', 'Position', 'Out Of', 'Percentile']
+                st.dataframe(subject_ranks, hide_index=True)
             
             st.subheader("Academic Performance")
-            df_grades = pd.read_sql_query("SELECT * FROM assessments WHERE student_id=?", conn, params=(student_id,))
-            if not df_grades.empty:
-                st.dataframe(df_grades)
+            if summary['assessment_count']:
+                st.write(f"### Term {summary['term']}")
+                if not summary['recent_assessments'].empty:
+                    st.dataframe(summary['recent_assessments'].drop(columns=['assessment_id']))
+                else:
+                    st.info("No assessments recorded this term.")
                 
-                fig_grades = px.line(df_grades, x='date', y='marks', color='subject', 
-                                    title='Academic Performance Trend')
-                st.plotly_chart(fig_grades)
+                trend_chart(performance_series(conn, student_id), x='date', y='percentage', color='subject',
+                            title='Academic Performance Trend', key='parent_performance_trend',
+                            labels={'percentage': 'Score %'})
             else:
                 st.info("No assessment data available for this student.")
             
             st.subheader("Attendance Record")
-            df_attendance = pd.read_sql_query("SELECT * FROM attendance WHERE student_id=?", conn, params=(student_id,))
-            if not df_attendance.empty:
-                st.dataframe(df_attendance[['date', 'status', 'behaviour_score']])
-                
-                # Attendance summary
-                present_count = (df_attendance['status'] == 'Present').sum()
-                total_count = len(df_attendance)
-                attendance_percentage = (present_count / total_count * 100) if total_count > 0 else 0
-                
-                st.metric("Overall Attendance Rate", f"{attendance_percentage:.1f}%")
+            if summary['attendance_days']:
+                st.write(f"### Term {summary['term']}")
+                if not summary['recent_attendance'].empty:
+                    st.dataframe(summary['recent_attendance'][['date', 'status', 'behaviour_score']])
+                else:
+                    st.info("No attendance recorded this term.")
+                st.write(f"Present {summary['present_days']}, late {summary['late_days']}, "
+                         f"absent {summary['absent_days']} of {summary['attendance_days']} days recorded.")
             else:
                 st.info("No attendance data available for this student.")
+            
+            # Older history, one keyset page at a time
+            st.subheader("📜 Earlier History")
+            history_table = st.radio("Show", ["attendance", "assessments"], horizontal=True,
+                                     format_func=str.title)
+            pages_key = f"history_{student_id}_{history_table}"
+            cursors = st.session_state.setdefault(pages_key, [summary['older_cursor']])
+            page, next_cursor = history_page(conn, history_table, student_id, before=cursors[-1])
+            if not page.empty:
+                st.dataframe(page.drop(columns=[HISTORY_TABLES[history_table][0]]))
+            else:
+                st.info("No earlier records.")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                if len(cursors) > 1 and st.button("⬅️ Newer"):
+                    cursors.pop()
+                    st.rerun()
+            with col2:
+                if next_cursor and st.button("Older ➡️"):
+                    cursors.append(next_cursor)
+                    st.rerun()
     else:
         st.warning("No students available. Please add students first.")
 
@@ -1082,72 +1385,36 @@ elif menu == "Parent Portal":
 elif menu == "Export Data":
     st.header("📥 Export Data")
     
-    df_schools = pd.read_sql_query("SELECT * FROM schools", conn)
+    df_schools = read_frame("SELECT * FROM schools", conn)
     if not df_schools.empty:
         school_select = st.selectbox("Select School to Export Data From", df_schools['name'])
         school_id = df_schools[df_schools['name'] == school_select]['school_id'].values[0]
+        prefetch_school(school_id)
+        conn = reads.connection(school_id)
+        cursor = conn.cursor()
+        show_replica_status(school_id)
         
-        df_students = pd.read_sql_query("SELECT * FROM students WHERE school_id=?", conn, params=(school_id,))
-        df_attendance = pd.read_sql_query("SELECT * FROM attendance WHERE school_id=?", conn, params=(school_id,))
-        df_assessments = pd.read_sql_query("SELECT * FROM assessments WHERE school_id=?", conn, params=(school_id,))
-        df_teachers = pd.read_sql_query("SELECT * FROM teachers WHERE school_id=?", conn, params=(school_id,))
-        df_assignments = pd.read_sql_query("SELECT * FROM teacher_assignments WHERE school_id=?", conn, params=(school_id,))
+        # Counts only; the full tables are read when the workbook is generated
+        record_counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE school_id=?", (school_id,)).fetchone()[0]
+            for table in ['students', 'teachers', 'attendance', 'assessments']
+        }
 
         st.write(f"### 📊 Data Summary for {school_select}")
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Students", len(df_students))
+            st.metric("Students", record_counts['students'])
         with col2:
-            st.metric("Teachers", len(df_teachers))
+            st.metric("Teachers", record_counts['teachers'])
         with col3:
-            st.metric("Attendance Records", len(df_attendance))
+            st.metric("Attendance Records", record_counts['attendance'])
         with col4:
-            st.metric("Assessment Records", len(df_assessments))
+            st.metric("Assessment Records", record_counts['assessments'])
 
         if st.button("📁 Generate Complete Excel Report"):
             try:
                 excel_file = f"{school_select}_Complete_Report.xlsx"
-                
-                with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
-                    # All data sheets
-                    df_students.to_excel(writer, sheet_name='Students', index=False)
-                    
-                    if not df_attendance.empty:
-                        df_attendance.to_excel(writer, sheet_name='Attendance', index=False)
-                    else:
-                        pd.DataFrame(columns=['attendance_id', 'student_id', 'school_id', 'date', 'status', 'behaviour_score', 'behaviour_comment']).to_excel(writer, sheet_name='Attendance', index=False)
-                    
-                    if not df_assessments.empty:
-                        df_assessments.to_excel(writer, sheet_name='Assessments', index=False)
-                    else:
-                        pd.DataFrame(columns=['assessment_id', 'student_id', 'school_id', 'date', 'subject', 'marks', 'total', 'grade']).to_excel(writer, sheet_name='Assessments', index=False)
-                    
-                    if not df_teachers.empty:
-                        df_teachers.to_excel(writer, sheet_name='Teachers', index=False)
-                    else:
-                        pd.DataFrame(columns=['teacher_id', 'school_id', 'name', 'email', 'phone', 'subject', 'qualification', 'join_date', 'status']).to_excel(writer, sheet_name='Teachers', index=False)
-                    
-                    if not df_assignments.empty:
-                        df_assignments.to_excel(writer, sheet_name='Assignments', index=False)
-                    else:
-                        pd.DataFrame(columns=['assignment_id', 'teacher_id', 'school_id', 'class_grade', 'subject', 'academic_year']).to_excel(writer, sheet_name='Assignments', index=False)
-                    
-                    # Summary sheet
-                    summary_data = {
-                        'Metric': [
-                            'Total Students', 'Total Teachers', 'Total Attendance Records', 
-                            'Total Assessment Records', 'Average Attendance Rate',
-                            'Average Behaviour Score', 'Average Marks'
-                        ],
-                        'Value': [
-                            len(df_students), len(df_teachers), len(df_attendance),
-                            len(df_assessments),
-                            f"{(len(df_attendance[df_attendance['status'] == 'Present']) / len(df_attendance) * 100):.1f}%" if not df_attendance.empty else "N/A",
-                            f"{df_attendance['behaviour_score'].mean():.1f}/5" if not df_attendance.empty else "N/A",
-                            f"{df_assessments['marks'].mean():.1f}%" if not df_assessments.empty else "N/A"
-                        ]
-                    }
-                    pd.DataFrame(summary_data).to_excel(writer, sheet_name='Summary', index=False)
+                export_workbook(conn, school_id, excel_file)
 
                 with open(excel_file, 'rb') as f:
                     excel_data = f.read()
@@ -1164,6 +1431,22 @@ elif menu == "Export Data":
             except Exception as e:
                 st.error(f"Error generating Excel file: {e}")
 
+        # Incremental feed for downstream systems: only what changed since the last pull
+        st.write("### 🔁 Incremental Export")
+        st.caption("Changes (inserts, updates and deletes) recorded after a watermark. "
+                   "Keep the new watermark and use it for the next export.")
+        since = st.number_input("Changes after watermark", min_value=0, value=0, step=1)
+        if st.button("📤 Export Changes"):
+            changes, watermark = export_changes(conn, int(since), school_id)
+            st.metric("Changes", len(changes))
+            st.write(f"New watermark: **{watermark}**")
+            st.download_button(
+                label="⬇️ Download Changes (JSON Lines)",
+                data=to_jsonl(changes),
+                file_name=f"{school_select}_changes_{since}_{watermark}.jsonl",
+                mime="application/x-ndjson"
+            )
+
     else:
         st.warning("No schools available to export data from.")
 
@@ -1178,11 +1461,17 @@ elif menu == "System Admin":
     with col1:
         st.subheader("📊 Database Status")
         try:
-            school_count = pd.read_sql_query("SELECT COUNT(*) as count FROM schools", conn)['count'].iloc[0]
-            teacher_count = pd.read_sql_query("SELECT COUNT(*) as count FROM teachers", conn)['count'].iloc[0]
-            student_count = pd.read_sql_query("SELECT COUNT(*) as count FROM students", conn)['count'].iloc[0]
-            attendance_count = pd.read_sql_query("SELECT COUNT(*) as count FROM attendance", conn)['count'].iloc[0]
-            assessment_count = pd.read_sql_query("SELECT COUNT(*) as count FROM assessments", conn)['count'].iloc[0]
+            school_count = read_frame("SELECT COUNT(*) as count FROM schools", conn)['count'].iloc[0]
+            counts = db.fan_out('''
+                SELECT (SELECT COUNT(*) FROM teachers) AS teachers,
+                       (SELECT COUNT(*) FROM students) AS students,
+                       (SELECT COUNT(*) FROM attendance) AS attendance,
+                       (SELECT COUNT(*) FROM assessments) AS assessments
+            ''').sum()
+            teacher_count = counts['teachers']
+            student_count = counts['students']
+            attendance_count = counts['attendance']
+            assessment_count = counts['assessments']
             
             st.metric("Schools", school_count)
             st.metric("Teachers", teacher_count)
@@ -1195,31 +1484,46 @@ elif menu == "System Admin":
     with col2:
         st.subheader("🔄 Reset Options")
         
+        # Every database holding school data: the main file plus any shards
+        all_conns = [conn] + [c for _, c in db.connections() if c is not conn]
+        
         if st.button("🗑️ Delete All Students", type="secondary"):
-            cursor.execute("DELETE FROM students")
-            cursor.execute("DELETE FROM attendance")
-            cursor.execute("DELETE FROM assessments")
-            conn.commit()
-            st.success("All students and related data deleted!")
-            st.rerun()
+            try:
+                for target in all_conns:
+                    writer_for(target).submit(lambda c: (c.execute("DELETE FROM attendance"),
+                                                         c.execute("DELETE FROM assessments"),
+                                                         c.execute("DELETE FROM students"))).result()
+                    writer_for(target).submit(incremental_vacuum, exclusive=True).result()
+            except WriterBusy as e:
+                st.error(str(e))
+            else:
+                st.success("All students and related data deleted!")
+                st.rerun()
             
         if st.button("👨‍🏫 Delete All Teachers", type="secondary"):
-            cursor.execute("DELETE FROM teachers")
-            cursor.execute("DELETE FROM teacher_assignments")
-            conn.commit()
-            st.success("All teachers and related data deleted!")
-            st.rerun()
+            try:
+                for target in all_conns:
+                    writer_for(target).submit(lambda c: (c.execute("DELETE FROM teacher_assignments"),
+                                                         c.execute("DELETE FROM teachers"))).result()
+                    writer_for(target).submit(incremental_vacuum, exclusive=True).result()
+            except WriterBusy as e:
+                st.error(str(e))
+            else:
+                st.success("All teachers and related data deleted!")
+                st.rerun()
             
         if st.button("🏫 Delete All Schools", type="secondary"):
-            cursor.execute("DELETE FROM schools")
-            cursor.execute("DELETE FROM students")
-            cursor.execute("DELETE FROM attendance")
-            cursor.execute("DELETE FROM assessments")
-            cursor.execute("DELETE FROM teachers")
-            cursor.execute("DELETE FROM teacher_assignments")
-            conn.commit()
-            st.success("All schools and related data deleted!")
-            st.rerun()
+            try:
+                for target in all_conns:
+                    writer_for(target).submit(lambda c: [c.execute(f"DELETE FROM {table}") for table in [
+                        'attendance', 'assessments', 'students', 'teacher_assignments', 'teachers', 'schools'
+                    ]]).result()
+                    writer_for(target).submit(incremental_vacuum, exclusive=True).result()
+            except WriterBusy as e:
+                st.error(str(e))
+            else:
+                st.success("All schools and related data deleted!")
+                st.rerun()
     
     with col3:
         st.subheader("💀 Nuclear Option")
@@ -1229,94 +1533,142 @@ elif menu == "System Admin":
         
         if st.button("💥 Reset Entire System", disabled=not reset_confirmed, type="primary"):
             try:
-                cursor.execute("DROP TABLE IF EXISTS schools")
-                cursor.execute("DROP TABLE IF EXISTS students")
-                cursor.execute("DROP TABLE IF EXISTS attendance")
-                cursor.execute("DROP TABLE IF EXISTS assessments")
-                cursor.execute("DROP TABLE IF EXISTS teachers")
-                cursor.execute("DROP TABLE IF EXISTS teacher_assignments")
-                
-                # Recreate all tables
-                cursor.execute('''
-                CREATE TABLE schools (
-                    school_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE
-                )
-                ''')
-                
-                cursor.execute('''
-                CREATE TABLE students (
-                    student_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    school_id INTEGER,
-                    name TEXT,
-                    age INTEGER,
-                    grade TEXT,
-                    parent_name TEXT,
-                    parent_contact TEXT,
-                    FOREIGN KEY(school_id) REFERENCES schools(school_id)
-                )
-                ''')
-                
-                cursor.execute('''
-                CREATE TABLE attendance (
-                    attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    student_id INTEGER,
-                    school_id INTEGER,
-                    date TEXT,
-                    status TEXT,
-                    behaviour_score INTEGER,
-                    behaviour_comment TEXT,
-                    FOREIGN KEY(student_id) REFERENCES students(student_id),
-                    FOREIGN KEY(school_id) REFERENCES schools(school_id)
-                )
-                ''')
-                
-                cursor.execute('''
-                CREATE TABLE assessments (
-                    assessment_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    student_id INTEGER,
-                    school_id INTEGER,
-                    date TEXT,
-                    subject TEXT,
-                    marks INTEGER,
-                    total INTEGER,
-                    grade TEXT,
-                    FOREIGN KEY(student_id) REFERENCES students(student_id),
-                    FOREIGN KEY(school_id) REFERENCES schools(school_id)
-                )
-                ''')
-                
-                cursor.execute('''
-                CREATE TABLE teachers (
-                    teacher_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    school_id INTEGER,
-                    name TEXT,
-                    email TEXT,
-                    phone TEXT,
-                    subject TEXT,
-                    qualification TEXT,
-                    join_date TEXT,
-                    status TEXT DEFAULT 'Active',
-                    FOREIGN KEY(school_id) REFERENCES schools(school_id)
-                )
-                ''')
-                
-                cursor.execute('''
-                CREATE TABLE teacher_assignments (
-                    assignment_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    teacher_id INTEGER,
-                    school_id INTEGER,
-                    class_grade TEXT,
-                    subject TEXT,
-                    academic_year TEXT,
-                    FOREIGN KEY(teacher_id) REFERENCES teachers(teacher_id),
-                    FOREIGN KEY(school_id) REFERENCES schools(school_id)
-                )
-                ''')
+                def reset_system(writer_conn):
+                    record_reset(writer_conn)
+                    # Queued parent messages are about students that no longer exist
+                    writer_conn.execute("DELETE FROM notification_outbox")
+                    reset_schema(writer_conn)
+                    init_database(writer_conn)
+                    incremental_vacuum(writer_conn)
                 
-                conn.commit()
+                writer_for(conn).submit(reset_system, exclusive=True).result()
+                db.drop_shards()
+                if reads is not db:
+                    reads.drop_replicas()
+                drop_artifacts()
+                # Recreated shard files start their change logs again, so
+                # cached versions could match new data
+                shared_cache().clear()
                 st.success("✅ System reset successfully! All data has been deleted.")
                 st.rerun()
                 
             except Exception as e:
-                st.error(f"Error resetting system: {e}")
\ No newline at end of file
+                st.error(f"Error resetting system: {e}")
+
+    # Storage maintenance, run by each file's writer as exclusive jobs
+    st.subheader("🧹 Storage Maintenance")
+    maintenance_conns = [conn] + [c for _, c in db.connections() if c is not conn]
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        if st.button("🧽 Purge Orphaned Rows"):
+            try:
+                purged = {}
+                for target in maintenance_conns:
+                    for table, count in writer_for(target).submit(purge_orphans, exclusive=True).result().items():
+                        purged[table] = purged.get(table, 0) + count
+            except WriterBusy as e:
+                st.error(str(e))
+            else:
+                st.success(f"Purged {sum(purged.values())} orphaned rows" +
+                           (f": {', '.join(f'{t} {n}' for t, n in purged.items())}" if purged else ""))
+    with col2:
+        if st.button("📈 Update Statistics"):
+            try:
+                for target in maintenance_conns:
+                    writer_for(target).submit(lambda c: optimize(c, full=True), exclusive=True).result()
+            except WriterBusy as e:
+                st.error(str(e))
+            else:
+                st.success("Planner statistics updated (ANALYZE).")
+    with col3:
+        if st.button("🗜️ Reclaim Free Space"):
+            try:
+                freed = sum(writer_for(target).submit(incremental_vacuum, exclusive=True).result()
+                            for target in maintenance_conns)
+            except WriterBusy as e:
+                st.error(str(e))
+            else:
+                st.success(f"Released {freed} free pages.")
+    with col4:
+        if st.button("🛠️ Run Full Maintenance"):
+            try:
+                results = [writer_for(target).submit(run_maintenance, exclusive=True).result()
+                           for target in maintenance_conns]
+            except WriterBusy as e:
+                st.error(str(e))
+            else:
+                st.success(f"Purged {sum(sum(r['orphans_purged'].values()) for r in results)} orphaned rows, "
+                           f"released {sum(r['pages_freed'] for r in results)} pages.")
+
+    stats_frames = []
+    for target in maintenance_conns:
+        stats, summary = storage_stats(target)
+        name = os.path.basename(database_path(target))
+        stats.insert(0, 'database', name)
+        stats_frames.append(stats)
+        last = f"{summary['last_run']:%Y-%m-%d %H:%M}" if summary['last_run'] else "never"
+        st.write(f"**{name}**: {summary['file_mb']:.1f} MB in {summary['page_count']} pages of "
+                 f"{summary['page_size']} bytes, {summary['freelist_count']} free pages "
+                 f"({summary['free_mb']:.1f} MB), auto_vacuum={summary['auto_vacuum']}, last maintenance {last}")
+    st.dataframe(pd.concat(stats_frames, ignore_index=True))
+
+    not_incremental = [target for target in maintenance_conns
+                       if target.execute("PRAGMA auto_vacuum").fetchone()[0] != 2]
+    if not_incremental:
+        st.info(f"{len(not_incremental)} database file(s) cannot release free space gradually yet. "
+                "Converting rewrites the whole file once; run it outside school hours.")
+        if st.button("Enable Incremental Vacuum"):
+            try:
+                for target in not_incremental:
+                    writer_for(target).submit(enable_incremental_vacuum, exclusive=True).result()
+            except WriterBusy as e:
+                st.error(str(e))
+            else:
+                st.success("Incremental vacuum enabled.")
+                st.rerun()
+
+    # Result cache shared by the app processes (see jengahub_cache)
+    cache_stats = shared_cache().stats()
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.write(f"**Result cache**: {cache_stats.get('disk_entries', 0)} entries on disk "
+                 f"({cache_stats.get('disk_mb', 0):.1f} MB), {cache_stats['memory_entries']} in memory; "
+                 f"this process: {cache_stats['memory']} memory hits, {cache_stats['disk']} disk hits, "
+                 f"{cache_stats['miss']} misses")
+    with col2:
+        if st.button("🧹 Clear Result Cache"):
+            shared_cache().clear()
+            st.success("Result cache cleared.")
+
+    # Backups: taken online, so saves carry on while one runs
+    st.subheader("💾 Backups")
+    if st.button("💾 Back Up Now"):
+        with st.spinner("Backing up..."):
+            manifest = create_backup(backup_sources(DB_PATH))
+        st.success(f"Backup {manifest['id']} saved ({len(manifest['files'])} file(s), {manifest['seconds']:.1f}s).")
+    backups = list_backups()
+    if backups.empty:
+        st.info("No backups yet.")
+    else:
+        listing = backups.round({'mb': 1, 'compressed_mb': 1})
+        listing.columns = ['Backup', 'Taken At', 'Label', 'Files', 'Size MB', 'Compressed MB']
+        st.dataframe(listing, hide_index=True)
+        backup_id = st.selectbox("Backup", backups['id'])
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("🔍 Verify Backup"):
+                for result in verify_backup(backup_id):
+                    (st.success if result['ok'] else st.error)(f"{result['file']}: {result['detail']}")
+        with col2:
+            restore_confirmed = st.checkbox("Replace the current data with this backup")
+            if st.button("♻️ Restore Backup", disabled=not restore_confirmed):
+                try:
+                    # Queued behind pending saves on each file's writer
+                    restore_backup(backup_id,
+                                   run=lambda path, job: writer_for(path).submit(job, exclusive=True).result())
+                    if reads is not db:
+                        reads.drop_replicas()
+                    drop_artifacts()
+                    st.success(f"✅ Restored backup {backup_id}. The data before the restore was backed up first.")
+                except Exception as e:
+                    st.error(f"Error restoring backup: {e}")
\ No newline at end of file
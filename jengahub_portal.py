@@ -0,0 +1,83 @@
+"""Parent Portal data access: per-student summary and paged history."""
+import pandas as pd
+
+from jengahub_frames import read_frame
+from jengahub_terms import current_term, term_bounds
+
+HISTORY_PAGE_SIZE = 50
+
+# table -> (primary key, columns shown to parents)
+HISTORY_TABLES = {
+    'attendance': ('attendance_id', ['date', 'status', 'behaviour_score', 'behaviour_comment']),
+    'assessments': ('assessment_id', ['date', 'subject', 'marks', 'total', 'grade']),
+}
+
+
+def student_summary(conn, student_id, term=None):
+    # Precomputed totals plus the full detail of one (by default the current) term
+    term = term or current_term()
+    start, end = term_bounds(term)
+    student_id = int(student_id)
+
+    totals = conn.execute('''
+        SELECT attendance_days, present_days, late_days, absent_days,
+               behaviour_sum, behaviour_count, assessment_count, marks_sum, total_sum
+        FROM student_totals WHERE student_id=?
+    ''', (student_id,)).fetchone() or (0,) * 9
+    (days, present, late, absent, behaviour_sum, behaviour_count,
+     assessment_count, marks_sum, total_sum) = totals
+
+    summary = {
+        'term': term,
+        'attendance_days': days,
+        'present_days': present,
+        'late_days': late,
+        'absent_days': absent,
+        'attendance_rate': present / days * 100 if days else None,
+        'avg_behaviour': behaviour_sum / behaviour_count if behaviour_count else None,
+        'assessment_count': assessment_count,
+        'avg_percentage': marks_sum / total_sum * 100 if total_sum else None,
+    }
+
+    for table in HISTORY_TABLES:
+        key, columns = HISTORY_TABLES[table]
+        summary[f'recent_{table}'] = read_frame(
+            f"SELECT {key}, {', '.join(columns)} FROM {table} "
+            f"WHERE student_id=? AND date BETWEEN ? AND ? ORDER BY date DESC, {key} DESC",
+            conn, params=(student_id, str(start), str(end))
+        )
+    # Cursor for history_page that starts just before the term
+    summary['older_cursor'] = (str(start), 0)
+    return summary
+
+
+def performance_series(conn, student_id):
+    # Narrow projection for the trend chart; downsampled before plotting.
+    # Scores are the stored percentages, so different totals compare.
+    return read_frame(
+        "SELECT date, subject, percentage FROM assessments "
+        "WHERE student_id=? AND percentage IS NOT NULL ORDER BY date",
+        conn, params=(int(student_id),)
+    )
+
+
+def history_page(conn, table, student_id, before=None, limit=HISTORY_PAGE_SIZE):
+    # Keyset pagination on (date, primary key), newest first. `before` is the
+    # cursor returned by the previous page; returns (rows, next_cursor).
+    key, columns = HISTORY_TABLES[table]
+    sql = f"SELECT {key}, {', '.join(columns)} FROM {table} WHERE student_id=?"
+    params = [int(student_id)]
+    if before is not None:
+        sql += f" AND (date, {key}) < (?, ?)"
+        params += [before[0], int(before[1])]
+    sql += f" ORDER BY date DESC, {key} DESC LIMIT ?"
+    params.append(limit + 1)
+
+    # Dates stay as stored text here: the cursor is compared with them in SQL
+    rows = pd.read_sql_query(sql, conn, params=params)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows.iloc[:limit]
+        last = rows.iloc[-1]
+        next_cursor = (last['date'], int(last[key]))
+    return rows, next_cursor
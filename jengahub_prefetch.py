@@ -0,0 +1,142 @@
+"""Background prefetch of a school's working set.
+
+Users pick a school and then move between its pages. As soon as a school is
+selected, a background worker loads what those pages read first into the
+caches they read from:
+- the roster (Attendance and Assessments)
+- this year's analytics, with the KPI and alert figures, and its scores
+  (the Analytics page's default range)
+- each class's gradebook and attendance calendar for the current term
+- any term-to-date report not precomputed yet, which includes the
+  teachers and their assignments
+
+Each job reads through its own connections. Selecting another school
+cancels the job: work not yet started is skipped and the running query is
+interrupted.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from jengahub_cache import cached
+from jengahub_cdc import data_version
+from jengahub_db import DB_PATH, connect, database_path
+from jengahub_frames import read_frame
+from jengahub_terms import current_term
+
+PREFETCH_WORKERS = int(os.environ.get('JENGAHUB_PREFETCH_WORKERS', 2))
+
+
+def school_roster(conn, school_id):
+    # The roster the data-entry pages list, cached until students change
+    return cached('roster', (database_path(conn), int(school_id)),
+                  data_version(conn, school_id, ['students']),
+                  lambda: read_frame("SELECT student_id, name, grade, age FROM students WHERE school_id=?",
+                                     conn, params=(int(school_id),)))
+
+
+class PrefetchJob:
+    def __init__(self, school_id):
+        self.school_id = int(school_id)
+        self.done = threading.Event()
+        self.completed = []
+        self.error = None
+        self._cancelled = threading.Event()
+        self._conns = []
+        self._conns_lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._conns_lock:
+            for conn in self._conns:
+                conn.interrupt()
+
+    def track(self, conn):
+        with self._conns_lock:
+            if conn not in self._conns:
+                self._conns.append(conn)
+        return conn
+
+
+def working_set(db, reads, school_id, today=None):
+    # (name, task) pairs in the order pages are likely to need them
+    from jengahub_analytics import QUERIES, analytics_backend
+    from jengahub_calendar import attendance_matrix
+    from jengahub_gradebook import gradebook
+    from jengahub_reports import REPORT_TYPES, cached_report, load_artifact, period_bounds
+    from jengahub_scores import school_scores
+
+    today = today or date.today()
+    conn, read_conn = db.connection(school_id), reads.connection(school_id)
+    analytics = analytics_backend(reads)
+    year_start = date(today.year, 1, 1)
+    term = current_term(today)
+    grades = [grade for (grade,) in conn.execute(
+        "SELECT DISTINCT grade FROM students WHERE school_id=? ORDER BY grade", (int(school_id),)
+    )]
+
+    tasks = [('roster', lambda: school_roster(conn, school_id))]
+    for name in QUERIES:
+        if name != 'school_comparison':
+            tasks.append((name, lambda name=name: analytics.query(name, school_id, year_start, today)))
+    tasks.append(('school_comparison', lambda: analytics.school_comparison(year_start, today)))
+    tasks.append(('scores', lambda: school_scores(read_conn, school_id, year_start, today)))
+    for grade in grades:
+        tasks.append((f'gradebook {grade}', lambda grade=grade: gradebook(conn, school_id, grade, term)))
+        tasks.append((f'calendar {grade}', lambda grade=grade: attendance_matrix(conn, school_id, grade, term)))
+    start, end = period_bounds('term_to_date', today)
+    for report_type in REPORT_TYPES:
+        if load_artifact(conn, school_id, report_type, start, end) is None:
+            tasks.append((report_type, lambda report_type=report_type: cached_report(
+                read_conn, analytics, school_id, report_type, start, end)))
+    return [conn, read_conn], tasks
+
+
+class Prefetcher:
+    def __init__(self, db_path=DB_PATH, replica_dir=None, workers=PREFETCH_WORKERS):
+        self.db_path = db_path
+        self.replica_dir = replica_dir
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='jengahub-prefetch')
+
+    def submit(self, school_id):
+        job = PrefetchJob(school_id)
+        self._pool.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        from jengahub_replica import ReplicaRouter
+        from jengahub_shards import open_router
+
+        if job.cancelled:
+            job.done.set()
+            return
+        catalog = job.track(connect(self.db_path))
+        try:
+            db = open_router(catalog)
+            reads = ReplicaRouter(db, self.replica_dir) if self.replica_dir else db
+            conns, tasks = working_set(db, reads, job.school_id)
+            for conn in conns:
+                job.track(conn)
+            for name, task in tasks:
+                if job.cancelled:
+                    break
+                task()
+                job.completed.append(name)
+        except Exception as e:
+            # An interrupted query is how a cancelled job stops mid-task
+            if not job.cancelled:
+                job.error = e
+        finally:
+            with job._conns_lock:
+                conns, job._conns = job._conns, []
+            for conn in conns:
+                conn.close()
+            job.done.set()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
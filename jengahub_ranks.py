@@ -0,0 +1,175 @@
+"""Per-term academic ranks within school, grade and subject.
+
+Ranks are computed with window functions for one school and term at a
+time and materialized in student_ranks, so looking up a student's
+position is an indexed point read. A school's term is recomputed on the
+next lookup after its assessments or students change (tracked through
+the change log). The recompute is a job for the database's writer; until
+it has run, lookups serve the previous ranks.
+
+Scores are the percentage of available marks over the term. Rank 1 is
+the highest score; ties share a rank. Percentile is the share of the
+cohort scoring at or below the student.
+"""
+from datetime import datetime
+
+import pandas as pd
+
+from jengahub_cdc import data_version
+from jengahub_terms import term_bounds
+from jengahub_writer import WriterBusy, writer_for
+
+SCOPES = ['school', 'grade', 'subject']
+
+RANKS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS student_ranks (
+        student_id INTEGER NOT NULL,
+        term TEXT NOT NULL,
+        scope TEXT NOT NULL,
+        subject TEXT NOT NULL DEFAULT '',
+        school_id INTEGER,
+        grade TEXT,
+        score REAL,
+        rank INTEGER,
+        cohort INTEGER,
+        percentile REAL,
+        PRIMARY KEY (student_id, term, scope, subject)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_student_ranks_board ON student_ranks(school_id, term, scope, grade, subject, rank)",
+    '''
+    CREATE TABLE IF NOT EXISTS rank_state (
+        school_id INTEGER NOT NULL,
+        term TEXT NOT NULL,
+        version INTEGER,
+        computed_at TEXT,
+        PRIMARY KEY (school_id, term)
+    )
+    ''',
+]
+
+# Subject percentages per student for the term; the overall score is
+# computed from the summed marks, not by averaging subject percentages
+SCORES_CTE = '''
+    WITH scores AS (
+        SELECT a.student_id, s.grade, a.subject, SUM(a.marks) AS marks, SUM(a.total) AS total
+        FROM assessments a JOIN students s ON s.student_id = a.student_id
+        WHERE a.school_id = ? AND a.date BETWEEN ? AND ? AND a.total > 0
+        GROUP BY a.student_id, s.grade, a.subject
+    ), overall AS (
+        SELECT student_id, grade, SUM(marks) * 100.0 / SUM(total) AS score
+        FROM scores GROUP BY student_id, grade
+    )
+'''
+
+RANK_INSERTS = {
+    'school': '''
+        SELECT student_id, ?, 'school', '', ?, grade, score,
+               RANK() OVER (ORDER BY score DESC),
+               COUNT(*) OVER (),
+               100.0 * CUME_DIST() OVER (ORDER BY score)
+        FROM overall
+    ''',
+    'grade': '''
+        SELECT student_id, ?, 'grade', '', ?, grade, score,
+               RANK() OVER (PARTITION BY grade ORDER BY score DESC),
+               COUNT(*) OVER (PARTITION BY grade),
+               100.0 * CUME_DIST() OVER (PARTITION BY grade ORDER BY score)
+        FROM overall
+    ''',
+    'subject': '''
+        SELECT student_id, ?, 'subject', COALESCE(subject, ''), ?, grade, marks * 100.0 / total,
+               RANK() OVER (PARTITION BY grade, subject ORDER BY marks * 1.0 / total DESC),
+               COUNT(*) OVER (PARTITION BY grade, subject),
+               100.0 * CUME_DIST() OVER (PARTITION BY grade, subject ORDER BY marks * 1.0 / total)
+        FROM scores
+    ''',
+}
+
+
+def init_ranks(conn):
+    for statement in RANKS_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+def compute_ranks(conn, school_id, term):
+    # The caller commits (the writer does, for jobs run through it)
+    school_id = int(school_id)
+    start, end = term_bounds(term)
+    version = data_version(conn, school_id, ['assessments', 'students'])
+    conn.execute("DELETE FROM student_ranks WHERE school_id=? AND term=?", (school_id, term))
+    for scope in SCOPES:
+        conn.execute(
+            SCORES_CTE + '''
+            INSERT INTO student_ranks (student_id, term, scope, subject, school_id, grade,
+                                       score, rank, cohort, percentile)
+            ''' + RANK_INSERTS[scope],
+            (school_id, str(start), str(end), term, school_id)
+        )
+    conn.execute(
+        "INSERT OR REPLACE INTO rank_state (school_id, term, version, computed_at) VALUES (?, ?, ?, ?)",
+        (school_id, term, version, datetime.now().isoformat(timespec='seconds'))
+    )
+
+
+def _rank_version(conn, school_id, term):
+    state = conn.execute(
+        "SELECT version FROM rank_state WHERE school_id=? AND term=?", (int(school_id), term)
+    ).fetchone()
+    return state[0] if state else None
+
+
+def refresh_ranks(conn, school_id, term):
+    # Writer job: recomputes only when the school's data changed since the
+    # last run, so repeated requests for the same change cost one check
+    if _rank_version(conn, school_id, term) != data_version(conn, school_id, ['assessments', 'students']):
+        compute_ranks(conn, school_id, term)
+
+
+def ensure_ranks(conn, school_id, term):
+    # Queues a recompute on the writer when the ranks are out of date. Only
+    # a term that has never been ranked waits for it; otherwise the previous
+    # ranks are served meanwhile (also when the write queue is full).
+    version = _rank_version(conn, school_id, term)
+    if version is not None and version == data_version(conn, school_id, ['assessments', 'students']):
+        return
+    try:
+        job = writer_for(conn).submit(lambda writer_conn: refresh_ranks(writer_conn, school_id, term))
+    except WriterBusy:
+        return
+    if version is None:
+        job.result()
+
+
+def student_ranks(conn, school_id, student_id, term):
+    # One row per scope (and per subject) for a student
+    ensure_ranks(conn, school_id, term)
+    return pd.read_sql_query('''
+        SELECT scope, subject, grade, score, rank, cohort, percentile
+        FROM student_ranks WHERE student_id=? AND term=?
+        ORDER BY CASE scope WHEN 'school' THEN 0 WHEN 'grade' THEN 1 ELSE 2 END, subject
+    ''', conn, params=(int(student_id), term))
+
+
+def rank_board(conn, school_id, term, scope='grade', grade=None, subject='', limit=None):
+    # Ranked list for a school, grade or grade and subject, best first
+    ensure_ranks(conn, school_id, term)
+    sql = '''
+        SELECT r.rank, s.name, r.grade, r.subject, r.score, r.percentile, r.cohort
+        FROM student_ranks r JOIN students s ON s.student_id = r.student_id
+        WHERE r.school_id=? AND r.term=? AND r.scope=?
+    '''
+    params = [int(school_id), term, scope]
+    if scope != 'school':
+        sql += " AND r.grade IS ?"
+        params.append(grade)
+    if scope == 'subject':
+        sql += " AND r.subject=?"
+        params.append(subject)
+    sql += " ORDER BY r.rank, s.name"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return pd.read_sql_query(sql, conn, params=params)
@@ -0,0 +1,227 @@
+"""Read replica for the reporting pages.
+
+With JENGAHUB_REPLICA_DIR set, the Analytics, Reports and Export Data pages
+read from snapshot copies of the database files instead of the files
+teachers write to, so long report queries never hold locks that data
+entry has to wait for. A background thread refreshes each snapshot with
+SQLite's online backup API once it is JENGAHUB_REPLICA_INTERVAL seconds
+old or JENGAHUB_REPLICA_WRITES changes behind, whichever comes first.
+
+Snapshots are written to a temporary file and swapped into place, so a
+report that is already running keeps reading the previous snapshot.
+
+    python3 jengahub_replica.py refresh
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from jengahub_cdc import current_watermark
+from jengahub_db import DB_PATH, connect, database_path
+
+logger = logging.getLogger(__name__)
+
+REPLICA_DIR = os.environ.get('JENGAHUB_REPLICA_DIR')
+REFRESH_INTERVAL = int(os.environ.get('JENGAHUB_REPLICA_INTERVAL', 300))
+REFRESH_WRITES = int(os.environ.get('JENGAHUB_REPLICA_WRITES', 500))
+
+# Pages copied per backup step; writers can commit between steps
+BACKUP_STEP_PAGES = 256
+
+REPLICA_INFO_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS replica_info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+)
+'''
+
+
+def replica_path(replica_dir, source_path):
+    return os.path.join(replica_dir, os.path.basename(source_path))
+
+
+def refresh_replica(source_path, target_path):
+    # Online backup into a temporary file, stamped with the time and the
+    # change-log watermark it was taken at, then swapped into place
+    os.makedirs(os.path.dirname(os.path.abspath(target_path)), exist_ok=True)
+    temp_path = target_path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    source = connect(source_path)
+    target = sqlite3.connect(temp_path)
+    try:
+        # Taken before the copy so the recorded lag can only be overstated
+        watermark = current_watermark(source)
+        source.backup(target, pages=BACKUP_STEP_PAGES)
+        target.execute(REPLICA_INFO_SCHEMA)
+        target.executemany(
+            "INSERT OR REPLACE INTO replica_info (key, value) VALUES (?, ?)",
+            [('refreshed_at', datetime.now().isoformat(timespec='seconds')), ('watermark', str(watermark))]
+        )
+        target.commit()
+    finally:
+        target.close()
+        source.close()
+    os.replace(temp_path, target_path)
+    return watermark
+
+
+def replica_info(replica_conn):
+    try:
+        info = dict(replica_conn.execute("SELECT key, value FROM replica_info").fetchall())
+    except sqlite3.OperationalError:
+        return None
+    return {'refreshed_at': datetime.fromisoformat(info['refreshed_at']), 'watermark': int(info['watermark'])}
+
+
+def needs_refresh(source_conn, target_path, interval=REFRESH_INTERVAL, max_writes=REFRESH_WRITES):
+    if not os.path.exists(target_path):
+        return True
+    replica = sqlite3.connect(f"file:{target_path}?mode=ro", uri=True)
+    try:
+        info = replica_info(replica)
+    finally:
+        replica.close()
+    if info is None:
+        return True
+    age = (datetime.now() - info['refreshed_at']).total_seconds()
+    return age >= interval or current_watermark(source_conn) - info['watermark'] >= max_writes
+
+
+class ReplicaRouter:
+    # Same interface as the routers in jengahub_shards, serving read-only
+    # connections to the snapshots of the primary router's files
+    def __init__(self, primary, replica_dir=REPLICA_DIR):
+        self.primary = primary
+        self.replica_dir = replica_dir
+        self.sharded = primary.sharded
+        self._conns = {}
+        self._lock = threading.Lock()
+
+    def _open(self, source_path):
+        path = replica_path(self.replica_dir, source_path)
+        with self._lock:
+            if not os.path.exists(path):
+                refresh_replica(source_path, path)
+            # Reopen after a refresh has swapped in a new file. The old
+            # connection is shared by every session, so it is not closed
+            # here: queries still running on it finish on the old snapshot,
+            # and it closes once the last of them lets go of it.
+            inode = os.stat(path).st_ino
+            cached = self._conns.get(path)
+            if cached is None or cached[0] != inode:
+                conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+                self._conns[path] = (inode, conn)
+            return self._conns[path][1]
+
+    def connection(self, school_id):
+        return self._open(database_path(self.primary.connection(school_id)))
+
+    def connections(self):
+        return [(school_id, self._open(database_path(conn))) for school_id, conn in self.primary.connections()]
+
+    def fan_out(self, sql, params=()):
+        frames = [pd.read_sql_query(sql, conn, params=params) for _, conn in self.connections()]
+        return pd.concat(frames, ignore_index=True)
+
+    def paths(self):
+        return [replica_path(self.replica_dir, path) for path in self.primary.paths()]
+
+    def status(self, school_id):
+        # Age of the snapshot a school's pages read from, and how many
+        # changes the primary has had since
+        info = replica_info(self.connection(school_id))
+        if info is None:
+            return None
+        behind = current_watermark(self.primary.connection(school_id)) - info['watermark']
+        return {
+            'refreshed_at': info['refreshed_at'],
+            'age_seconds': (datetime.now() - info['refreshed_at']).total_seconds(),
+            'changes_behind': max(behind, 0),
+        }
+
+    def drop_replicas(self):
+        # Used by a full system reset so no snapshot outlives its data.
+        # Connections in use are left to finish, as in _open.
+        with self._lock:
+            self._conns.clear()
+            if not os.path.isdir(self.replica_dir):
+                return
+            for name in os.listdir(self.replica_dir):
+                if name.endswith('.db'):
+                    os.remove(os.path.join(self.replica_dir, name))
+
+
+class ReplicaRefresher:
+    def __init__(self, db_paths, replica_dir=REPLICA_DIR, interval=REFRESH_INTERVAL,
+                 max_writes=REFRESH_WRITES, poll_interval=5):
+        # db_paths: list of primary files, or a callable returning one
+        self.db_paths = db_paths
+        self.replica_dir = replica_dir
+        self.interval = interval
+        self.max_writes = max_writes
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+
+    def refresh_due(self):
+        paths = self.db_paths() if callable(self.db_paths) else self.db_paths
+        refreshed = 0
+        for source_path in paths:
+            target_path = replica_path(self.replica_dir, source_path)
+            source = connect(source_path)
+            try:
+                due = needs_refresh(source, target_path, self.interval, self.max_writes)
+            finally:
+                source.close()
+            if due:
+                refresh_replica(source_path, target_path)
+                refreshed += 1
+        return refreshed
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_due()
+            except Exception:
+                logger.exception("Replica refresh failed")
+            self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+def start_refresher_thread(db_paths, replica_dir=REPLICA_DIR, **kwargs):
+    refresher = ReplicaRefresher(db_paths, replica_dir, **kwargs)
+    threading.Thread(target=refresher.run, name='jengahub-replica', daemon=True).start()
+    return refresher
+
+
+def main(argv=None):
+    from jengahub_shards import SHARD_DIR, open_router
+
+    parser = argparse.ArgumentParser(description="Read replica for Jenga Hub PMS reports")
+    commands = parser.add_subparsers(dest='command', required=True)
+    refresh = commands.add_parser('refresh', help="refresh every snapshot now")
+    refresh.add_argument('--db', default=DB_PATH)
+    refresh.add_argument('--shard-dir', default=SHARD_DIR)
+    refresh.add_argument('--replica-dir', default=REPLICA_DIR, required=REPLICA_DIR is None)
+    args = parser.parse_args(argv)
+
+    catalog = connect(args.db)
+    try:
+        paths = open_router(catalog, args.shard_dir).paths()
+    finally:
+        catalog.close()
+    for source_path in paths:
+        target_path = replica_path(args.replica_dir, source_path)
+        watermark = refresh_replica(source_path, target_path)
+        print(f"{source_path} -> {target_path} (watermark {watermark})")
+
+
+if __name__ == '__main__':
+    main()
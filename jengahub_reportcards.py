@@ -0,0 +1,185 @@
+"""Bulk report cards: one HTML document per student, zipped.
+
+All data for a school (or one grade) is fetched up front in a handful of
+grouped queries, the cards are rendered across a process pool, and the
+results are streamed into a single zip file.
+"""
+import html
+import io
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+# Below this many students the pool costs more than it saves
+MIN_PARALLEL_CARDS = 200
+RECENT_COMMENTS = 3
+
+
+def letter_grade(percentage):
+    # Same bands as the Assessments page
+    if percentage is None:
+        return '-'
+    if percentage >= 90:
+        return 'A'
+    elif percentage >= 80:
+        return 'B'
+    elif percentage >= 70:
+        return 'C'
+    elif percentage >= 60:
+        return 'D'
+    return 'E'
+
+
+# ===================== DATA =====================
+def load_cards(conn, school_id, start, end, grade=None):
+    school_id = int(school_id)
+    start, end = str(start), str(end)
+    student_filter = "school_id=?"
+    student_params = [school_id]
+    if grade:
+        student_filter += " AND grade=?"
+        student_params.append(grade)
+
+    school_name = conn.execute("SELECT name FROM schools WHERE school_id=?", (school_id,)).fetchone()
+    school_name = school_name[0] if school_name else ''
+
+    cards = {}
+    for student_id, name, student_grade, parent_name in conn.execute(
+        f"SELECT student_id, name, grade, parent_name FROM students WHERE {student_filter} ORDER BY grade, name",
+        student_params
+    ):
+        cards[student_id] = {
+            'school': school_name, 'student_id': student_id, 'name': name, 'grade': student_grade,
+            'parent_name': parent_name, 'start': start, 'end': end,
+            'subjects': [], 'attendance': {}, 'avg_behaviour': None, 'comments': [],
+        }
+    if not cards:
+        return []
+
+    # Marks by subject
+    for student_id, subject, assessments, marks, total in conn.execute(f'''
+        SELECT student_id, subject, COUNT(*), SUM(marks), SUM(total)
+        FROM assessments
+        WHERE school_id=? AND date BETWEEN ? AND ?
+          AND student_id IN (SELECT student_id FROM students WHERE {student_filter})
+        GROUP BY student_id, subject
+        ORDER BY student_id, subject
+    ''', [school_id, start, end] + student_params):
+        if student_id in cards:
+            percentage = marks * 100.0 / total if total else None
+            cards[student_id]['subjects'].append({
+                'subject': subject, 'assessments': assessments, 'marks': marks,
+                'total': total, 'percentage': percentage, 'grade': letter_grade(percentage),
+            })
+
+    # Attendance and behaviour
+    for student_id, days, present, late, absent, behaviour in conn.execute(f'''
+        SELECT student_id, COUNT(*), SUM(status='Present'), SUM(status='Late'),
+               SUM(status='Absent'), AVG(behaviour_score)
+        FROM attendance
+        WHERE school_id=? AND date BETWEEN ? AND ?
+          AND student_id IN (SELECT student_id FROM students WHERE {student_filter})
+        GROUP BY student_id
+    ''', [school_id, start, end] + student_params):
+        if student_id in cards:
+            cards[student_id]['attendance'] = {
+                'days': days, 'present': present, 'late': late, 'absent': absent,
+                'rate': present * 100.0 / days if days else None,
+            }
+            cards[student_id]['avg_behaviour'] = behaviour
+
+    # Most recent behaviour comments
+    for student_id, date, comment in conn.execute(f'''
+        SELECT student_id, date, behaviour_comment FROM (
+            SELECT student_id, date, behaviour_comment,
+                   ROW_NUMBER() OVER (PARTITION BY student_id ORDER BY date DESC) AS n
+            FROM attendance
+            WHERE school_id=? AND date BETWEEN ? AND ?
+              AND behaviour_comment IS NOT NULL AND behaviour_comment != ''
+              AND student_id IN (SELECT student_id FROM students WHERE {student_filter})
+        ) WHERE n <= ?
+    ''', [school_id, start, end] + student_params + [RECENT_COMMENTS]):
+        if student_id in cards:
+            cards[student_id]['comments'].append((date, comment))
+
+    for card in cards.values():
+        marks = sum(s['marks'] or 0 for s in card['subjects'])
+        total = sum(s['total'] or 0 for s in card['subjects'])
+        card['overall_percentage'] = marks * 100.0 / total if total else None
+        card['overall_grade'] = letter_grade(card['overall_percentage'])
+    return list(cards.values())
+
+
+# ===================== RENDERING =====================
+def _fmt(value, suffix='', digits=1):
+    return f"{value:.{digits}f}{suffix}" if value is not None else 'N/A'
+
+
+def card_filename(card):
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', card['name'] or 'student').strip('_')
+    grade = re.sub(r'[^A-Za-z0-9]+', '_', card['grade'] or 'no_grade').strip('_')
+    return f"{grade}/{slug}_{card['student_id']}.html"
+
+
+def render_card(card):
+    # Runs in worker processes; returns (filename, html bytes)
+    e = html.escape
+    rows = ''.join(
+        f"<tr><td>{e(s['subject'] or '')}</td><td>{s['marks']}/{s['total']}</td>"
+        f"<td>{_fmt(s['percentage'], '%')}</td><td>{s['grade']}</td></tr>"
+        for s in card['subjects']
+    ) or "<tr><td colspan='4'>No assessments in this period.</td></tr>"
+    attendance = card['attendance']
+    comments = ''.join(f"<li>{e(date)}: {e(comment)}</li>" for date, comment in card['comments'])
+
+    document = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Report Card - {e(card['name'] or '')}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #999; padding: 4px 10px; text-align: left; }}
+</style></head>
+<body>
+<h1>{e(card['school'])}</h1>
+<h2>Report Card: {e(card['name'] or '')}</h2>
+<p>Grade/Class: {e(card['grade'] or '')}<br>
+Parent/Guardian: {e(card['parent_name'] or '')}<br>
+Period: {e(card['start'])} to {e(card['end'])}</p>
+<h3>Academic Performance</h3>
+<table><tr><th>Subject</th><th>Marks</th><th>Score</th><th>Grade</th></tr>{rows}</table>
+<p><b>Overall: {_fmt(card['overall_percentage'], '%')} (Grade {card['overall_grade']})</b></p>
+<h3>Attendance</h3>
+<p>Attendance rate: {_fmt(attendance.get('rate'), '%')}<br>
+Present {attendance.get('present', 0)}, late {attendance.get('late', 0)},
+absent {attendance.get('absent', 0)} of {attendance.get('days', 0)} days</p>
+<h3>Behaviour</h3>
+<p>Average behaviour score: {_fmt(card['avg_behaviour'], '/5')}</p>
+{f'<ul>{comments}</ul>' if comments else ''}
+</body></html>
+"""
+    return card_filename(card), document.encode('utf-8')
+
+
+def write_report_cards(cards, output, workers=None):
+    # Streams rendered cards into a zip written to `output` (path or file object)
+    workers = workers or os.cpu_count() or 1
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        if workers == 1 or len(cards) < MIN_PARALLEL_CARDS:
+            for filename, document in map(render_card, cards):
+                archive.writestr(filename, document)
+        else:
+            # spawn: forking a threaded server process is not safe
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                chunksize = max(1, len(cards) // (workers * 4))
+                for filename, document in pool.map(render_card, cards, chunksize=chunksize):
+                    archive.writestr(filename, document)
+    return len(cards)
+
+
+def report_cards_zip(conn, school_id, start, end, grade=None, workers=None):
+    buffer = io.BytesIO()
+    count = write_report_cards(load_cards(conn, school_id, start, end, grade), buffer, workers)
+    return buffer.getvalue(), count
@@ -0,0 +1,352 @@
+"""Standard reports: data building, precomputed artifacts and the nightly run.
+
+build_report gathers everything one of the Reports page's report types
+shows (query results and the tables derived from them) as a dict of
+DataFrames; the page only lays it out. Each night the scheduler builds
+every report type for every school over the standard periods (term to
+date and last month) with a bounded worker pool and saves the results
+as pickled artifacts, so "Generate Report" for a standard period is a
+file read. Custom ranges are built on demand and kept in the shared
+result cache until the school's data changes.
+
+    python3 jengahub_reports.py run --workers 4
+    python3 jengahub_reports.py list
+"""
+import argparse
+import logging
+import os
+import pickle
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from jengahub_cache import cached
+from jengahub_cdc import data_version
+from jengahub_db import DB_PATH, connect, database_path
+from jengahub_frames import read_frame
+from jengahub_scores import school_scores, score_stats, standardize
+from jengahub_terms import current_term, term_bounds
+
+logger = logging.getLogger(__name__)
+
+REPORT_DIR = os.environ.get('JENGAHUB_REPORT_DIR', 'report_artifacts')
+# Hour of the night (local time) after which the day's precomputation runs,
+# and for how many hours it may still start. A night that was missed (the
+# app was down) is not made up during the day: reports are built on demand.
+REPORT_HOUR = int(os.environ.get('JENGAHUB_REPORT_HOUR', 2))
+REPORT_WINDOW = int(os.environ.get('JENGAHUB_REPORT_WINDOW', 3))
+REPORT_WORKERS = int(os.environ.get('JENGAHUB_REPORT_WORKERS', 4))
+# Bumped when a report's contents change shape; older artifacts are rebuilt
+ARTIFACT_FORMAT = 2
+
+REPORT_TYPES = [
+    "Student Performance Report",
+    "Teacher Performance Report",
+    "Attendance Summary Report",
+    "Behaviour Analysis Report",
+    "Comprehensive School Report",
+]
+
+PERIODS = {
+    'term_to_date': "Term to date",
+    'last_month': "Last month",
+}
+
+
+def period_bounds(period, today=None):
+    today = today or date.today()
+    if period == 'term_to_date':
+        start, end = term_bounds(current_term(today))
+        return start, min(today, end)
+    if period == 'last_month':
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1), end
+    raise ValueError(f"Unknown period {period}")
+
+
+# ===================== BUILDING =====================
+def _teacher_performance(teachers, assignments, students, assessments):
+    # Average score of the students in each teacher's classes
+    teacher_classes = assignments.groupby('teacher_id')['class_grade'].unique()
+    performance_data = []
+    for _, teacher in teachers.iterrows():
+        classes = list(teacher_classes.get(teacher['teacher_id'], []))
+        if not classes:
+            continue
+        teacher_students = students[students['grade'].isin(classes)]
+        teacher_assessments = assessments[assessments['student_id'].isin(teacher_students['student_id'])]
+        if teacher_assessments.empty:
+            continue
+        performance_data.append({
+            'Teacher': teacher['name'],
+            'Subject': teacher['subject'],
+            'Classes': ', '.join(classes),
+            'Average Student Score': f"{teacher_assessments['percentage'].mean():.1f}%",
+            'Students Assessed': teacher_assessments['student_id'].nunique()
+        })
+    return pd.DataFrame(performance_data)
+
+
+def build_report(conn, analytics, school_id, report_type, start, end):
+    school_id = int(school_id)
+    query = lambda name: analytics.query(name, school_id, start, end)
+    students = lambda: read_frame("SELECT * FROM students WHERE school_id=?", conn, params=(school_id,))
+    teachers = lambda: read_frame("SELECT * FROM teachers WHERE school_id=?", conn, params=(school_id,))
+    assessments = lambda: read_frame(
+        "SELECT * FROM assessments WHERE school_id=? AND date BETWEEN ? AND ?",
+        conn, params=(school_id, str(start), str(end))
+    )
+    report = {}
+
+    if report_type == "Student Performance Report":
+        # Each score with its z-score and percentile within the subject
+        scores = school_scores(conn, school_id, start, end)
+        report['performance'] = standardize(scores, ['subject']) if not scores.empty else pd.DataFrame()
+        report['score_stats'] = score_stats(scores, ['grade', 'subject'])
+        report['marks_by_grade'] = query('marks_by_grade')
+        report['assessment_overview'] = query('assessment_overview')
+
+    elif report_type == "Teacher Performance Report":
+        df_teachers, df_students, df_assessments = teachers(), students(), assessments()
+        df_assignments = read_frame("SELECT * FROM teacher_assignments WHERE school_id=?", conn, params=(school_id,))
+        report['teachers'] = df_teachers
+        report['workload'] = pd.DataFrame()
+        report['teacher_performance'] = pd.DataFrame()
+        if not df_assignments.empty:
+            workload = df_assignments.groupby('teacher_id').agg({
+                'class_grade': 'count',
+                'subject': lambda x: ', '.join(x.unique())
+            }).reset_index()
+            workload = workload.merge(df_teachers[['teacher_id', 'name']], on='teacher_id')
+            workload.columns = ['Teacher ID', 'Number of Classes', 'Subjects', 'Teacher Name']
+            report['workload'] = workload
+        if not df_teachers.empty and not df_assessments.empty and not df_students.empty:
+            report['teacher_performance'] = _teacher_performance(df_teachers, df_assignments, df_students,
+                                                                 df_assessments)
+
+    elif report_type == "Attendance Summary Report":
+        report['attendance_by_status'] = query('attendance_by_status')
+        report['attendance_by_day'] = query('attendance_by_day')
+        report['attendance_by_grade'] = query('attendance_by_grade')
+
+    elif report_type == "Behaviour Analysis Report":
+        report['attendance_overview'] = query('attendance_overview')
+        report['behaviour_distribution'] = query('behaviour_distribution')
+        report['behaviour_ranking'] = query('behaviour_ranking')
+
+    elif report_type == "Comprehensive School Report":
+        df_students, df_teachers = students(), teachers()
+        report['counts'] = pd.DataFrame([{'students': len(df_students), 'teachers': len(df_teachers)}])
+        report['grade_distribution'] = df_students['grade'].value_counts().reset_index()
+        report['teacher_summary'] = df_teachers[['name', 'subject', 'qualification', 'status']]
+        report['attendance_overview'] = query('attendance_overview')
+        report['assessment_overview'] = query('assessment_overview')
+        report['marks_by_subject'] = query('marks_by_subject')
+        report['attendance_by_status'] = query('attendance_by_status')
+
+    else:
+        raise ValueError(f"Unknown report type {report_type}")
+    return report
+
+
+def cached_report(conn, analytics, school_id, report_type, start, end):
+    # build_report through the result cache, for ranges with no artifact
+    return cached('report', (ARTIFACT_FORMAT, analytics.name, database_path(conn), int(school_id), report_type,
+                             start, end),
+                  data_version(conn, school_id),
+                  lambda: build_report(conn, analytics, school_id, report_type, start, end))
+
+
+# ===================== ARTIFACTS =====================
+def _slug(report_type):
+    return re.sub(r'[^a-z]+', '_', report_type.lower()).strip('_')
+
+
+def artifact_path(school_id, report_type, start, end, report_dir=REPORT_DIR):
+    return os.path.join(report_dir, str(int(school_id)), f"{_slug(report_type)}_{start}_{end}.pkl")
+
+
+def _is_artifact(root, name):
+    # Files written by save_artifact, not temp files or anything else in the directory
+    return (os.path.basename(root).isdigit()
+            and re.fullmatch(r'[a-z_]+_\d{4}-\d{2}-\d{2}_\d{4}-\d{2}-\d{2}\.pkl', name) is not None)
+
+
+def save_artifact(report, meta, school_id, report_type, start, end, report_dir=REPORT_DIR):
+    path = artifact_path(school_id, report_type, start, end, report_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump({'meta': meta, 'report': report}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return path
+
+
+def load_artifact(conn, school_id, report_type, start, end, report_dir=REPORT_DIR):
+    # (report, meta), or None when nothing was precomputed for this range or
+    # the school's data has changed since
+    path = artifact_path(school_id, report_type, start, end, report_dir)
+    try:
+        with open(path, 'rb') as f:
+            artifact = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+    if artifact['meta'].get('format') != ARTIFACT_FORMAT:
+        return None
+    if artifact['meta'].get('version') != data_version(conn, school_id):
+        return None
+    return artifact['report'], artifact['meta']
+
+
+def compute_artifact(conn, analytics, school_id, report_type, start, end, report_dir=REPORT_DIR):
+    started = time.monotonic()
+    version = data_version(conn, school_id)
+    report = build_report(conn, analytics, school_id, report_type, start, end)
+    meta = {
+        'format': ARTIFACT_FORMAT,
+        'computed_at': datetime.now().isoformat(timespec='seconds'),
+        'version': version,
+        'seconds': round(time.monotonic() - started, 3),
+    }
+    save_artifact(report, meta, school_id, report_type, start, end, report_dir)
+    return report, meta
+
+
+def list_artifacts(report_dir=REPORT_DIR):
+    rows = []
+    for root, _, files in os.walk(report_dir):
+        for name in files:
+            if _is_artifact(root, name):
+                path = os.path.join(root, name)
+                rows.append({'school_id': os.path.basename(root), 'artifact': name,
+                             'kb': os.path.getsize(path) / 1000,
+                             'written': datetime.fromtimestamp(os.path.getmtime(path))})
+    return pd.DataFrame(rows, columns=['school_id', 'artifact', 'kb', 'written'])
+
+
+def drop_artifacts(report_dir=REPORT_DIR):
+    shutil.rmtree(report_dir, ignore_errors=True)
+
+
+# ===================== PRECOMPUTATION =====================
+def precompute_reports(db_path=DB_PATH, shard_dir=None, report_dir=REPORT_DIR, workers=REPORT_WORKERS,
+                       today=None):
+    # Every report type for every school and standard period. Work is split
+    # per (school, period); each job reads through its own connection.
+    from jengahub_analytics import SqliteBackend
+    from jengahub_shards import SHARD_DIR, SingleDatabase, open_router
+
+    catalog = connect(db_path)
+    try:
+        router = open_router(catalog, shard_dir if shard_dir is not None else SHARD_DIR)
+        schools = catalog.execute("SELECT school_id FROM schools ORDER BY school_id").fetchall()
+        jobs = [(school_id, database_path(router.connection(school_id)), period)
+                for (school_id,) in schools for period in PERIODS]
+    finally:
+        catalog.close()
+
+    def run(job):
+        school_id, path, period = job
+        start, end = period_bounds(period, today)
+        conn = connect(path)
+        try:
+            analytics = SqliteBackend(SingleDatabase(conn))
+            for report_type in REPORT_TYPES:
+                compute_artifact(conn, analytics, school_id, report_type, start, end, report_dir)
+            return [artifact_path(school_id, report_type, start, end, report_dir) for report_type in REPORT_TYPES]
+        finally:
+            conn.close()
+
+    started = time.monotonic()
+    written = set()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='jengahub-reports') as pool:
+        for paths in pool.map(run, jobs):
+            written.update(paths)
+
+    # Earlier periods (and deleted schools) are not served again
+    for root, _, files in os.walk(report_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if _is_artifact(root, name) and path not in written:
+                os.remove(path)
+    _write_state(report_dir, {'ran_at': datetime.now().isoformat(timespec='seconds'),
+                              'artifacts': len(written), 'seconds': round(time.monotonic() - started, 3)})
+    return len(written)
+
+
+def _write_state(report_dir, state):
+    os.makedirs(report_dir, exist_ok=True)
+    with open(os.path.join(report_dir, 'last_run.pkl'), 'wb') as f:
+        pickle.dump(state, f)
+
+
+def last_run(report_dir=REPORT_DIR):
+    try:
+        with open(os.path.join(report_dir, 'last_run.pkl'), 'rb') as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+class ReportScheduler:
+    def __init__(self, db_path=DB_PATH, report_dir=REPORT_DIR, hour=REPORT_HOUR, workers=REPORT_WORKERS,
+                 poll_interval=600, window=REPORT_WINDOW):
+        self.db_path = db_path
+        self.report_dir = report_dir
+        self.hour = hour
+        self.window = window
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+
+    def due(self, now=None):
+        now = now or datetime.now()
+        previous = last_run(self.report_dir)
+        ran_today = previous and datetime.fromisoformat(previous['ran_at']).date() == now.date()
+        return self.hour <= now.hour < self.hour + self.window and not ran_today
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                if self.due():
+                    precompute_reports(self.db_path, report_dir=self.report_dir, workers=self.workers)
+            except Exception:
+                logger.exception("Report precomputation failed")
+            self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+def start_report_thread(**kwargs):
+    scheduler = ReportScheduler(**kwargs)
+    threading.Thread(target=scheduler.run, name='jengahub-report-scheduler', daemon=True).start()
+    return scheduler
+
+
+def main(argv=None):
+    from jengahub_shards import SHARD_DIR
+
+    parser = argparse.ArgumentParser(description="Precompute the standard reports for Jenga Hub PMS")
+    parser.add_argument('command', choices=['run', 'list'])
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--shard-dir', default=SHARD_DIR)
+    parser.add_argument('--report-dir', default=REPORT_DIR)
+    parser.add_argument('--workers', type=int, default=REPORT_WORKERS)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        started = time.monotonic()
+        count = precompute_reports(args.db, args.shard_dir, args.report_dir, args.workers)
+        print(f"{count} report artifacts written to {args.report_dir} in {time.monotonic() - started:.1f}s")
+    else:
+        print(list_artifacts(args.report_dir).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Assessment scores as percentages, and statistics over them.
+
+Assessments are marked out of different totals (a quiz out of 20, an exam
+out of 100), so raw marks cannot be averaged together. Each assessment
+stores its percentage of the available marks. The app's writers set it
+when they insert. Triggers fill it in for any other writer and recompute
+it when marks or total change. Databases created before the column
+existed are back-filled in batches.
+
+The statistics below work on a frame of per-assessment percentages,
+kept in the shared result cache until the school's assessments or
+students change. Grouping is by any mix of subject, grade and term.
+Group statistics, z-scores and percentiles are each a single groupby pass.
+"""
+import numpy as np
+import pandas as pd
+
+from jengahub_cache import cached
+from jengahub_cdc import data_version
+from jengahub_db import database_path
+from jengahub_frames import read_frame
+from jengahub_terms import TERMS
+
+PERCENTAGE_SQL = "CASE WHEN total > 0 THEN marks * 100.0 / total END"
+BACKFILL_BATCH = 5000
+
+GROUPINGS = {
+    'subject': ['subject'],
+    'grade': ['grade'],
+    'grade_subject': ['grade', 'subject'],
+    'term': ['term'],
+    'term_subject': ['term', 'subject'],
+}
+
+SCORES_SCHEMA = [
+    # Covers the per-school, per-period score reads
+    "CREATE INDEX IF NOT EXISTS idx_assessments_scores ON assessments(school_id, date, subject, student_id, percentage)",
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_scores_assessments_insert AFTER INSERT ON assessments
+    WHEN NEW.percentage IS NULL AND NEW.total > 0
+    BEGIN
+        UPDATE assessments SET percentage = {PERCENTAGE_SQL} WHERE assessment_id = NEW.assessment_id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_scores_assessments_update AFTER UPDATE OF marks, total ON assessments
+    BEGIN
+        UPDATE assessments SET percentage = {PERCENTAGE_SQL} WHERE assessment_id = NEW.assessment_id;
+    END
+    ''',
+]
+
+
+def percentage(marks, total):
+    # The value writers store with a new assessment
+    return marks * 100.0 / total if total else None
+
+
+def backfill_percentages(conn, batch_size=BACKFILL_BATCH):
+    # Fills in missing percentages a batch per transaction, so a large
+    # table does not hold the write lock for the whole pass. Unmarked rows
+    # have no percentage to fill in and are left alone.
+    filled = 0
+    while True:
+        count = conn.execute(f'''
+            UPDATE assessments SET percentage = {PERCENTAGE_SQL}
+            WHERE assessment_id IN (
+                SELECT assessment_id FROM assessments
+                WHERE percentage IS NULL AND total > 0 AND marks IS NOT NULL LIMIT ?
+            )
+        ''', (batch_size,)).rowcount
+        conn.commit()
+        filled += count
+        if count < batch_size:
+            return filled
+
+
+def init_scores(conn):
+    for statement in SCORES_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    backfill_percentages(conn)
+
+
+# ===================== STATISTICS =====================
+def _term_labels(dates):
+    # Vectorised jengahub_terms.term_label
+    months = dates.dt.month
+    terms = np.select([months.between(first, last) for first, last in TERMS.values()], list(TERMS), default='')
+    return dates.dt.year.astype('Int64').astype(str) + '-' + pd.Series(terms, index=dates.index)
+
+
+def load_scores(conn, school_id, start, end):
+    # One row per assessment with a percentage, with the student's grade and term
+    scores = read_frame('''
+        SELECT a.assessment_id, a.student_id, s.name, s.grade, a.subject, a.date, a.marks, a.total, a.percentage
+        FROM assessments a LEFT JOIN students s ON s.student_id = a.student_id
+        WHERE a.school_id = ? AND a.date BETWEEN ? AND ? AND a.percentage IS NOT NULL
+    ''', conn, params=(int(school_id), str(start), str(end)))
+    scores['term'] = _term_labels(scores['date']).astype('category')
+    return scores
+
+
+def school_scores(conn, school_id, start, end):
+    # Cached load_scores
+    return cached('scores', (database_path(conn), int(school_id), start, end),
+                  data_version(conn, school_id, ['assessments', 'students']),
+                  lambda: load_scores(conn, school_id, start, end))
+
+
+def score_stats(scores, by=('subject',)):
+    # count, mean, std, min, quartiles and max of the percentages per group
+    columns = ['count', 'mean', 'std', 'min', 'p25', 'median', 'p75', 'max']
+    if scores.empty:
+        return pd.DataFrame(columns=list(by) + columns)
+    stats = scores.groupby(list(by), observed=True)['percentage'].describe()
+    stats.columns = columns
+    stats['count'] = stats['count'].astype('int64')
+    return stats.reset_index()
+
+
+def standardize(scores, by=('subject',)):
+    # Adds each assessment's z-score within its group and its percentile
+    # (share of the group scoring at or below it). Single-score groups
+    # have no spread, so their z-score is 0.
+    groups = scores.groupby(list(by), observed=True)['percentage']
+    spread = groups.transform('std')
+    scores = scores.copy()
+    scores['z_score'] = ((scores['percentage'] - groups.transform('mean')) / spread.where(spread > 0)).fillna(0.0)
+    scores['percentile'] = groups.rank(method='max', pct=True) * 100
+    return scores
@@ -0,0 +1,204 @@
+"""Full-text search over attendance behaviour comments.
+
+attendance_comments is an FTS5 index over attendance.behaviour_comment,
+stored as an external-content table so the text lives only in attendance.
+Triggers keep it in step with inserts, edits and deletes. Only rows with a
+comment are indexed. Words are stemmed (porter), so "fight" also finds
+"fighting" and "fights". Results are ranked with bm25, best match first,
+among the most recent RANK_WINDOW matches within the filters.
+
+    python3 jengahub_search.py search "bullying fight" --school 1
+    python3 jengahub_search.py rebuild
+"""
+import argparse
+import re
+import sqlite3
+import time
+
+import pandas as pd
+
+from jengahub_db import DB_PATH, connect
+
+SEARCH_LIMIT = 200
+# Matching comments ranked per search, most recent first
+RANK_WINDOW = 1000
+
+# Highlight markers; control characters cannot come from the forms
+MARK_START, MARK_END = '\x02', '\x03'
+
+SEARCH_TABLE = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS attendance_comments USING fts5(
+        behaviour_comment,
+        content='attendance',
+        content_rowid='attendance_id',
+        tokenize='porter unicode61'
+    )
+'''
+
+SEARCH_TRIGGERS = {
+    'trg_search_attendance_insert': '''
+        CREATE TRIGGER trg_search_attendance_insert AFTER INSERT ON attendance
+        WHEN NEW.behaviour_comment <> ''
+        BEGIN
+            INSERT INTO attendance_comments (rowid, behaviour_comment)
+            VALUES (NEW.attendance_id, NEW.behaviour_comment);
+        END
+    ''',
+    'trg_search_attendance_delete': '''
+        CREATE TRIGGER trg_search_attendance_delete AFTER DELETE ON attendance
+        WHEN OLD.behaviour_comment <> ''
+        BEGIN
+            INSERT INTO attendance_comments (attendance_comments, rowid, behaviour_comment)
+            VALUES ('delete', OLD.attendance_id, OLD.behaviour_comment);
+        END
+    ''',
+    # One trigger, so the old text is always removed before the new is added
+    'trg_search_attendance_update': '''
+        CREATE TRIGGER trg_search_attendance_update AFTER UPDATE OF behaviour_comment ON attendance
+        BEGIN
+            INSERT INTO attendance_comments (attendance_comments, rowid, behaviour_comment)
+            SELECT 'delete', OLD.attendance_id, OLD.behaviour_comment WHERE OLD.behaviour_comment <> '';
+            INSERT INTO attendance_comments (rowid, behaviour_comment)
+            SELECT NEW.attendance_id, NEW.behaviour_comment WHERE NEW.behaviour_comment <> '';
+        END
+    ''',
+}
+
+
+def rebuild_search(conn):
+    # Re-indexes every comment; used when the triggers were missing
+    conn.execute("INSERT INTO attendance_comments (attendance_comments) VALUES ('delete-all')")
+    conn.execute('''
+        INSERT INTO attendance_comments (rowid, behaviour_comment)
+        SELECT attendance_id, behaviour_comment FROM attendance WHERE behaviour_comment <> ''
+    ''')
+    conn.commit()
+
+
+def init_search(conn):
+    # The triggers are dropped with the attendance table (e.g. by a system
+    # reset), so missing triggers mean the index can no longer be trusted
+    conn.execute(SEARCH_TABLE)
+    existing = {name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='trigger' AND tbl_name='attendance'"
+    )}
+    missing = [name for name in SEARCH_TRIGGERS if name not in existing]
+    for name in missing:
+        conn.execute(SEARCH_TRIGGERS[name])
+    if missing:
+        rebuild_search(conn)
+    conn.commit()
+
+
+# ===================== QUERIES =====================
+def match_query(text):
+    # Turns what a user types into an FTS5 query: any of the words, with
+    # "quoted phrases" kept together and a trailing * as a prefix match.
+    # Everything is quoted, so punctuation cannot break the query syntax.
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        value = (phrase or word).strip()
+        prefix = bool(word) and value.endswith('*')
+        value = value.rstrip('*').replace('"', '""')
+        if value:
+            terms.append(f'"{value}"' + ('*' if prefix else ''))
+    return ' OR '.join(terms)
+
+
+def search_comments(conn, text, school_id, start=None, end=None, grade=None, limit=SEARCH_LIMIT,
+                    window=RANK_WINDOW):
+    # Best matches first; the comment comes back with MARK_START/MARK_END
+    # around each matched term. bm25 is only computed for the `window` most
+    # recent matching comments: a common word can match a large share of
+    # millions of comments, and ranking them all takes most of a second.
+    query = match_query(text)
+    columns = ['attendance_id', 'date', 'student_id', 'name', 'grade', 'status', 'behaviour_score',
+               'comment', 'score']
+    if not query:
+        return pd.DataFrame(columns=columns)
+    matches = '''
+        FROM attendance_comments
+        JOIN attendance a ON a.attendance_id = attendance_comments.rowid
+        LEFT JOIN students s ON s.student_id = a.student_id
+        WHERE attendance_comments MATCH ? AND a.school_id = ?
+    '''
+    params = [query, int(school_id)]
+    if start is not None:
+        matches += " AND a.date >= ?"
+        params.append(str(start))
+    if end is not None:
+        matches += " AND a.date <= ?"
+        params.append(str(end))
+    if grade is not None:
+        matches += " AND s.grade = ?"
+        params.append(grade)
+
+    # Matches come out of the index in rowid order, so the window's oldest
+    # rowid is found without ranking anything
+    oldest = conn.execute(
+        "SELECT attendance_comments.rowid " + matches + " ORDER BY attendance_comments.rowid DESC LIMIT 1 OFFSET ?",
+        params + [window - 1]
+    ).fetchone()
+    if oldest is not None:
+        matches += " AND attendance_comments.rowid >= ?"
+        params.append(oldest[0])
+
+    sql = f'''
+        SELECT a.attendance_id, a.date, a.student_id, s.name, s.grade, a.status, a.behaviour_score,
+               highlight(attendance_comments, 0, '{MARK_START}', '{MARK_END}') AS comment,
+               -bm25(attendance_comments) AS score
+    ''' + matches + " ORDER BY attendance_comments.rank LIMIT ?"
+    return pd.read_sql_query(sql, conn, params=params + [limit])
+
+
+def escape_markdown(text):
+    return re.sub(r'([\\`*_{}\[\]()#+\-.!|<>~:$])', r'\\\1', str(text or ''))
+
+
+def highlight_markdown(comment):
+    # Escapes Markdown in the comment, then bolds the matched terms
+    return escape_markdown(comment).replace(MARK_START, '**').replace(MARK_END, '**')
+
+
+def main(argv=None):
+    from jengahub_shards import SHARD_DIR, open_router
+
+    parser = argparse.ArgumentParser(description="Search behaviour comments")
+    commands = parser.add_subparsers(dest='command', required=True)
+    search = commands.add_parser('search', help="print the best-matching comments for a school")
+    search.add_argument('text')
+    search.add_argument('--school', type=int, required=True)
+    search.add_argument('--start', default=None)
+    search.add_argument('--end', default=None)
+    search.add_argument('--grade', default=None)
+    search.add_argument('--limit', type=int, default=20)
+    for command in (search, commands.add_parser('rebuild', help="re-index every comment")):
+        command.add_argument('--db', default=DB_PATH)
+        command.add_argument('--shard-dir', default=SHARD_DIR)
+    args = parser.parse_args(argv)
+
+    catalog = connect(args.db)
+    db = open_router(catalog, args.shard_dir)
+    if args.command == 'rebuild':
+        for path, conn in db.connections():
+            init_search(conn)
+            started = time.perf_counter()
+            rebuild_search(conn)
+            print(f"{path}: re-indexed in {time.perf_counter() - started:.2f}s")
+        return
+
+    conn = db.connection(args.school)
+    started = time.perf_counter()
+    try:
+        results = search_comments(conn, args.text, args.school, args.start, args.end, args.grade, args.limit)
+    except sqlite3.OperationalError as e:
+        parser.error(f"search index not available ({e}); run the app once or `rebuild`")
+    seconds = time.perf_counter() - started
+    for row in results.itertuples():
+        comment = row.comment.replace(MARK_START, '[').replace(MARK_END, ']')
+        print(f"{row.score:6.2f}  {row.date}  {row.name} ({row.grade}): {comment}")
+    print(f"{len(results)} results in {seconds * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
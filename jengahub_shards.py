@@ -0,0 +1,194 @@
+"""Optional per-school sharding.
+
+In sharded mode (JENGAHUB_SHARD_DIR set) the main database file is only a
+catalog holding `schools`; each school's students, teachers, assignments,
+attendance and assessments live in `<shard dir>/school_<id>.db`. Pages ask
+the router for a school's connection, and cross-school views fan out over
+every shard. Without a shard directory the same interface is served by the
+single database, so callers never need to know which mode is active.
+
+    python3 jengahub_shards.py split school_management.db shards/
+"""
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from jengahub_db import CORE_TABLES, DB_PATH, connect, database_path, init_database
+
+SHARD_DIR = os.environ.get('JENGAHUB_SHARD_DIR')
+
+# Each shard's AUTOINCREMENT ids start at school_id * ID_BLOCK so ids stay
+# unique across shards (and match the ids of a split single database)
+ID_BLOCK = 1000000000
+SHARDED_TABLES = [t for t in CORE_TABLES if t != 'schools']
+
+# Shards whose schema has been set up by this process
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def shard_path(shard_dir, school_id):
+    return os.path.join(shard_dir, f"school_{int(school_id)}.db")
+
+
+def _prepare_shard(conn, path, school_id, name):
+    path = os.path.abspath(path)
+    with _init_lock:
+        if path in _initialized:
+            return
+        init_database(conn)
+        conn.execute("INSERT OR IGNORE INTO schools (school_id, name) VALUES (?, ?)", (int(school_id), name))
+        for table in SHARDED_TABLES:
+            conn.execute(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name=?)",
+                (table, int(school_id) * ID_BLOCK, table)
+            )
+        conn.commit()
+        _initialized.add(path)
+
+
+class SingleDatabase:
+    # Unsharded mode: every school lives in the one connection
+    sharded = False
+
+    def __init__(self, conn):
+        self.catalog = conn
+
+    def connection(self, school_id):
+        return self.catalog
+
+    def connections(self):
+        return [(None, self.catalog)]
+
+    def fan_out(self, sql, params=()):
+        return pd.read_sql_query(sql, self.catalog, params=params)
+
+    def paths(self):
+        return [database_path(self.catalog)]
+
+    def drop_shards(self):
+        pass
+
+
+class ShardRouter:
+    sharded = True
+
+    def __init__(self, catalog, shard_dir, max_workers=4):
+        self.catalog = catalog
+        self.shard_dir = shard_dir
+        self.max_workers = max_workers
+        self._conns = {}
+        os.makedirs(shard_dir, exist_ok=True)
+
+    def schools(self):
+        return self.catalog.execute("SELECT school_id, name FROM schools ORDER BY school_id").fetchall()
+
+    def connection(self, school_id):
+        school_id = int(school_id)
+        if school_id not in self._conns:
+            row = self.catalog.execute("SELECT name FROM schools WHERE school_id=?", (school_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown school_id {school_id}")
+            path = shard_path(self.shard_dir, school_id)
+            conn = connect(path)
+            _prepare_shard(conn, path, school_id, row[0])
+            self._conns[school_id] = conn
+        return self._conns[school_id]
+
+    def connections(self):
+        return [(school_id, self.connection(school_id)) for school_id, _ in self.schools()]
+
+    def fan_out(self, sql, params=()):
+        # Runs the same query on every shard (on fresh connections, in
+        # parallel) and concatenates the results
+        def run(school_id):
+            conn = connect(shard_path(self.shard_dir, school_id))
+            try:
+                return pd.read_sql_query(sql, conn, params=params)
+            finally:
+                conn.close()
+
+        school_ids = [school_id for school_id, _ in self.schools()]
+        for school_id in school_ids:
+            self.connection(school_id)
+        if not school_ids:
+            return pd.read_sql_query(sql, self.catalog, params=params).iloc[0:0]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            frames = list(pool.map(run, school_ids))
+        return pd.concat(frames, ignore_index=True)
+
+    def paths(self):
+        return [shard_path(self.shard_dir, school_id) for school_id, _ in self.schools()]
+
+    def drop_shards(self):
+        # Used by a full system reset: school ids may be reused afterwards
+        from jengahub_writer import close_writer
+
+        for conn in self._conns.values():
+            conn.close()
+        self._conns.clear()
+        for name in os.listdir(self.shard_dir):
+            if name.startswith('school_') and name.endswith('.db'):
+                path = os.path.join(self.shard_dir, name)
+                close_writer(path)
+                os.remove(path)
+                _initialized.discard(os.path.abspath(path))
+
+
+def open_router(catalog, shard_dir=SHARD_DIR):
+    if shard_dir:
+        return ShardRouter(catalog, shard_dir)
+    return SingleDatabase(catalog)
+
+
+# ===================== MIGRATION =====================
+def split_database(source_path, shard_dir, prune=False):
+    # Copies each school's rows from a single database into its own shard.
+    # With prune, the copied rows are then removed from the source, which
+    # becomes the catalog.
+    source = connect(source_path)
+    init_database(source)
+    router = ShardRouter(source, shard_dir)
+    counts = {}
+    for school_id, name in router.schools():
+        shard = router.connection(school_id)
+        shard.execute("ATTACH DATABASE ? AS source", (source_path,))
+        try:
+            for table in SHARDED_TABLES:
+                shard.execute(
+                    f"INSERT OR IGNORE INTO main.{table} SELECT * FROM source.{table} WHERE school_id=?",
+                    (school_id,)
+                )
+            shard.commit()
+        finally:
+            shard.execute("DETACH DATABASE source")
+        counts[name] = shard.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+
+    if prune:
+        for table in SHARDED_TABLES:
+            source.execute(f"DELETE FROM {table}")
+        source.commit()
+    source.close()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-school sharding for Jenga Hub PMS")
+    commands = parser.add_subparsers(dest='command', required=True)
+    split = commands.add_parser('split', help="copy each school into its own shard file")
+    split.add_argument('source', nargs='?', default=DB_PATH)
+    split.add_argument('shard_dir')
+    split.add_argument('--prune', action='store_true', help="remove copied rows from the source afterwards")
+    args = parser.parse_args(argv)
+
+    counts = split_database(args.source, args.shard_dir, prune=args.prune)
+    for name, students in counts.items():
+        print(f"{name}: {students} students")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+"""Offline capture and delta sync between a field device and the central database.
+
+A device works on its own copy of the database (run the app with
+JENGAHUB_DB=device.db). Triggers record every attendance and assessment
+write in sync_changes together with its natural key, so when the device
+is back online all pending changes are pushed to the central database in
+one compressed batch and everything new on the central side is pulled back
+the same way. Deleting the last row with a natural key (or changing a row's
+key away from it) records a tombstone, which deletes the key's rows on the
+other side. Conflicts on a natural key are resolved last-writer-wins,
+deletes included.
+
+    python3 jengahub_sync.py clone school_management.db device.db
+    python3 jengahub_sync.py sync device.db school_management.db
+"""
+import argparse
+import json
+import sqlite3
+import uuid
+import zlib
+
+from jengahub_db import connect, init_schema
+
+# table -> (natural key columns, data columns)
+SYNC_TABLES = {
+    'attendance': (['student_id', 'date'], ['school_id', 'status', 'behaviour_score', 'behaviour_comment']),
+    'assessments': (['student_id', 'date', 'subject'], ['school_id', 'marks', 'total', 'grade']),
+}
+
+MAX_BATCH_CHANGES = 100000
+
+SYNC_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS sync_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS sync_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT,
+        natural_key TEXT,
+        payload TEXT,
+        updated_at TEXT,
+        origin TEXT
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_sync_changes_key ON sync_changes(table_name, natural_key)",
+]
+
+
+def _trigger_sql(table, event):
+    key_columns, data_columns = SYNC_TABLES[table]
+    natural_key = 'json_array(' + ', '.join(f'NEW.{c}' for c in key_columns) + ')'
+    payload = 'json_object(' + ', '.join(f"'{c}', NEW.{c}" for c in key_columns + data_columns) + ')'
+    return f'''
+    CREATE TRIGGER IF NOT EXISTS trg_sync_{table}_{event.lower()} AFTER {event} ON {table}
+    WHEN (SELECT value FROM sync_state WHERE key='applying') IS NULL
+    BEGIN
+        INSERT INTO sync_changes (table_name, natural_key, payload, updated_at, origin)
+        VALUES ('{table}', {natural_key}, {payload},
+                strftime('%Y-%m-%dT%H:%M:%f', 'now'),
+                (SELECT value FROM sync_state WHERE key='node_id'));
+    END
+    '''
+
+
+def _tombstone_sql(table, event):
+    # A key is only deleted remotely once no local row has it any more
+    key_columns, _ = SYNC_TABLES[table]
+    natural_key = 'json_array(' + ', '.join(f'OLD.{c}' for c in key_columns) + ')'
+    gone = f"NOT EXISTS (SELECT 1 FROM {table} WHERE {' AND '.join(f'{c} IS OLD.{c}' for c in key_columns)})"
+    if event == 'UPDATE':
+        gone = f"({' OR '.join(f'OLD.{c} IS NOT NEW.{c}' for c in key_columns)}) AND {gone}"
+    return f'''
+    CREATE TRIGGER IF NOT EXISTS trg_sync_{table}_{event.lower()}_tombstone AFTER {event} ON {table}
+    WHEN (SELECT value FROM sync_state WHERE key='applying') IS NULL AND {gone}
+    BEGIN
+        INSERT INTO sync_changes (table_name, natural_key, payload, updated_at, origin)
+        VALUES ('{table}', {natural_key}, NULL,
+                strftime('%Y-%m-%dT%H:%M:%f', 'now'),
+                (SELECT value FROM sync_state WHERE key='node_id'));
+    END
+    '''
+
+
+def init_sync(conn, node_id=None):
+    for statement in SYNC_SCHEMA:
+        conn.execute(statement)
+    for table in SYNC_TABLES:
+        for event in ('INSERT', 'UPDATE'):
+            conn.execute(_trigger_sql(table, event))
+        for event in ('UPDATE', 'DELETE'):
+            conn.execute(_tombstone_sql(table, event))
+    # A node keeps its id for life; clones get a fresh one
+    conn.execute("INSERT OR IGNORE INTO sync_state (key, value) VALUES ('node_id', ?)",
+                 (node_id or uuid.uuid4().hex,))
+    conn.execute("DELETE FROM sync_state WHERE key='applying'")
+    conn.commit()
+
+
+def node_id(conn):
+    return conn.execute("SELECT value FROM sync_state WHERE key='node_id'").fetchone()[0]
+
+
+def _get_state(conn, key, default=None):
+    row = conn.execute("SELECT value FROM sync_state WHERE key=?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_state(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+# ===================== BATCHES =====================
+def make_batch(conn, since_seq=0, only_origin=None, exclude_origin=None, limit=MAX_BATCH_CHANGES):
+    # Changes after since_seq, reduced to the latest change per natural key,
+    # as one zlib-compressed JSON document: upserted rows under 'tables' and
+    # deleted keys under 'deleted'. Returns (blob, last_seq).
+    sql = "SELECT seq, table_name, natural_key, payload, updated_at, origin FROM sync_changes WHERE seq > ?"
+    params = [since_seq]
+    if only_origin is not None:
+        sql += " AND origin = ?"
+        params.append(only_origin)
+    if exclude_origin is not None:
+        sql += " AND origin IS NOT ?"
+        params.append(exclude_origin)
+    sql += " ORDER BY seq LIMIT ?"
+    params.append(limit)
+    rows = conn.execute(sql, params).fetchall()
+
+    latest = {}
+    for seq, table, natural_key, payload, updated_at, origin in rows:
+        latest[(table, natural_key)] = (payload, updated_at, origin)
+
+    tables, deleted = {}, {}
+    for (table, natural_key), (payload, updated_at, origin) in latest.items():
+        key_columns, data_columns = SYNC_TABLES[table]
+        if payload is None:
+            deleted.setdefault(table, []).append(json.loads(natural_key) + [updated_at, origin])
+            continue
+        values = json.loads(payload)
+        tables.setdefault(table, []).append(
+            [values[c] for c in key_columns + data_columns] + [updated_at, origin]
+        )
+
+    last_seq = rows[-1][0] if rows else since_seq
+    document = {
+        'source': node_id(conn),
+        'last_seq': last_seq,
+        'columns': {t: SYNC_TABLES[t][0] + SYNC_TABLES[t][1] for t in tables},
+        'tables': tables,
+        'deleted': deleted,
+    }
+    return zlib.compress(json.dumps(document, separators=(',', ':')).encode(), 9), last_seq
+
+
+def _local_is_newer(conn, table, natural_key, updated_at, origin):
+    local = conn.execute(
+        "SELECT updated_at, origin FROM sync_changes WHERE table_name=? AND natural_key=? "
+        "ORDER BY updated_at DESC, origin DESC LIMIT 1",
+        (table, natural_key)
+    ).fetchone()
+    return local is not None and (local[0], local[1] or '') >= (updated_at, origin or '')
+
+
+def apply_batch(conn, blob):
+    # Upserts each change on its natural key, or deletes the key's rows for a
+    # tombstone, unless the local copy of that key was changed more
+    # recently. Returns (applied, skipped).
+    document = json.loads(zlib.decompress(blob))
+    applied = skipped = 0
+    with conn:
+        _set_state(conn, 'applying', 1)
+        for table, rows in document.get('deleted', {}).items():
+            key_columns, _ = SYNC_TABLES[table]
+            for row in rows:
+                key_values, (updated_at, origin) = row[:-2], row[-2:]
+                natural_key = json.dumps(key_values, separators=(',', ':'), ensure_ascii=False)
+                if _local_is_newer(conn, table, natural_key, updated_at, origin):
+                    skipped += 1
+                    continue
+                conn.execute(f"DELETE FROM {table} WHERE {' AND '.join(f'{c}=?' for c in key_columns)}", key_values)
+                conn.execute(
+                    "INSERT INTO sync_changes (table_name, natural_key, payload, updated_at, origin) "
+                    "VALUES (?, ?, NULL, ?, ?)",
+                    (table, natural_key, updated_at, origin)
+                )
+                applied += 1
+        for table, rows in document['tables'].items():
+            key_columns, data_columns = SYNC_TABLES[table]
+            key_where = ' AND '.join(f'{c}=?' for c in key_columns)
+            columns = key_columns + data_columns
+            for row in rows:
+                values, (updated_at, origin) = row[:-2], row[-2:]
+                key_values = values[:len(key_columns)]
+                natural_key = json.dumps(key_values, separators=(',', ':'), ensure_ascii=False)
+                if _local_is_newer(conn, table, natural_key, updated_at, origin):
+                    skipped += 1
+                    continue
+
+                data = dict(zip(columns, values))
+                cursor = conn.execute(
+                    f"UPDATE {table} SET {', '.join(f'{c}=?' for c in data_columns)} WHERE {key_where}",
+                    [data[c] for c in data_columns] + key_values
+                )
+                if cursor.rowcount == 0:
+                    conn.execute(
+                        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        values
+                    )
+                conn.execute(
+                    "INSERT INTO sync_changes (table_name, natural_key, payload, updated_at, origin) VALUES (?, ?, ?, ?, ?)",
+                    (table, natural_key, json.dumps(data), updated_at, origin)
+                )
+                applied += 1
+        conn.execute("DELETE FROM sync_state WHERE key='applying'")
+    return applied, skipped
+
+
+# ===================== DEVICE <-> CENTRAL =====================
+def clone_for_device(central_path, device_path):
+    # Snapshot of the central database for a device to work on offline
+    central = connect(central_path)
+    init_schema(central)
+    init_sync(central)
+    device = sqlite3.connect(device_path)
+    with device:
+        central.backup(device)
+    central_id = node_id(central)
+    central_seq = central.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_changes").fetchone()[0]
+    central.close()
+
+    device.execute("DELETE FROM sync_state")
+    device.commit()
+    init_sync(device)
+    device_seq = device.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_changes").fetchone()[0]
+    _set_state(device, f'pulled:{central_id}', central_seq)
+    _set_state(device, f'pushed:{central_id}', device_seq)
+    device.commit()
+    device.close()
+
+
+def sync(device, central):
+    # One push and one pull. Works on two open connections; over a network
+    # the two blobs are the only things that need to travel.
+    init_sync(central)
+    init_sync(device)
+    device_id, central_id = node_id(device), node_id(central)
+
+    pushed_seq = int(_get_state(device, f'pushed:{central_id}', 0))
+    push_blob, push_last = make_batch(device, pushed_seq, only_origin=device_id)
+    pushed = apply_batch(central, push_blob)
+    with device:
+        _set_state(device, f'pushed:{central_id}', push_last)
+
+    pulled_seq = int(_get_state(device, f'pulled:{central_id}', 0))
+    pull_blob, pull_last = make_batch(central, pulled_seq, exclude_origin=device_id)
+    pulled = apply_batch(device, pull_blob)
+    with device:
+        _set_state(device, f'pulled:{central_id}', pull_last)
+
+    return {
+        'pushed': pushed[0], 'push_conflicts': pushed[1], 'push_bytes': len(push_blob),
+        'pulled': pulled[0], 'pull_conflicts': pulled[1], 'pull_bytes': len(pull_blob),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline device sync for Jenga Hub PMS")
+    commands = parser.add_subparsers(dest='command', required=True)
+    clone = commands.add_parser('clone', help="create a device copy of the central database")
+    clone.add_argument('central')
+    clone.add_argument('device')
+    run = commands.add_parser('sync', help="push device changes and pull central changes")
+    run.add_argument('device')
+    run.add_argument('central')
+    args = parser.parse_args(argv)
+
+    if args.command == 'clone':
+        clone_for_device(args.central, args.device)
+        print(f"Device copy written to {args.device}")
+    else:
+        device, central = connect(args.device), connect(args.central)
+        try:
+            stats = sync(device, central)
+        finally:
+            device.close()
+            central.close()
+        print(', '.join(f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Paged list views: filtering, sorting and paging run in SQL.
+
+A page is fetched by keyset on (sort column, primary key) rather than by
+OFFSET, so reading page 500 costs the same as page 1, and only the visible
+rows plus a COUNT(*) of the matching rows ever leave the database.
+"""
+import pandas as pd
+import streamlit as st
+
+PAGE_SIZE = 25
+PAGE_SIZES = [25, 50, 100]
+
+# view -> (table, primary key, columns shown, text columns the filter box searches)
+LIST_VIEWS = {
+    'schools': ('schools', 'school_id', ['school_id', 'name'], ['name']),
+    'teachers': ('teachers', 'teacher_id',
+                 ['teacher_id', 'name', 'email', 'phone', 'subject', 'qualification', 'join_date', 'status'],
+                 ['name', 'email', 'subject', 'qualification', 'status']),
+    'students': ('students', 'student_id',
+                 ['student_id', 'name', 'age', 'grade', 'parent_name', 'parent_contact'],
+                 ['name', 'grade', 'parent_name', 'parent_contact']),
+    'teacher_assignments': ('teacher_assignments', 'assignment_id',
+                            ['assignment_id', 'teacher_id', 'class_grade', 'subject', 'academic_year'],
+                            ['class_grade', 'subject', 'academic_year']),
+}
+
+
+# ===================== QUERIES =====================
+def _where(view, where=None, search=None):
+    searchable = LIST_VIEWS[view][3]
+    clauses, params = [], []
+    for column, value in (where or {}).items():
+        clauses.append(f"{column} IS NULL" if value is None else f"{column} = ?")
+        if value is not None:
+            params.append(value)
+    if search:
+        pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        clauses.append('(' + ' OR '.join(f"{column} LIKE ? ESCAPE '\\'" for column in searchable) + ')')
+        params += [pattern] * len(searchable)
+    return clauses, params
+
+
+def _order(view, sort=None):
+    # Sort terms, primary key last. NULLs sort after values (before them when
+    # descending) without breaking the row-value comparison.
+    key = LIST_VIEWS[view][1]
+    if sort is None or sort == key:
+        return [key]
+    return [f"{sort} IS NULL", f"IFNULL({sort}, 0)", key]
+
+
+def count_rows(conn, view, where=None, search=None):
+    table = LIST_VIEWS[view][0]
+    clauses, params = _where(view, where, search)
+    sql = f"SELECT COUNT(*) FROM {table}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    return conn.execute(sql, params).fetchone()[0]
+
+
+def table_page(conn, view, where=None, search=None, sort=None, descending=False, after=None, limit=PAGE_SIZE):
+    # One page of rows. `after` is the cursor returned with the previous
+    # page; returns (rows, next_cursor), next_cursor None on the last page.
+    table, key, columns, _ = LIST_VIEWS[view]
+    if sort is not None and sort not in columns:
+        raise ValueError(f"Cannot sort {view} by {sort}")
+    terms = _order(view, sort)
+    clauses, params = _where(view, where, search)
+    if after is not None:
+        clauses.append(f"({', '.join(terms)}) {'<' if descending else '>'} ({', '.join('?' * len(terms))})")
+        params += list(after)
+
+    # The sort terms come back as _k0, _k1, ... to build the next cursor from
+    cursor_columns = [f'_k{i}' for i in range(len(terms))]
+    sql = (f"SELECT {', '.join(f'{term} AS {name}' for term, name in zip(terms, cursor_columns))}, "
+           f"{', '.join(columns)} FROM {table}")
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    direction = " DESC" if descending else ""
+    sql += " ORDER BY " + ", ".join(term + direction for term in terms) + " LIMIT ?"
+    params.append(limit + 1)
+
+    rows = pd.read_sql_query(sql, conn, params=params)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows.iloc[:limit]
+        next_cursor = tuple(rows.iloc[-1][cursor_columns].tolist())
+    return rows[columns].reset_index(drop=True), next_cursor
+
+
+# ===================== STREAMLIT RENDERING =====================
+def paged_table(conn, view, key, where=None, page_size=PAGE_SIZE):
+    # Filter box, sort controls, the current page and Previous/Next buttons.
+    # Returns the visible page so callers can offer row actions on it.
+    columns = LIST_VIEWS[view][2]
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    with col1:
+        search = st.text_input("Filter", key=f"{key}_search", placeholder="Search...").strip()
+    with col2:
+        sort = st.selectbox("Sort by", columns, key=f"{key}_sort")
+    with col3:
+        descending = st.checkbox("Descending", key=f"{key}_desc")
+    with col4:
+        page_size = st.selectbox("Rows", PAGE_SIZES, index=PAGE_SIZES.index(page_size), key=f"{key}_size")
+
+    # Cursor stack for Previous; starts over whenever the query changes
+    query = (view, tuple(sorted((where or {}).items())), search, sort, descending, page_size)
+    state = st.session_state.get(f"{key}_pages")
+    if state is None or state['query'] != query:
+        state = st.session_state[f"{key}_pages"] = {'query': query, 'cursors': [None]}
+    cursors = state['cursors']
+
+    total = count_rows(conn, view, where, search)
+    rows, next_cursor = table_page(conn, view, where, search, sort, descending, cursors[-1], page_size)
+    if rows.empty:
+        st.info("No matching records.")
+        return rows
+
+    st.dataframe(rows, hide_index=True)
+    first = (len(cursors) - 1) * page_size
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        st.caption(f"Rows {first + 1:,}-{first + len(rows):,} of {total:,}")
+    with col2:
+        if len(cursors) > 1 and st.button("⬅️ Previous", key=f"{key}_prev"):
+            cursors.pop()
+            st.rerun()
+    with col3:
+        if next_cursor is not None and st.button("Next ➡️", key=f"{key}_next"):
+            cursors.append(next_cursor)
+            st.rerun()
+    return rows
@@ -0,0 +1,51 @@
+"""School term calendar helpers. Terms are labelled like '2025-T1'."""
+from datetime import date, datetime, timedelta
+
+# (first month, last month) of each term
+TERMS = {
+    'T1': (1, 4),
+    'T2': (5, 8),
+    'T3': (9, 12),
+}
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def term_label(value):
+    d = _as_date(value)
+    for term, (first, last) in TERMS.items():
+        if first <= d.month <= last:
+            return f"{d.year}-{term}"
+
+
+def term_bounds(label):
+    year, term = label.split('-')
+    first, last = TERMS[term]
+    start = date(int(year), first, 1)
+    if last == 12:
+        end = date(int(year), 12, 31)
+    else:
+        end = date(int(year), last + 1, 1) - timedelta(days=1)
+    return start, end
+
+
+def current_term(today=None):
+    return term_label(today or date.today())
+
+
+def previous_term(label):
+    start, _ = term_bounds(label)
+    return term_label(start - timedelta(days=1))
+
+
+def recent_terms(count, today=None):
+    labels = [current_term(today)]
+    while len(labels) < count:
+        labels.append(previous_term(labels[-1]))
+    return labels
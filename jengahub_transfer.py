@@ -0,0 +1,112 @@
+"""Bulk data transfer: CSV imports into a school and the full-school workbook.
+
+import_csv adds rows from a CSV file to one of a school's tables. Columns
+the table does not have are ignored, the school comes from the caller,
+and attendance and assessment rows for students outside the school are
+skipped. Rows are written in committed batches, so a large import does
+not hold the write lock for its whole length. Imports do not queue parent
+notifications; they are for records made elsewhere.
+
+export_workbook writes the Excel workbook the Export Data page offers:
+one sheet per table plus a summary sheet.
+"""
+import pandas as pd
+
+from jengahub_frames import CHUNK_SIZE, read_frame
+
+IMPORT_BATCH = 5000
+
+# Columns an imported file must have, per table
+IMPORT_TABLES = {
+    'students': ['name'],
+    'teachers': ['name'],
+    'teacher_assignments': ['teacher_id', 'class_grade', 'subject'],
+    'attendance': ['student_id', 'date', 'status'],
+    'assessments': ['student_id', 'date', 'subject', 'marks', 'total'],
+}
+
+EXPORT_SHEETS = {
+    'Students': 'students',
+    'Attendance': 'attendance',
+    'Assessments': 'assessments',
+    'Teachers': 'teachers',
+    'Assignments': 'teacher_assignments',
+}
+
+
+def _columns(conn, table):
+    # Every column but the primary key
+    return [name for _, name, _, _, _, pk in conn.execute(f"PRAGMA table_info({table})") if not pk]
+
+
+def import_csv(conn, table, school_id, path, batch_size=IMPORT_BATCH):
+    # Returns (imported, skipped) row counts
+    if table not in IMPORT_TABLES:
+        raise ValueError(f"Cannot import into {table}; choose from {', '.join(IMPORT_TABLES)}")
+    school_id = int(school_id)
+    known = set(_columns(conn, table))
+    imported = skipped = 0
+    for chunk in pd.read_csv(path, chunksize=batch_size, dtype=str, keep_default_na=False):
+        missing = [column for column in IMPORT_TABLES[table] if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"{path} is missing column(s): {', '.join(missing)}")
+        chunk = chunk[[column for column in chunk.columns if column in known and column != 'school_id']]
+        chunk = chunk.replace('', None)
+        chunk['school_id'] = school_id
+
+        if table in ('attendance', 'assessments'):
+            students = {student_id for (student_id,) in conn.execute(
+                "SELECT student_id FROM students WHERE school_id=?", (school_id,))}
+            ids = pd.to_numeric(chunk['student_id'], errors='coerce')
+            belongs = ids.isin(students)
+            skipped += int((~belongs).sum())
+            chunk = chunk[belongs].assign(student_id=ids[belongs].astype('int64'))
+        if table == 'assessments':
+            marks = pd.to_numeric(chunk['marks'], errors='coerce')
+            total = pd.to_numeric(chunk['total'], errors='coerce')
+            chunk['percentage'] = (marks * 100.0 / total.where(total > 0)).astype(object)
+            chunk['percentage'] = chunk['percentage'].where(chunk['percentage'].notna(), None)
+
+        columns = list(chunk.columns)
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            chunk.itertuples(index=False, name=None)
+        )
+        conn.commit()
+        imported += len(chunk)
+    return imported, skipped
+
+
+def export_workbook(conn, school_id, path):
+    # Every table's rows for the school, plus the summary sheet
+    school_id = int(school_id)
+    frames = {}
+    for sheet, table in EXPORT_SHEETS.items():
+        frame = read_frame(f"SELECT * FROM {table} WHERE school_id=?", conn, params=(school_id,),
+                           chunksize=CHUNK_SIZE if table in ('attendance', 'assessments') else None)
+        if frame.empty:
+            # Headers still go out for empty tables
+            frame = pd.DataFrame(columns=[name for _, name, *_ in conn.execute(f"PRAGMA table_info({table})")])
+        frames[sheet] = frame
+
+    students, attendance, assessments, teachers = (frames[sheet] for sheet in
+                                                   ('Students', 'Attendance', 'Assessments', 'Teachers'))
+    summary = pd.DataFrame({
+        'Metric': [
+            'Total Students', 'Total Teachers', 'Total Attendance Records',
+            'Total Assessment Records', 'Average Attendance Rate',
+            'Average Behaviour Score', 'Average Score'
+        ],
+        'Value': [
+            len(students), len(teachers), len(attendance), len(assessments),
+            f"{(attendance['status'] == 'Present').mean() * 100:.1f}%" if not attendance.empty else "N/A",
+            f"{attendance['behaviour_score'].mean():.1f}/5" if not attendance.empty else "N/A",
+            f"{assessments['percentage'].mean():.1f}%" if not assessments.empty else "N/A"
+        ]
+    })
+
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for sheet, frame in frames.items():
+            frame.to_excel(writer, sheet_name=sheet, index=False)
+        summary.to_excel(writer, sheet_name='Summary', index=False)
+    return {sheet: len(frame) for sheet, frame in frames.items()}
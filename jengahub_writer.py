@@ -0,0 +1,212 @@
+"""Single writer thread per database file, with group commit.
+
+Pages hand their writes to the file's writer instead of committing on a
+shared connection. The writer takes whatever jobs are waiting, runs each
+in its own savepoint (so one failing job does not undo the others) and
+commits them together in one transaction. Callers get a Future; the
+result is only set once the commit has succeeded. The queue is bounded:
+when it stays full for SUBMIT_TIMEOUT seconds, submit raises WriterBusy
+instead of piling up work.
+
+Jobs are functions taking the writer's connection. They must not commit
+or roll back themselves; jobs that need to (schema resets, VACUUM) are
+submitted with exclusive=True and run on their own outside any group.
+"""
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+from jengahub_db import connect, database_path
+
+QUEUE_SIZE = int(os.environ.get('JENGAHUB_WRITE_QUEUE', 1000))
+MAX_GROUP = 200
+SUBMIT_TIMEOUT = 10
+BUSY_TIMEOUT_MS = 30000
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+class WriterBusy(Exception):
+    pass
+
+
+class _Job:
+    __slots__ = ('fn', 'exclusive', 'future')
+
+    def __init__(self, fn, exclusive):
+        self.fn = fn
+        self.exclusive = exclusive
+        self.future = Future()
+
+
+class DatabaseWriter:
+    def __init__(self, path, queue_size=QUEUE_SIZE, max_group=MAX_GROUP):
+        self.path = path
+        self.max_group = max_group
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name=f'jengahub-writer-{os.path.basename(path)}',
+                                        daemon=True)
+        self._thread.start()
+
+    # ----- callers -----
+    def submit(self, fn, exclusive=False, timeout=SUBMIT_TIMEOUT):
+        job = _Job(fn, exclusive)
+        try:
+            self._queue.put(job, timeout=timeout)
+        except queue.Full:
+            raise WriterBusy(f"Write queue for {os.path.basename(self.path)} is full; try again shortly")
+        return job.future
+
+    def execute(self, sql, params=()):
+        # Future of the statement's rowcount
+        return self.submit(lambda conn: conn.execute(sql, params).rowcount)
+
+    def executemany(self, sql, seq_of_params):
+        return self.submit(lambda conn: conn.executemany(sql, seq_of_params).rowcount)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def close(self, timeout=None):
+        # Finishes everything already queued, then stops
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # ----- writer thread -----
+    def _run(self):
+        conn = connect(self.path)
+        conn.isolation_level = None
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    return
+                group = [job]
+                stop = False
+                while len(group) < self.max_group:
+                    try:
+                        job = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        stop = True
+                        break
+                    group.append(job)
+
+                try:
+                    batch = []
+                    for job in group:
+                        if job.exclusive:
+                            self._commit_group(conn, batch)
+                            batch = []
+                            self._run_exclusive(conn, job)
+                        else:
+                            batch.append(job)
+                    self._commit_group(conn, batch)
+                except Exception as e:
+                    # Never leave callers waiting on a writer that stopped
+                    self._rollback(conn)
+                    for job in group:
+                        if not job.future.done():
+                            job.future.set_exception(e)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _commit_group(self, conn, jobs):
+        if not jobs:
+            return
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+
+        done = []
+        lost = None
+        for job in jobs:
+            if lost is not None:
+                job.future.set_exception(lost)
+                continue
+            try:
+                conn.execute("SAVEPOINT job")
+                try:
+                    result = job.fn(conn)
+                except Exception as e:
+                    if not conn.in_transaction:
+                        raise
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    job.future.set_exception(e)
+                else:
+                    if not conn.in_transaction:
+                        raise sqlite3.OperationalError("write job ended the group's transaction")
+                    conn.execute("RELEASE job")
+                    done.append((job, result))
+            except Exception as e:
+                # SQLite rolled the whole transaction back (SQLITE_FULL,
+                # SQLITE_IOERR) or the job committed it: nothing left in the
+                # group can be committed, so the rest of it fails too
+                lost = e
+                if not job.future.done():
+                    job.future.set_exception(e)
+
+        if lost is None:
+            try:
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                lost = e
+        if lost is not None:
+            self._rollback(conn)
+            for job, _ in done:
+                job.future.set_exception(lost)
+            return
+        for job, result in done:
+            job.future.set_result(result)
+
+    @staticmethod
+    def _rollback(conn):
+        if conn.in_transaction:
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+
+    def _run_exclusive(self, conn, job):
+        # Runs with ordinary (implicit-transaction) semantics so the job
+        # can commit itself
+        conn.isolation_level = ''
+        try:
+            result = job.fn(conn)
+            conn.commit()
+        except Exception as e:
+            self._rollback(conn)
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+        finally:
+            conn.isolation_level = None
+
+
+def writer_for(target):
+    # The process-wide writer for a database file (path or open connection)
+    path = os.path.abspath(target if isinstance(target, str) else database_path(target))
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = DatabaseWriter(path)
+        return writer
+
+
+def close_writer(path):
+    # Used before a database file is deleted
+    with _writers_lock:
+        writer = _writers.pop(os.path.abspath(path), None)
+    if writer is not None:
+        writer.close()
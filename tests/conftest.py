@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+# The modules read their settings from the environment when first imported,
+# so every file the app would write lands in one scratch directory
+_scratch = tempfile.mkdtemp(prefix='jengahub-tests-')
+os.environ['JENGAHUB_DB'] = os.path.join(_scratch, 'school_management.db')
+os.environ['JENGAHUB_CACHE_PATH'] = ''
+os.environ['JENGAHUB_REPORT_DIR'] = os.path.join(_scratch, 'report_artifacts')
+os.environ['JENGAHUB_BACKUP_DIR'] = os.path.join(_scratch, 'backups')
+os.environ['JENGAHUB_REPORT_HOUR'] = '24'
+os.environ['JENGAHUB_BACKUP_INTERVAL'] = str(10 ** 9)
+for name in ('JENGAHUB_SHARD_DIR', 'JENGAHUB_REPLICA_DIR', 'JENGAHUB_ANALYTICS'):
+    os.environ.pop(name, None)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+APP_PATH = os.path.join(ROOT, 'jengahub_pms.py')
@@ -0,0 +1,47 @@
+import threading
+
+import pytest
+
+duckdb = pytest.importorskip('duckdb')
+
+import jengahub_analytics
+from jengahub_analytics import DuckDBBackend
+from jengahub_db import connect, init_database
+
+
+def copying_backend(paths):
+    # A DuckDB backend in the fallback mode used when the sqlite extension
+    # cannot be loaded
+    backend = DuckDBBackend.__new__(DuckDBBackend)
+    backend.paths, backend.max_staleness = list(paths), 0
+    backend.con, backend._lock = duckdb.connect(), threading.Lock()
+    backend._copied, backend.mode = {}, 'copy'
+    backend._copy_tables()
+    return backend
+
+
+def test_copy_fallback_only_rereads_changed_tables(tmp_path, monkeypatch):
+    path = str(tmp_path / 'duck.db')
+    conn = connect(path)
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('Duck School')")
+    conn.execute("INSERT INTO students (school_id, name) VALUES (1, 'Wafula')")
+    conn.commit()
+    backend = copying_backend([path])
+
+    reads = []
+    read_sql_query = jengahub_analytics.pd.read_sql_query
+
+    def recording(sql, *args, **kwargs):
+        reads.append(sql.split()[-1])
+        return read_sql_query(sql, *args, **kwargs)
+
+    monkeypatch.setattr(jengahub_analytics.pd, 'read_sql_query', recording)
+    backend.query('attendance_overview', 1, '2025-01-01', '2025-12-31')
+    assert reads == []
+
+    conn.execute("INSERT INTO attendance (student_id, school_id, date, status) VALUES (1, 1, '2025-03-03', 'Present')")
+    conn.commit()
+    assert backend.query('attendance_overview', 1, '2025-01-01', '2025-12-31')['records'][0] == 1
+    assert reads == ['attendance']
+    conn.close()
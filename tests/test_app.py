@@ -0,0 +1,141 @@
+import pytest
+
+from conftest import APP_PATH
+from jengahub_db import DB_PATH, connect, init_database
+from jengahub_writer import WriterBusy
+
+AppTest = pytest.importorskip('streamlit.testing.v1').AppTest
+
+
+@pytest.fixture
+def school():
+    conn = connect(DB_PATH)
+    init_database(conn)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO schools (name) VALUES ('Assessment Test School')")
+    school_id = cursor.lastrowid
+    cursor.executemany("INSERT INTO students (school_id, name, age, grade) VALUES (?, ?, 10, 'Grade 4')",
+                       [(school_id, 'Achieng'), (school_id, 'Baraka')])
+    conn.commit()
+    yield conn, school_id
+    for table in ('assessments', 'students', 'schools'):
+        conn.execute(f"DELETE FROM {table} WHERE school_id=?", (school_id,))
+    conn.commit()
+    conn.close()
+
+
+def open_page(menu):
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.run()
+    at.sidebar.radio[0].set_value(menu).run()
+    return at
+
+
+def test_save_assessments(school):
+    conn, school_id = school
+    at = open_page("Assessments")
+    at.selectbox[0].set_value('Assessment Test School').run()
+    next(field for field in at.text_input if field.label == 'Subject').set_value('Mathematics').run()
+    next(field for field in at.number_input if field.label == 'Marks').set_value(45)
+    next(button for button in at.button if 'Save All Assessment' in button.label).click().run()
+
+    assert not at.exception
+    assert not at.error
+    rows = conn.execute(
+        "SELECT marks, total, percentage FROM assessments WHERE school_id=? ORDER BY assessment_id", (school_id,)
+    ).fetchall()
+    assert len(rows) == 2
+    assert (45, 100, 45.0) in rows
+
+
+def add_school(name):
+    at = open_page("Schools")
+    at.text_input[0].set_value(name)
+    next(button for button in at.button if button.label == "Add School").click().run()
+    return at
+
+
+def test_duplicate_school_is_reported():
+    conn = connect(DB_PATH)
+    add_school('Duplicate Test School')
+    at = add_school('Duplicate Test School')
+    assert [error.value for error in at.error] == ["School already exists!"]
+    conn.execute("DELETE FROM schools WHERE name='Duplicate Test School'")
+    conn.commit()
+    conn.close()
+
+
+BUSY = "Write queue for school_management.db is full; try again shortly"
+
+
+class BusyWriter:
+    def execute(self, *args):
+        raise WriterBusy(BUSY)
+
+    def submit(self, fn, exclusive=False):
+        raise WriterBusy(BUSY)
+
+
+def test_busy_writer_asks_to_try_again(monkeypatch):
+    import jengahub_writer
+
+    monkeypatch.setattr(jengahub_writer, 'writer_for', lambda target: BusyWriter())
+    at = add_school('Busy Test School')
+    assert not at.exception
+    assert [error.value for error in at.error] == [BUSY]
+
+
+def test_busy_writer_keeps_the_attendance_form(school, monkeypatch):
+    import jengahub_writer
+
+    conn, school_id = school
+    at = open_page("Attendance & Behaviour")
+    at.selectbox[0].set_value('Assessment Test School').run()
+    monkeypatch.setattr(jengahub_writer, 'writer_for', lambda target: BusyWriter())
+    next(button for button in at.button if 'Save All Attendance' in button.label).click().run()
+
+    assert not at.exception
+    assert [error.value for error in at.error] == [BUSY]
+    assert not at.success
+    assert conn.execute("SELECT COUNT(*) FROM attendance WHERE school_id=?", (school_id,)).fetchone()[0] == 0
+
+
+class RecordingWriter:
+    # Passes jobs on to the real writer, noting how each was submitted
+    def __init__(self, writer, submitted):
+        self.writer = writer
+        self.submitted = submitted
+
+    def submit(self, fn, exclusive=False):
+        self.submitted.append((getattr(fn, '__name__', None), exclusive))
+        return self.writer.submit(fn, exclusive=exclusive)
+
+    def __getattr__(self, name):
+        return getattr(self.writer, name)
+
+
+def test_maintenance_buttons_run_on_the_writer(monkeypatch):
+    import jengahub_writer
+
+    submitted = []
+    real_writer_for = jengahub_writer.writer_for
+    monkeypatch.setattr(jengahub_writer, 'writer_for', lambda target: RecordingWriter(real_writer_for(target), submitted))
+    at = open_page("System Admin")
+    for label in ("🧽 Purge Orphaned Rows", "🗜️ Reclaim Free Space", "🛠️ Run Full Maintenance"):
+        next(button for button in at.button if button.label == label).click().run()
+        assert not at.exception
+    assert submitted == [('purge_orphans', True), ('incremental_vacuum', True), ('run_maintenance', True)]
+
+
+def test_reset_clears_queued_notifications(school):
+    conn, school_id = school
+    conn.execute("INSERT INTO notification_outbox (school_id, student_id, kind, channel, recipient, message, dedup_key) "
+                 "VALUES (?, 1, 'absence', 'sms', '+254700000001', 'absent today', 'absence:reset')", (school_id,))
+    conn.commit()
+    at = open_page("System Admin")
+    next(box for box in at.checkbox if box.label.startswith("I understand")).check().run()
+    next(button for button in at.button if button.label == "💥 Reset Entire System").click().run()
+
+    assert not at.exception
+    assert conn.execute("SELECT COUNT(*) FROM notification_outbox").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM schools").fetchone()[0] == 0
@@ -0,0 +1,82 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from jengahub_analytics import SqliteBackend
+from jengahub_bitmaps import BITMAP_QUERIES, BitmapBackend, loose_days, rebuild_bitmaps, sync_bitmaps
+from jengahub_db import connect, init_database
+from jengahub_shards import SingleDatabase
+
+START, END = '2025-01-01', '2025-12-31'
+DAYS = [str(date(2025, 2, 3) + timedelta(days=n)) for n in range(40)]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'bitmaps.db'))
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('Bitmap School')")
+    conn.executemany("INSERT INTO students (school_id, name, grade) VALUES (1, ?, ?)",
+                     [(f"S{n}", f"Grade {n % 3 + 4}") for n in range(30)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def record(conn, rows):
+    conn.executemany("INSERT INTO attendance (student_id, school_id, date, status, behaviour_score) "
+                     "VALUES (?, 1, ?, ?, ?)", rows)
+    conn.commit()
+
+
+def register(conn, days):
+    pick = random.Random(7)
+    record(conn, [(student, day, pick.choice(['Present'] * 6 + ['Late', 'Absent']),
+                   pick.choice([None, 1, 3, 4, 5, 7]))
+                  for day in days for student in range(1, 31) if pick.random() < 0.9])
+
+
+def assert_same(got, expected):
+    key = list(expected.columns[:1])
+    pd.testing.assert_frame_equal(got.sort_values(key, na_position='first').reset_index(drop=True),
+                                  expected.sort_values(key, na_position='first').reset_index(drop=True),
+                                  check_dtype=False)
+
+
+def test_bitmap_queries_match_sql(conn):
+    register(conn, DAYS[:30])
+    sync_bitmaps(conn, 1)
+    register(conn, DAYS[30:])
+    sync_bitmaps(conn, 1)
+    sql = SqliteBackend(SingleDatabase(conn))
+
+    assert loose_days(conn, 1, START, END) == 0
+    for name, query in BITMAP_QUERIES.items():
+        assert_same(query(conn, 1, START, END), sql.query(name, 1, START, END))
+
+
+@pytest.mark.parametrize('rows', [
+    [(5, DAYS[3], 'Absent', 2), (5, DAYS[3], 'Present', 2)],  # resubmitted day
+    [(6, DAYS[3], 'Excused', None)],
+    [(7, DAYS[3], 'Present', 9)],
+    [(None, DAYS[3], 'Present', 4)],
+])
+def test_loose_rows_are_answered_by_sql(conn, rows):
+    register(conn, DAYS)
+    sync_bitmaps(conn, 1)
+    record(conn, rows)
+    sync_bitmaps(conn, 1)
+    synced = conn.execute("SELECT * FROM attendance_bitmap_counts ORDER BY date").fetchall()
+    rebuild_bitmaps(conn, 1)
+    assert conn.execute("SELECT * FROM attendance_bitmap_counts ORDER BY date").fetchall() == synced
+
+    sql = SqliteBackend(SingleDatabase(conn))
+    backend = BitmapBackend(SingleDatabase(conn))
+    assert loose_days(conn, 1, START, END) == 1
+    for name, query in BITMAP_QUERIES.items():
+        assert_same(backend.query(name, 1, START, END), sql.query(name, 1, START, END))
+        # Ranges clear of the loose day still match from the bitmaps
+        assert_same(query(conn, 1, DAYS[4], END), sql.query(name, 1, DAYS[4], END))
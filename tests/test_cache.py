@@ -0,0 +1,50 @@
+import threading
+import time
+
+from jengahub_cache import ResultCache, fingerprint
+
+
+def test_entries_survive_a_restart_until_the_version_moves(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    key = fingerprint('scores', '/data/school.db', 1, '2025-T1')
+    ResultCache(path).put(key, 7, {'Maths': [80, 60]})
+
+    restarted = ResultCache(path)
+    value = restarted.get(key, 7)
+    assert value == {'Maths': [80, 60]} and restarted.hits['disk'] == 1
+    # Every caller gets its own copy
+    value['Maths'].append(0)
+    assert restarted.get(key, 7) == {'Maths': [80, 60]} and restarted.hits['memory'] == 1
+    assert restarted.get(key, 8) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'), max_mb=0.25, memory_mb=0)
+    for n in range(3):
+        cache.put(f"k{n}", 1, bytes(100000))
+        time.sleep(0.01)
+    assert cache.get('k0', 1) is None
+    assert cache.get('k2', 1) is not None
+    assert cache.stats()['disk_mb'] <= 0.25
+
+
+def test_concurrent_misses_compute_once(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'))
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 42
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', 1, compute)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == [42] * 4 and len(calls) == 1
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('plotly')
+
+from jengahub_calendar import build_matrix, status_totals, update_matrix, weekday_summary
+from jengahub_db import connect, init_database
+
+TERM = '2025-T1'
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'calendar.db'))
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('Calendar School')")
+    conn.executemany("INSERT INTO students (school_id, name, grade) VALUES (1, ?, ?)",
+                     [('Imani', 'Grade 4'), ('Jabali', 'Grade 4'), ('Kito', 'Grade 5')])
+    record(conn, [(1, '2025-02-03', 'Absent'), (1, '2025-02-03', 'Present'),  # resubmitted: latest wins
+                  (2, '2025-02-03', 'Late'), (3, '2025-02-03', 'Absent'), (1, '2025-06-02', 'Absent')])
+    yield conn
+    conn.close()
+
+
+def record(conn, rows):
+    conn.executemany("INSERT INTO attendance (student_id, school_id, date, status) VALUES (?, 1, ?, ?)", rows)
+    conn.commit()
+
+
+def cell(matrix, student_id, day):
+    return matrix.statuses[matrix.row(student_id), (np.datetime64(day) - np.datetime64(matrix.start)).astype(int)]
+
+
+def test_matrix_holds_the_latest_status_per_day(conn):
+    matrix = build_matrix(conn, 1, 'Grade 4', TERM)
+    assert matrix.statuses.shape == (2, 120)
+    assert cell(matrix, 1, '2025-02-03') == 1 and cell(matrix, 2, '2025-02-03') == 2
+    assert matrix.statuses.sum() == 3
+    with pytest.raises(KeyError):
+        matrix.row(3)
+
+
+def test_added_rows_patch_and_other_changes_rebuild(conn):
+    matrix = build_matrix(conn, 1, 'Grade 4', TERM)
+    assert update_matrix(conn, matrix, 1, 'Grade 4', TERM) is matrix
+
+    record(conn, [(2, '2025-02-04', 'Absent'), (3, '2025-02-04', 'Present')])
+    patched = update_matrix(conn, matrix, 1, 'Grade 4', TERM)
+    assert patched.statuses is not matrix.statuses and matrix.statuses.sum() == 3
+    assert np.array_equal(patched.statuses, build_matrix(conn, 1, 'Grade 4', TERM).statuses)
+
+    conn.execute("UPDATE students SET grade = 'Grade 5' WHERE student_id = 2")
+    conn.commit()
+    rebuilt = update_matrix(conn, patched, 1, 'Grade 4', TERM)
+    assert rebuilt.student_ids.tolist() == [1]
+
+
+def test_summaries(conn):
+    record(conn, [(2, '2025-02-10', 'Absent'), (2, '2025-02-11', 'Absent')])
+    matrix = build_matrix(conn, 1, 'Grade 4', TERM)
+    summary = weekday_summary(matrix)
+    assert summary.index.tolist() == ['Mon', 'Tue']
+    assert summary.loc['Mon'].tolist() == [1, 1, 1, 33.3]
+    assert weekday_summary(matrix, 1).index.tolist() == ['Mon']
+    totals = status_totals(matrix)
+    assert totals.index.tolist() == [2, 1]
+    assert totals.loc[2, 'Absence Rate %'] == 66.7
@@ -0,0 +1,70 @@
+import pytest
+
+from jengahub_cdc import (current_watermark, data_version, export_changes, prune_changes, pruned_before,
+                          retention_seq)
+from jengahub_db import connect, init_database
+from jengahub_maintenance import run_maintenance
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'cdc.db'))
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('Log School')")
+    conn.execute("INSERT INTO students (school_id, name, grade) VALUES (1, 'Kamau', 'Grade 6')")
+    conn.executemany("INSERT INTO attendance (student_id, school_id, date, status) VALUES (1, 1, ?, 'Present')",
+                     [(f"2025-02-{day:02d}",) for day in range(3, 13)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def age_log(conn, days):
+    conn.execute("UPDATE change_log SET changed_at = strftime('%Y-%m-%dT%H:%M:%f', 'now', ?)", (f'-{days} days',))
+    conn.commit()
+
+
+def test_maintenance_prunes_old_entries_but_keeps_versions(conn):
+    versions = {table: data_version(conn, 1, [table]) for table in ('schools', 'students', 'attendance')}
+    watermark = current_watermark(conn)
+    age_log(conn, 60)
+
+    assert run_maintenance(conn)['changes_pruned'] == 9
+    assert {table: data_version(conn, 1, [table]) for table in versions} == versions
+    assert current_watermark(conn) == watermark
+    assert pruned_before(conn) == watermark + 1
+    # Recent entries stay
+    conn.execute("DELETE FROM attendance WHERE date='2025-02-03'")
+    conn.commit()
+    prune_changes(conn, retention_seq(conn))
+    assert conn.execute("SELECT op FROM change_log WHERE table_name='attendance'").fetchall() == [('D',)]
+
+
+def test_retention_stays_behind_bitmap_store(conn):
+    from jengahub_bitmaps import sync_bitmaps
+
+    with conn:
+        sync_bitmaps(conn, 1)
+    behind = current_watermark(conn)
+    conn.execute("INSERT INTO attendance (student_id, school_id, date, status) VALUES (1, 1, '2025-02-13', 'Late')")
+    conn.commit()
+    age_log(conn, 60)
+    assert retention_seq(conn) == behind + 1
+
+
+def test_consumers_behind_the_pruned_range_start_again(conn):
+    from jengahub_calendar import build_matrix, update_matrix
+
+    matrix = build_matrix(conn, 1, 'Grade 6', '2025-T1')
+    since = current_watermark(conn)
+    conn.execute("DELETE FROM attendance WHERE date='2025-02-04'")
+    conn.execute("INSERT INTO attendance (student_id, school_id, date, status) VALUES (1, 1, '2025-02-14', 'Absent')")
+    conn.commit()
+    age_log(conn, 60)
+    prune_changes(conn, retention_seq(conn))
+
+    # Only the insert is left in the log; the matrix is rebuilt rather than patched
+    updated = update_matrix(conn, matrix, 1, 'Grade 6', '2025-T1')
+    assert (updated.statuses > 0).sum() == 10
+    with pytest.raises(ValueError, match="pruned"):
+        export_changes(conn, since)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('plotly')
+
+from jengahub_charts import downsample, lttb_indices, zoom
+
+
+@pytest.fixture
+def series():
+    days = pd.date_range('2024-01-01', periods=5000, freq='h')
+    values = np.sin(np.arange(5000) / 50.0)
+    values[2500] = 10.0  # a single spike
+    return pd.DataFrame({'date': days, 'rate': values, 'subject': ['Maths', 'English'] * 2500})
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_downsample_keeps_ends_and_peaks(series, method):
+    plot = downsample(series, 'date', 'rate', max_points=200, method=method)
+    assert len(plot) <= 200
+    assert plot['date'].iloc[0] == series['date'].iloc[0]
+    assert plot['date'].iloc[-1] == series['date'].iloc[-1]
+    assert plot['rate'].max() == 10.0
+    assert plot['date'].is_monotonic_increasing
+
+
+def test_downsample_limits_each_line(series):
+    plot = downsample(series, 'date', 'rate', max_points=100, color='subject')
+    assert plot.groupby('subject').size().to_dict() == {'English': 100, 'Maths': 100}
+    # Short series are drawn as they are
+    short = series.head(50)
+    assert len(downsample(short, 'date', 'rate', max_points=100)) == 50
+
+
+def test_lttb_and_zoom():
+    x = np.arange(10, dtype=float)
+    assert list(lttb_indices(x, x, 20)) == list(range(10))
+    frame = pd.DataFrame({'date': ['2024-01-01', '2024-02-01', '2024-03-01'], 'rate': [1, 2, 3]})
+    assert list(zoom(frame, 'date', '2024-01-15', '2024-03-01')['rate']) == [2, 3]
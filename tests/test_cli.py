@@ -0,0 +1,79 @@
+import subprocess
+import sys
+
+import pytest
+
+import jengahub
+import jengahub_reports
+from conftest import ROOT
+from jengahub_db import connect, init_database
+from jengahub_reports import period_bounds
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'cli.db')
+    conn = connect(path)
+    init_database(conn)
+    start, _ = period_bounds('term_to_date')
+    conn.execute("INSERT INTO schools (name) VALUES ('CLI School')")
+    conn.execute("INSERT INTO students (school_id, name, grade) VALUES (1, 'Achieng', 'Grade 4')")
+    conn.execute("INSERT INTO attendance (student_id, school_id, date, status, behaviour_score) "
+                 "VALUES (1, 1, ?, 'Present', 4)", (str(start),))
+    conn.execute("INSERT INTO assessments (student_id, school_id, date, subject, marks, total) "
+                 "VALUES (1, 1, ?, 'English', 15, 20)", (str(start),))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_report_serves_precomputed_artifact(db_path, tmp_path, monkeypatch, capsys):
+    report_dir = str(tmp_path / 'artifacts')
+    jengahub.main(['--db', db_path, 'report', '--precompute', '--report-dir', report_dir, '--workers', '1'])
+
+    def not_precomputed(*args):
+        raise AssertionError("built a report that was precomputed")
+
+    monkeypatch.setattr(jengahub_reports, 'cached_report', not_precomputed)
+    capsys.readouterr()
+    jengahub.main(['--db', db_path, 'report', '--school', '1', '--report-dir', report_dir,
+                   '--type', 'Attendance Summary Report'])
+    output = capsys.readouterr().out
+    for name in ('attendance_by_status', 'attendance_by_day', 'attendance_by_grade'):
+        assert f"== Attendance Summary - {name} (" in output
+
+
+def test_report_workbook_keeps_every_table(db_path, tmp_path, capsys):
+    pd = pytest.importorskip('pandas')
+    pytest.importorskip('openpyxl')
+    out = str(tmp_path / 'report.xlsx')
+    jengahub.main(['--db', db_path, 'report', '--school', '1', '--report-dir', str(tmp_path / 'none'), '--out', out])
+    tables = int(capsys.readouterr().out.split()[0])
+    sheets = pd.ExcelFile(out).sheet_names
+    assert len(sheets) == tables > 5
+    assert all(len(sheet) <= 31 for sheet in sheets)
+
+
+def test_help_does_not_load_the_app():
+    check = ("import runpy, sys; sys.argv = ['jengahub', '--help']\n"
+             "try:\n    runpy.run_path('jengahub.py', run_name='__main__')\n"
+             "except SystemExit:\n    pass\n"
+             "print(sorted(m for m in sys.modules if m.split('.')[0] in "
+             "('streamlit', 'plotly', 'pandas', 'numpy') or m.startswith('jengahub_')))")
+    output = subprocess.run([sys.executable, '-c', check], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip().splitlines()[-1] == '[]'
+
+
+def test_import_packs_attendance_bitmaps(db_path, tmp_path, monkeypatch):
+    import jengahub_bitmaps
+
+    monkeypatch.setattr(jengahub_bitmaps, 'BITMAPS_ENABLED', True)
+    csv_path = tmp_path / 'attendance.csv'
+    csv_path.write_text("student_id,date,status,behaviour_score\n1,2025-03-03,Late,5\n")
+    jengahub.main(['--db', db_path, 'import', 'attendance', str(csv_path), '--school', '1'])
+
+    conn = connect(db_path)
+    for table in ('attendance_bitmaps', 'attendance_bitmap_counts', 'attendance_bitmap_state'):
+        assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] > 0
+    assert jengahub_bitmaps.bitmaps_current(conn, 1)
+    conn.close()
@@ -0,0 +1,40 @@
+import sqlite3
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from jengahub_frames import read_frame
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE rows (student_id INTEGER, date TEXT, status TEXT, behaviour_score INTEGER, "
+                 "marks REAL, age INTEGER, note TEXT)")
+    conn.executemany("INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     [(n, f"2025-02-{n % 28 + 1:02d}", ['Present', 'Late', 'Absent'][n % 3] if n < 8 else 'Excused',
+                       None if n % 4 == 0 else n % 6, n + 0.5 if n == 9 else n, 300 if n == 9 else 10, 'x')
+                      for n in range(1, 11)])
+    yield conn
+    conn.close()
+
+
+def test_known_columns_get_compact_types(conn):
+    frame = read_frame("SELECT * FROM rows", conn)
+    assert frame['student_id'].dtype == 'int32'
+    assert frame['status'].dtype == 'category'
+    assert pd.api.types.is_datetime64_any_dtype(frame['date'])
+    # NULLs use the nullable type; values that do not fit are left alone
+    assert str(frame['behaviour_score'].dtype) == 'Int8' and frame['behaviour_score'].isna().sum() == 2
+    assert frame['marks'].dtype == 'float64' and frame['age'].dtype == 'int64'
+    assert frame['note'].dtype == pd.read_sql_query("SELECT note FROM rows", conn)['note'].dtype
+
+
+def test_chunked_read_matches_a_single_read(conn):
+    whole = read_frame("SELECT * FROM rows", conn)
+    # The last chunk alone has 'Excused', and only the last chunk's ages overflow int8
+    chunked = read_frame("SELECT * FROM rows", conn, chunksize=4)
+    assert sorted(chunked['status'].cat.categories) == sorted(['Present', 'Late', 'Absent', 'Excused'])
+    pd.testing.assert_frame_equal(chunked, whole, check_categorical=False)
+    assert read_frame("SELECT * FROM rows WHERE 0", conn, chunksize=4).empty
@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip('pandas')
+
+from jengahub_db import connect, init_database
+from jengahub_gradebook import AVERAGE, CLASS_AVERAGE, column_page, column_pages, gradebook
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'gradebook.db'))
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('Grid School')")
+    conn.executemany("INSERT INTO students (school_id, name, grade) VALUES (1, ?, ?)",
+                     [('Achieng', 'Grade 6'), ('Bett', 'Grade 6'), ('Cherono', 'Grade 7')])
+    conn.executemany("INSERT INTO assessments (student_id, school_id, date, subject, marks, total) "
+                     "VALUES (?, 1, ?, ?, ?, ?)",
+                     [(1, '2025-02-03', 'Maths', 40, 50), (1, '2025-03-03', 'Maths', 60, 100),
+                      (1, '2025-02-04', 'English', 30, 50), (2, '2025-02-03', 'Maths', 25, 50),
+                      (2, '2025-06-03', 'English', 50, 50), (3, '2025-02-03', 'Maths', 10, 10)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_cells_and_margins_come_from_summed_marks(conn):
+    grid = gradebook(conn, 1, 'Grade 6', '2025-T1').set_index('Student')
+    assert list(grid.columns) == ['English', 'Maths', AVERAGE]
+    # Achieng's Maths: (40 + 60) / 150, not the mean of 80% and 60%
+    assert grid.loc['Achieng', 'Maths'] == 66.7
+    assert grid.loc['Achieng', AVERAGE] == 65.0
+    # Bett's English falls in term 2, so the cell is empty
+    assert grid.loc['Bett'].isna()['English']
+    assert grid.loc[CLASS_AVERAGE, 'Maths'] == 62.5
+    assert grid.loc[CLASS_AVERAGE, AVERAGE] == 62.0
+
+
+def test_cached_grid_is_rebuilt_after_a_change(conn):
+    first = gradebook(conn, 1, 'Grade 6', '2025-T1')
+    assert gradebook(conn, 1, 'Grade 6', '2025-T1') is first
+    conn.execute("UPDATE assessments SET marks = 50 WHERE assessment_id = 3")
+    conn.commit()
+    grid = gradebook(conn, 1, 'Grade 6', '2025-T1').set_index('Student')
+    assert grid.loc['Achieng', 'English'] == 100.0
+
+
+def test_column_pages_keep_the_margins(conn):
+    grid = gradebook(conn, 1, 'Grade 6', '2025-T1', layout='date')
+    assert column_pages(grid, page_size=2) == 2
+    assert list(column_page(grid, 1, page_size=2).columns) == ['Student', '2025-03-03', AVERAGE]
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip('streamlit')
+
+from jengahub_db import connect
+from jengahub_loadtest import GRADES, SUBJECTS, build_report, generate_database
+
+
+def run(step, seconds, error=None, driver_error=None, flow='attendance'):
+    return {'session': 0, 'flow': flow, 'step': step, 'seconds': seconds, 'error': error,
+            'lock_error': bool(error) and 'locked' in error, 'driver_error': driver_error}
+
+
+def test_generated_database_has_the_requested_shape(tmp_path):
+    path = str(tmp_path / 'load.db')
+    generate_database(path, schools=2, students=16, days=5, assessments=2)
+    conn = connect(path)
+    count = lambda table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    assert count('students') == 32
+    assert count('teachers') == 2 * len(GRADES) * len(SUBJECTS)
+    assert count('attendance') == 32 * 5
+    assert count('assessments') == 32 * 2 * len(SUBJECTS)
+    conn.close()
+
+
+def test_report_keeps_driver_errors_out_of_the_slo():
+    results = [run('save_attendance', 0.1) for _ in range(97)]
+    results += [run('save_attendance', 0.1, driver_error='KeyError: widget'),
+                run('missing_widget', 0.0, driver_error='LookupError: No widget'),
+                run('open_analytics', 5.0, flow='analytics')]
+    report = build_report(results, {}, elapsed=10.0, slo_p95=1.0, slo_error_rate=0.01)
+    assert report['overall']['runs'] == 99
+    assert report['overall']['errors'] == 0 and report['overall']['driver_errors'] == 2
+    assert report['flows']['analytics']['max'] == 5.0
+    assert report['slo']['met']
+
+    results.append(run('save_attendance', 0.1, error='database is locked'))
+    results.append(run('save_attendance', 0.1, error='database is locked'))
+    report = build_report(results, {}, elapsed=10.0, slo_p95=1.0, slo_error_rate=0.01)
+    assert report['overall']['lock_errors'] == 2
+    assert report['sample_errors'] == {'database is locked': 2}
+    assert not report['slo']['met']
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from jengahub_db import connect, init_database
+from jengahub_notify import NotificationDispatcher, SmsGatewayProvider, start_dispatcher_thread
+
+
+class StandInGateway:
+    # A local SMS gateway: records each batch it receives, can answer the
+    # next few requests with a server error, and always fails some ids
+    def __init__(self):
+        self.batches = []
+        self.errors_left = 0
+        self.rejected = set()
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                messages = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['messages']
+                gateway.batches.append((time.monotonic(), len(messages)))
+                if gateway.errors_left:
+                    gateway.errors_left -= 1
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                failed = {str(m['id']): 'unknown number' for m in messages if m['to'] in gateway.rejected}
+                body = json.dumps({'failed': failed}).encode()
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/send"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def gateway():
+    gateway = StandInGateway()
+    yield gateway
+    gateway.close()
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    conn = connect(str(tmp_path / 'notify.db'))
+    init_database(conn)
+
+    def queue(count):
+        conn.executemany('''
+            INSERT INTO notification_outbox (school_id, student_id, kind, channel, recipient, message, dedup_key)
+            VALUES (1, ?, 'absence', 'sms', ?, 'absent today', ?)
+        ''', [(n, f"+2547{n:08d}", f"absence:{n}") for n in range(count)])
+        conn.commit()
+
+    yield conn, queue
+    conn.close()
+
+
+def statuses(conn):
+    return dict(conn.execute("SELECT status, COUNT(*) FROM notification_outbox GROUP BY status").fetchall())
+
+
+def test_batches_respect_rate_limit(gateway, outbox):
+    conn, queue = outbox
+    queue(200)
+    provider = SmsGatewayProvider(gateway.url)
+    # Batches larger than the bucket must still be charged in full
+    provider.batch_size, provider.rate_per_second = 100, 50
+    dispatcher = NotificationDispatcher(None, [provider])
+
+    assert asyncio.run(dispatcher.drain(conn)) == 200
+    assert statuses(conn) == {'sent': 200}
+    (first, _), (last, _) = gateway.batches[0], gateway.batches[-1]
+    # Everything after the first batch went out no faster than the limit
+    assert [size for _, size in gateway.batches] == [100, 100]
+    assert 100 / (last - first) <= 50 * 1.1
+
+
+def test_failed_sends_are_retried_then_given_up(gateway, outbox):
+    conn, queue = outbox
+    queue(3)
+    gateway.errors_left = 1
+    gateway.rejected = {"+254700000002"}
+    dispatcher = NotificationDispatcher(None, [SmsGatewayProvider(gateway.url)], max_attempts=2)
+
+    # Gateway down: the whole batch is put back with a backoff
+    asyncio.run(dispatcher.drain(conn))
+    assert statuses(conn) == {'pending': 3}
+    assert conn.execute("SELECT MIN(next_attempt_at) FROM notification_outbox").fetchone()[0] > time.time()
+    assert asyncio.run(dispatcher.drain(conn)) == 0
+
+    # Due again: two go out, the rejected number fails its second attempt for good
+    conn.execute("UPDATE notification_outbox SET next_attempt_at = 0")
+    conn.commit()
+    asyncio.run(dispatcher.drain(conn))
+    assert statuses(conn) == {'sent': 2, 'failed': 1}
+    assert conn.execute("SELECT attempts, last_error FROM notification_outbox WHERE status='failed'").fetchone() == \
+        (2, 'unknown number')
+    assert len(gateway.batches) == 2
+
+
+def test_dispatcher_survives_a_failed_poll(gateway, tmp_path, caplog):
+    # The shard directory does not exist yet, so the first polls cannot connect
+    path = str(tmp_path / 'shards' / 'school_1.db')
+    dispatcher, thread = start_dispatcher_thread(lambda: [path], [SmsGatewayProvider(gateway.url)], poll_interval=0.05)
+    deadline = time.monotonic() + 5
+    while not caplog.records and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert "school_1.db failed" in caplog.records[0].getMessage()
+
+    os.makedirs(os.path.dirname(path))
+    conn = connect(path)
+    init_database(conn)
+    conn.execute("INSERT INTO notification_outbox (school_id, student_id, kind, channel, recipient, message, dedup_key) "
+                 "VALUES (1, 1, 'absence', 'sms', '+254700000001', 'absent today', 'absence:1')")
+    conn.commit()
+    while statuses(conn) != {'sent': 1} and time.monotonic() < deadline + 5:
+        time.sleep(0.05)
+    dispatcher.stop()
+    thread.join(5)
+    assert statuses(conn) == {'sent': 1}
+    conn.close()
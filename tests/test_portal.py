@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip('pandas')
+
+from jengahub_db import connect, init_database
+from jengahub_portal import performance_series
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'portal.db'))
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('Portal School')")
+    conn.execute("INSERT INTO students (school_id, name, grade) VALUES (1, 'Imani', 'Grade 3')")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_trend_compares_scores_out_of_different_totals(conn):
+    conn.executemany("INSERT INTO assessments (student_id, school_id, date, subject, marks, total) "
+                     "VALUES (1, 1, ?, 'Science', 45, ?)", [('2025-02-03', 50), ('2025-02-10', 100)])
+    conn.commit()
+    series = performance_series(conn, 1)
+    assert list(series.columns) == ['date', 'subject', 'percentage']
+    assert list(series['percentage']) == [90.0, 45.0]
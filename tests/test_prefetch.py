@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+pytest.importorskip('pandas')
+
+import jengahub_prefetch
+from jengahub_db import connect, init_database
+from jengahub_prefetch import Prefetcher
+
+# Counts to a billion: runs for minutes unless interrupted
+LONG_QUERY = '''
+    WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000000000)
+    SELECT COUNT(*) FROM n
+'''
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'prefetch.db')
+    conn = connect(path)
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('Prefetch School')")
+    conn.executemany("INSERT INTO students (school_id, name, grade) VALUES (1, ?, ?)",
+                     [('Pendo', 'Grade 2'), ('Rehema', 'Grade 3')])
+    conn.execute("INSERT INTO attendance (student_id, school_id, date, status) VALUES (1, 1, date('now'), 'Present')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_working_set_is_loaded(db_path):
+    prefetcher = Prefetcher(db_path, workers=1)
+    job = prefetcher.submit(1)
+    assert job.done.wait(60)
+    prefetcher.shutdown()
+    assert job.error is None
+    assert job.completed[0] == 'roster'
+    assert {'gradebook Grade 2', 'calendar Grade 3'} <= set(job.completed)
+
+
+def test_cancel_interrupts_the_running_query(db_path, monkeypatch):
+    started = []
+
+    def working_set(db, reads, school_id):
+        conn = connect(db_path)
+
+        def long_query():
+            started.append(time.monotonic())
+            conn.execute(LONG_QUERY).fetchone()
+        return [conn], [('long', long_query), ('after', lambda: None)]
+
+    monkeypatch.setattr(jengahub_prefetch, 'working_set', working_set)
+    prefetcher = Prefetcher(db_path, workers=1)
+    job = prefetcher.submit(1)
+    deadline = time.monotonic() + 10
+    while not started and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    job.cancel()
+    assert job.done.wait(5)
+    prefetcher.shutdown()
+    # Stopped mid-query, skipped the rest, and not reported as a failure
+    assert job.completed == [] and job.error is None
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+pytest.importorskip('pandas')
+
+from jengahub_db import connect, init_database
+from jengahub_ranks import rank_board, student_ranks
+from jengahub_writer import close_writer, writer_for
+
+TERM = '2025-T1'
+
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'ranks.db')
+    conn = connect(path)
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('Rank School')")
+    conn.executemany("INSERT INTO students (school_id, name, grade) VALUES (1, ?, 'Grade 7')",
+                     [('Amani',), ('Baraka',), ('Chebet',), ('Daudi',)])
+    # Out of 100: Amani 90, Baraka and Chebet tie on 70, Daudi 50
+    conn.executemany("INSERT INTO assessments (student_id, school_id, date, subject, marks, total) "
+                     "VALUES (?, 1, '2025-02-10', 'Maths', ?, 100)", [(1, 90), (2, 70), (3, 70), (4, 50)])
+    conn.commit()
+    yield conn
+    conn.close()
+    close_writer(path)
+
+
+def board(conn):
+    frame = rank_board(conn, 1, TERM, 'school')
+    return list(frame[['name', 'rank', 'cohort', 'percentile']].itertuples(index=False, name=None))
+
+
+def test_ties_share_a_rank_and_percentile(conn):
+    assert board(conn) == [('Amani', 1, 4, 100.0), ('Baraka', 2, 4, 75.0), ('Chebet', 2, 4, 75.0),
+                           ('Daudi', 4, 4, 25.0)]
+    ranks = student_ranks(conn, 1, 2, TERM)
+    assert list(ranks['scope']) == ['school', 'grade', 'subject']
+    assert list(ranks['rank']) == [2, 2, 2]
+
+
+def test_ranks_follow_a_changed_assessment(conn):
+    board(conn)
+    conn.execute("UPDATE assessments SET marks = 95 WHERE student_id = 4")
+    conn.commit()
+
+    # While the writer is busy the previous ranks are served
+    started, release = threading.Event(), threading.Event()
+    writer_for(conn).submit(lambda c: started.set() or release.wait(5))
+    started.wait(5)
+    assert board(conn)[0] == ('Amani', 1, 4, 100.0)
+    release.set()
+    writer_for(conn).submit(lambda c: None).result(timeout=5)
+    assert board(conn)[:2] == [('Daudi', 1, 4, 100.0), ('Amani', 2, 4, 75.0)]
+    assert not conn.in_transaction
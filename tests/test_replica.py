@@ -0,0 +1,27 @@
+from jengahub_db import connect, init_database
+from jengahub_replica import ReplicaRouter, refresh_replica, replica_path
+from jengahub_shards import SingleDatabase
+
+
+def test_refresh_leaves_running_queries_alone(tmp_path):
+    path = str(tmp_path / 'primary.db')
+    conn = connect(path)
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('Replica School')")
+    conn.executemany("INSERT INTO students (school_id, name) VALUES (1, ?)", [(f"S{n}",) for n in range(500)])
+    conn.commit()
+    router = ReplicaRouter(SingleDatabase(conn), str(tmp_path / 'replica'))
+
+    old = router.connection(1)
+    running = old.execute("SELECT name FROM students ORDER BY student_id")
+    first = running.fetchmany(10)
+
+    conn.execute("INSERT INTO students (school_id, name) VALUES (1, 'Late')")
+    conn.commit()
+    refresh_replica(path, replica_path(router.replica_dir, path))
+    new = router.connection(1)
+
+    # A report started before the swap keeps reading the old snapshot
+    assert new is not old
+    assert len(first) + len(running.fetchall()) == 500
+    assert new.execute("SELECT COUNT(*) FROM students").fetchone()[0] == 501
@@ -0,0 +1,53 @@
+import io
+import zipfile
+
+import pytest
+
+import jengahub_reportcards
+from jengahub_db import connect, init_database
+from jengahub_reportcards import load_cards, report_cards_zip
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'cards.db'))
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('Card School')")
+    conn.executemany("INSERT INTO students (school_id, name, grade, parent_name) VALUES (1, ?, ?, 'Parent')",
+                     [('Zawadi <Z>', 'Grade 2'), ('Otieno', 'Grade 2'), ('Moraa', 'Grade 3')])
+    conn.executemany("INSERT INTO assessments (student_id, school_id, date, subject, marks, total) "
+                     "VALUES (1, 1, ?, 'Maths', ?, ?)", [('2025-02-03', 18, 20), ('2025-02-10', 72, 100)])
+    conn.executemany("INSERT INTO attendance (student_id, school_id, date, status, behaviour_score, "
+                     "behaviour_comment) VALUES (1, 1, ?, ?, 4, ?)",
+                     [('2025-02-03', 'Present', 'Helpful'), ('2025-02-04', 'Absent', None),
+                      ('2025-02-05', 'Present', 'Focused'), ('2025-03-30', 'Present', 'Out of range')])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_card_contents(conn):
+    cards = {card['name']: card for card in load_cards(conn, 1, '2025-02-01', '2025-02-28')}
+    card = cards['Zawadi <Z>']
+    # Marks are summed before the percentage is taken: 90/120
+    assert card['subjects'] == [{'subject': 'Maths', 'assessments': 2, 'marks': 90, 'total': 120,
+                                 'percentage': 75.0, 'grade': 'C'}]
+    assert card['attendance']['days'] == 3 and card['attendance']['present'] == 2
+    assert [comment for _, comment in card['comments']] == ['Focused', 'Helpful']
+    assert cards['Otieno']['overall_grade'] == '-'
+    assert len(load_cards(conn, 1, '2025-02-01', '2025-02-28', grade='Grade 3')) == 1
+
+
+def test_zip_is_the_same_inline_and_in_parallel(conn, monkeypatch):
+    inline, count = report_cards_zip(conn, 1, '2025-02-01', '2025-02-28', workers=1)
+    monkeypatch.setattr(jengahub_reportcards, 'MIN_PARALLEL_CARDS', 1)
+    parallel, _ = report_cards_zip(conn, 1, '2025-02-01', '2025-02-28', workers=2)
+
+    def documents(blob):
+        with zipfile.ZipFile(io.BytesIO(blob)) as archive:
+            return {name: archive.read(name) for name in archive.namelist()}
+
+    assert count == 3
+    assert documents(inline) == documents(parallel)
+    page = documents(inline)['Grade_2/Zawadi_Z_1.html'].decode()
+    assert 'Zawadi &lt;Z&gt;' in page and '75.0%' in page
@@ -0,0 +1,69 @@
+import os
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('pandas')
+
+from jengahub_analytics import SqliteBackend
+from jengahub_db import connect, init_database
+from jengahub_reports import (ReportScheduler, _write_state, artifact_path, compute_artifact, load_artifact,
+                              period_bounds, precompute_reports)
+from jengahub_shards import SingleDatabase
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'reports.db')
+    conn = connect(path)
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('Report School')")
+    conn.execute("INSERT INTO students (school_id, name, grade) VALUES (1, 'Wanjiru', 'Grade 5')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_artifact_is_stale_after_a_change(db_path, tmp_path):
+    report_dir = str(tmp_path / 'artifacts')
+    start, end = period_bounds('term_to_date')
+    conn = connect(db_path)
+    compute_artifact(conn, SqliteBackend(SingleDatabase(conn)), 1, 'Attendance Summary Report', start, end, report_dir)
+    assert load_artifact(conn, 1, 'Attendance Summary Report', start, end, report_dir) is not None
+
+    conn.execute("INSERT INTO attendance (student_id, school_id, date, status) VALUES (1, 1, ?, 'Absent')",
+                 (str(start),))
+    conn.commit()
+    assert load_artifact(conn, 1, 'Attendance Summary Report', start, end, report_dir) is None
+    conn.close()
+
+
+def test_precompute_only_removes_old_artifacts(db_path, tmp_path):
+    report_dir = str(tmp_path / 'artifacts')
+    old = artifact_path(1, 'Attendance Summary Report', '2020-01-01', '2020-03-31', report_dir)
+    os.makedirs(os.path.dirname(old))
+    others = [f"{old}.1234.tmp", os.path.join(report_dir, 'README.txt'), os.path.join(report_dir, '1', 'notes.pkl')]
+    for path in [old] + others:
+        with open(path, 'wb') as f:
+            f.write(b'')
+
+    assert precompute_reports(db_path, '', report_dir, workers=1) > 0
+    assert not os.path.exists(old)
+    assert all(os.path.exists(path) for path in others)
+    assert os.path.exists(os.path.join(report_dir, 'last_run.pkl'))
+
+
+@pytest.mark.parametrize('hour, ran_at, due', [
+    (2, None, True),                      # inside the nightly window
+    (4, None, True),
+    (5, None, False),                     # missed night: no run in the school day
+    (10, None, False),
+    (1, None, False),
+    (3, '2025-03-04T02:10:00', False),    # already ran tonight
+    (3, '2025-03-03T02:10:00', True),
+])
+def test_report_run_is_due_only_in_the_nightly_window(tmp_path, hour, ran_at, due):
+    scheduler = ReportScheduler(report_dir=str(tmp_path), hour=2, window=3)
+    if ran_at:
+        _write_state(str(tmp_path), {'ran_at': ran_at, 'artifacts': 0, 'seconds': 0})
+    assert bool(scheduler.due(datetime(2025, 3, 4, hour, 30))) is due
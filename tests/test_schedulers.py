@@ -0,0 +1,31 @@
+import logging
+
+import pytest
+
+pytest.importorskip('pandas')
+
+from jengahub_backup import BackupScheduler
+from jengahub_maintenance import MaintenanceScheduler
+from jengahub_replica import ReplicaRefresher
+from jengahub_reports import ReportScheduler
+
+
+@pytest.mark.parametrize('make, step', [
+    (lambda tmp: MaintenanceScheduler([]), 'run_due'),
+    (lambda tmp: ReplicaRefresher([], str(tmp)), 'refresh_due'),
+    (lambda tmp: ReportScheduler(report_dir=str(tmp)), 'due'),
+    (lambda tmp: BackupScheduler([], str(tmp)), 'run_due'),
+])
+def test_failures_are_logged_with_traceback(make, step, tmp_path, caplog):
+    scheduler = make(tmp_path)
+
+    def fails():
+        scheduler.stop()
+        raise RuntimeError("disk unplugged")
+
+    setattr(scheduler, step, fails)
+    with caplog.at_level(logging.ERROR):
+        scheduler.run()
+    [record] = caplog.records
+    assert record.name == type(scheduler).__module__
+    assert record.exc_info[1].args == ("disk unplugged",)
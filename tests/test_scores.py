@@ -0,0 +1,37 @@
+import threading
+
+from jengahub_db import connect, init_database
+from jengahub_scores import backfill_percentages
+
+
+def make_db(tmp_path):
+    conn = connect(str(tmp_path / 'scores.db'))
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('Scores School')")
+    conn.execute("INSERT INTO students (school_id, name, grade) VALUES (1, 'Achieng', 'Grade 4')")
+    conn.commit()
+    return conn
+
+
+def test_backfill_skips_unmarked_rows(tmp_path):
+    conn = make_db(tmp_path)
+    rows = [(1, 1, '2026-02-01', 'English', marks, 20) for marks in [None] * 25 + [10] * 5]
+    conn.executemany("INSERT INTO assessments (student_id, school_id, date, subject, marks, total) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.execute("UPDATE assessments SET percentage = NULL")
+    conn.commit()
+    watermark = conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+
+    result = []
+    worker = threading.Thread(target=lambda: result.append(backfill_percentages(conn, batch_size=10)), daemon=True)
+    worker.start()
+    worker.join(5)
+    assert not worker.is_alive()
+    assert result == [5]
+    assert conn.execute("SELECT COUNT(*) FROM assessments WHERE percentage = 50.0").fetchone()[0] == 5
+    assert conn.execute("SELECT COUNT(*) FROM change_log WHERE seq > ?", (watermark,)).fetchone()[0] == 5
+
+    # Nothing left to fill: a second pass writes nothing
+    watermark = conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+    assert backfill_percentages(conn, batch_size=10) == 0
+    assert conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0] == watermark
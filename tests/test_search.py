@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip('pandas')
+
+from jengahub_db import connect, init_database
+from jengahub_search import MARK_END, MARK_START, highlight_markdown, match_query, search_comments
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'search.db'))
+    init_database(conn)
+    conn.executemany("INSERT INTO schools (name) VALUES (?)", [('Search School',), ('Other School',)])
+    conn.executemany("INSERT INTO students (school_id, name, grade) VALUES (?, ?, 'Grade 6')",
+                     [(1, 'Lulu'), (1, 'Musa'), (2, 'Nia')])
+    conn.executemany("INSERT INTO attendance (student_id, school_id, date, status, behaviour_comment) "
+                     "VALUES (?, ?, ?, 'Present', ?)",
+                     [(1, 1, '2025-02-03', 'Got into a fight at lunch'),
+                      (2, 1, '2025-02-04', 'Fighting again, fights every break'),
+                      (2, 1, '2025-02-05', 'Helpful in class'),
+                      (3, 2, '2025-02-03', 'A fight in the yard'),
+                      (1, 1, '2025-02-06', '')])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def found(conn, text, **kwargs):
+    return search_comments(conn, text, 1, **kwargs)['attendance_id'].tolist()
+
+
+def assert_index_is_consistent(conn):
+    # rank 0: the index itself only; rows without a comment are never indexed
+    conn.execute("INSERT INTO attendance_comments (attendance_comments, rank) VALUES ('integrity-check', 0)")
+
+
+def test_stemmed_matches_in_the_school_best_first(conn):
+    assert found(conn, 'fight') == [2, 1]
+    assert found(conn, 'fight', start='2025-02-04') == [2]
+    results = search_comments(conn, 'lunch', 1)
+    assert results['comment'][0] == f"Got into a fight at {MARK_START}lunch{MARK_END}"
+    assert highlight_markdown(results['comment'][0]) == "Got into a fight at **lunch**"
+
+
+def test_index_follows_edits_and_deletes(conn):
+    conn.execute("UPDATE attendance SET behaviour_comment = 'Settled and helpful' WHERE attendance_id = 1")
+    conn.execute("UPDATE attendance SET behaviour_comment = 'Pushed in the lunch queue' WHERE attendance_id = 5")
+    conn.execute("UPDATE attendance SET behaviour_comment = '' WHERE attendance_id = 3")
+    conn.execute("DELETE FROM attendance WHERE attendance_id = 2")
+    conn.commit()
+    assert_index_is_consistent(conn)
+    assert found(conn, 'fight') == []
+    assert found(conn, 'helpful') == [1]
+    assert found(conn, 'lunch') == [5]
+
+
+def test_user_text_cannot_break_the_query(conn):
+    assert match_query('"at lunch" fig* OR (') == '"at lunch" OR "fig"* OR "OR" OR "("'
+    assert found(conn, '"at lunch" (') == [1]
+    assert found(conn, '   ') == []
@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip('pandas')
+
+from jengahub_db import connect, init_database
+from jengahub_shards import ID_BLOCK, SingleDatabase, ShardRouter, open_router, split_database
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / 'single.db')
+    conn = connect(path)
+    init_database(conn)
+    conn.executemany("INSERT INTO schools (name) VALUES (?)", [('North',), ('South',)])
+    conn.executemany("INSERT INTO students (school_id, name, grade) VALUES (?, ?, 'Grade 1')",
+                     [(1, 'Amani'), (2, 'Baraka'), (2, 'Chebet')])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_split_routes_each_school_to_its_shard(source, tmp_path):
+    shard_dir = str(tmp_path / 'shards')
+    assert split_database(source, shard_dir, prune=True) == {'North': 1, 'South': 2}
+
+    catalog = connect(source)
+    router = open_router(catalog, shard_dir)
+    assert isinstance(router, ShardRouter)
+    assert catalog.execute("SELECT COUNT(*) FROM students").fetchone()[0] == 0
+    south = router.connection(2)
+    assert south.execute("SELECT student_id, name FROM students ORDER BY student_id").fetchall() == \
+        [(2, 'Baraka'), (3, 'Chebet')]
+
+    # New rows take ids from the shard's own block
+    south.execute("INSERT INTO students (school_id, name, grade) VALUES (2, 'Dalia', 'Grade 1')")
+    south.commit()
+    assert south.execute("SELECT MAX(student_id) FROM students").fetchone()[0] == 2 * ID_BLOCK + 1
+
+    frame = router.fan_out("SELECT school_id, COUNT(*) AS students FROM students GROUP BY school_id")
+    assert dict(zip(frame['school_id'], frame['students'])) == {1: 1, 2: 3}
+    with pytest.raises(KeyError):
+        router.connection(3)
+    for _, conn in router.connections():
+        conn.close()
+    catalog.close()
+
+
+def test_without_a_shard_dir_the_single_database_serves(source):
+    conn = connect(source)
+    router = open_router(conn, None)
+    assert isinstance(router, SingleDatabase)
+    assert router.connection(2) is conn
+    assert len(router.fan_out("SELECT * FROM students")) == 3
+    conn.close()
@@ -0,0 +1,56 @@
+import pytest
+
+from jengahub_db import connect, init_database
+from jengahub_sync import clone_for_device, sync
+
+
+@pytest.fixture
+def databases(tmp_path):
+    central_path, device_path = str(tmp_path / 'central.db'), str(tmp_path / 'device.db')
+    central = connect(central_path)
+    init_database(central)
+    central.execute("INSERT INTO schools (name) VALUES ('Sync School')")
+    central.executemany("INSERT INTO students (school_id, name) VALUES (1, ?)", [('Otieno',), ('Njeri',)])
+    central.executemany("INSERT INTO attendance (student_id, school_id, date, status) VALUES (?, 1, ?, 'Present')",
+                        [(1, '2025-03-03'), (2, '2025-03-03'), (1, '2025-03-04'), (2, '2025-03-04')])
+    central.commit()
+    central.close()
+    clone_for_device(central_path, device_path)
+    central, device = connect(central_path), connect(device_path)
+    yield device, central
+    device.close()
+    central.close()
+
+
+def attendance(conn):
+    return conn.execute("SELECT student_id, date, status FROM attendance ORDER BY student_id, date").fetchall()
+
+
+def test_round_trip_carries_deletes(databases):
+    device, central = databases
+    device.execute("DELETE FROM attendance WHERE student_id=1 AND date='2025-03-03'")
+    device.execute("UPDATE attendance SET date='2025-03-05' WHERE student_id=2 AND date='2025-03-04'")
+    device.execute("INSERT INTO attendance (student_id, school_id, date, status) VALUES (1, 1, '2025-03-05', 'Late')")
+    device.commit()
+    central.execute("DELETE FROM attendance WHERE student_id=2 AND date='2025-03-03'")
+    central.commit()
+
+    stats = sync(device, central)
+    assert (stats['pushed'], stats['pulled']) == (4, 1)
+    assert attendance(device) == attendance(central) == [
+        (1, '2025-03-04', 'Present'), (1, '2025-03-05', 'Late'), (2, '2025-03-05', 'Present')]
+    # Nothing is sent back and forth again
+    assert (sync(device, central)['pushed'], sync(device, central)['pulled']) == (0, 0)
+
+
+def test_later_edit_beats_a_delete(databases):
+    device, central = databases
+    device.execute("DELETE FROM attendance WHERE student_id=1 AND date='2025-03-03'")
+    device.commit()
+    central.execute("UPDATE attendance SET status='Absent' WHERE student_id=1 AND date='2025-03-03'")
+    central.commit()
+
+    stats = sync(device, central)
+    assert stats['push_conflicts'] == 1
+    assert attendance(device) == attendance(central)
+    assert (1, '2025-03-03', 'Absent') in attendance(device)
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip('streamlit')
+
+from jengahub_db import connect, init_database
+from jengahub_tables import count_rows, table_page
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = connect(str(tmp_path / 'tables.db'))
+    init_database(conn)
+    conn.execute("INSERT INTO schools (name) VALUES ('List School')")
+    # Ages repeat and some are missing, so pages split ties and NULLs
+    conn.executemany("INSERT INTO students (school_id, name, age, grade) VALUES (1, ?, ?, ?)",
+                     [(f"Pupil {n}", None if n % 7 == 0 else 6 + n % 4, f"Grade {n % 2 + 1}")
+                      for n in range(1, 54)])
+    conn.execute("INSERT INTO students (school_id, name, age, grade) VALUES (1, '100%_top', 9, 'Grade 1')")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def walk(conn, limit, **kwargs):
+    ids, cursor = [], None
+    while True:
+        rows, cursor = table_page(conn, 'students', after=cursor, limit=limit, **kwargs)
+        assert len(rows) <= limit
+        ids += rows['student_id'].tolist()
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_keyset_pages_cover_every_row_once_in_order(conn, descending):
+    rows = conn.execute("SELECT student_id, age FROM students WHERE grade = 'Grade 1'").fetchall()
+    # Nulls last ascending, first descending; ties broken by the key
+    expected = [student_id for student_id, _ in
+                sorted(rows, key=lambda r: (r[1] is None, r[1] or 0, r[0]), reverse=descending)]
+    assert walk(conn, 4, where={'grade': 'Grade 1'}, sort='age', descending=descending) == expected
+
+
+def test_filter_matches_wildcards_literally(conn):
+    assert count_rows(conn, 'students', search='%_') == 1
+    assert count_rows(conn, 'students', search='pupil 1') == 11
+    rows, cursor = table_page(conn, 'students', search='100%')
+    assert rows['name'].tolist() == ['100%_top'] and cursor is None
+    with pytest.raises(ValueError):
+        table_page(conn, 'students', sort='student_id; DROP TABLE students')
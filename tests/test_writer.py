@@ -0,0 +1,82 @@
+import sqlite3
+import threading
+
+import pytest
+
+from jengahub_writer import DatabaseWriter
+
+
+@pytest.fixture
+def writer(tmp_path):
+    path = str(tmp_path / 'writer.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE notes (note_id INTEGER PRIMARY KEY, body TEXT)")
+    conn.commit()
+    conn.close()
+    writer = DatabaseWriter(path)
+    yield writer
+    writer.close(timeout=5)
+
+
+def grouped(writer, jobs):
+    # Holds the writer on one job so that `jobs` are queued as one group
+    started, release = threading.Event(), threading.Event()
+
+    def block(conn):
+        started.set()
+        release.wait(5)
+
+    blocker = writer.submit(block)
+    started.wait(5)
+    futures = [writer.submit(job) for job in jobs]
+    release.set()
+    blocker.result(timeout=5)
+    return futures
+
+
+def insert(body):
+    return lambda conn: conn.execute("INSERT INTO notes (body) VALUES (?)", (body,)).rowcount
+
+
+def count(writer):
+    return writer.submit(lambda conn: conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]).result(timeout=5)
+
+
+def test_failing_job_only_undoes_itself(writer):
+    def broken(conn):
+        insert('half')(conn)
+        raise ValueError("bad row")
+
+    first, bad, last = grouped(writer, [insert('a'), broken, insert('b')])
+    assert first.result(timeout=5) == 1 and last.result(timeout=5) == 1
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
+    assert count(writer) == 2
+
+
+@pytest.mark.parametrize('ending', ["COMMIT", "ROLLBACK"])
+def test_job_ending_the_transaction_fails_the_group(writer, ending):
+    def ends_transaction(conn):
+        insert('inside')(conn)
+        conn.execute(ending)
+
+    futures = grouped(writer, [insert('a'), ends_transaction, insert('b')])
+    for future in futures:
+        with pytest.raises(sqlite3.Error):
+            future.result(timeout=5)
+    # The writer thread survives and keeps serving
+    assert writer.submit(insert('after')).result(timeout=5) == 1
+
+
+def test_full_database_fails_the_group(writer):
+    writer.submit(lambda conn: conn.execute("PRAGMA max_page_count = 8")).result(timeout=5)
+
+    def huge(conn):
+        conn.execute("INSERT INTO notes (body) VALUES (?)", ('x' * 100000,))
+
+    futures = grouped(writer, [insert('a'), huge, insert('b')])
+    with pytest.raises(sqlite3.Error):
+        futures[1].result(timeout=5)
+    futures[0].exception(timeout=5)
+    futures[2].exception(timeout=5)
+    assert writer.submit(insert('after')).result(timeout=5) == 1